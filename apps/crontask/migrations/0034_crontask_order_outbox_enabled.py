@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crontask', '0033_auto_20220604_0012'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crontask',
+            name='order_outbox_enabled',
+            field=models.BooleanField(default=False, help_text='New orders are pushed by order_outbox_sender instead of push_job'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crontask', '0034_crontask_order_outbox_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crontask',
+            name='batch_formation_enabled',
+            field=models.BooleanField(default=False, help_text='All NEW Signals are formed in one pass by one balance snapshot'),
+        ),
+    ]
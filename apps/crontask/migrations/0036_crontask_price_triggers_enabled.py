@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crontask', '0035_crontask_batch_formation_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crontask',
+            name='price_triggers_enabled',
+            field=models.BooleanField(default=False, help_text='Spoil and trail steps are run by crossed prices (price_trigger_worker) instead of the timer'),
+        ),
+    ]
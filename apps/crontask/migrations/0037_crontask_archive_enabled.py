@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2026-10-19 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crontask', '0036_crontask_price_triggers_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crontask',
+            name='archive_enabled',
+            field=models.BooleanField(default=False, help_text='Move old CLOSED Signals with their orders and history to the archive schema'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crontask', '0037_crontask_archive_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crontask',
+            name='chunked_fan_out_enabled',
+            field=models.BooleanField(default=False, help_text='Parent tasks hand out chunks of Signals (adapted by measured cost) instead of one task by Signal'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crontask', '0038_crontask_chunked_fan_out_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crontask',
+            name='task_coalescing_enabled',
+            field=models.BooleanField(default=False, help_text="Don't enqueue a task of a Signal if its task of the same stage is still queued"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2026-10-19 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crontask', '0039_crontask_task_coalescing_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crontask',
+            name='work_queue_enabled',
+            field=models.BooleanField(default=False, help_text='Parent tasks add work items claimed by work_queue_worker instead of Celery tasks'),
+        ),
+    ]
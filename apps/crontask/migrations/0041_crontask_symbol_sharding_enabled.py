@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2026-10-19 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crontask', '0040_crontask_work_queue_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crontask',
+            name='symbol_sharding_enabled',
+            field=models.BooleanField(default=False, help_text='Tasks of a Signal go to the queues of the shard owning its symbol (live shards only)'),
+        ),
+    ]
@@ -30,6 +30,30 @@ class CronTask(CronTaskBase):
     prices_update_worker_enabled = models.BooleanField(
         default=True,
         help_text="Allow price updates into the Pair table (prices_update_worker)")
+    order_outbox_enabled = models.BooleanField(
+        default=False,
+        help_text="New orders are pushed by order_outbox_sender instead of push_job")
+    batch_formation_enabled = models.BooleanField(
+        default=False,
+        help_text="All NEW Signals are formed in one pass by one balance snapshot")
+    price_triggers_enabled = models.BooleanField(
+        default=False,
+        help_text="Spoil and trail steps are run by crossed prices (price_trigger_worker) instead of the timer")
+    archive_enabled = models.BooleanField(
+        default=False,
+        help_text="Move old CLOSED Signals with their orders and history to the archive schema")
+    chunked_fan_out_enabled = models.BooleanField(
+        default=False,
+        help_text="Parent tasks hand out chunks of Signals (adapted by measured cost) instead of one task by Signal")
+    task_coalescing_enabled = models.BooleanField(
+        default=False,
+        help_text="Don't enqueue a task of a Signal if its task of the same stage is still queued")
+    work_queue_enabled = models.BooleanField(
+        default=False,
+        help_text="Parent tasks add work items claimed by work_queue_worker instead of Celery tasks")
+    symbol_sharding_enabled = models.BooleanField(
+        default=False,
+        help_text="Tasks of a Signal go to the queues of the shard owning its symbol (live shards only)")
 
     ai_algorithm = models.BooleanField(default=False)
     ai_se = models.BooleanField(default=False)
@@ -0,0 +1,80 @@
+import hashlib
+import hmac
+import logging
+import time
+
+from typing import Optional
+from urllib.parse import urlencode
+
+import aiohttp
+
+from .base_model import BaseExternalAPIException
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAPIException(BaseExternalAPIException):
+    """Error response of the Market api got by the async client"""
+
+    def __init__(self, status_code: int, code: int, message: str):
+        self.status_code = status_code
+        self.code = code
+        self.message = message
+        super().__init__(f'APIError(code={code}): {message}')
+
+
+class AsyncBiClient:
+    """
+    aiohttp client of Binance api (SPOT and FUTURES) with signed requests.
+    One session is shared by all requests of the client, so connections are reused
+    """
+    spot_api_url = 'https://api.binance.com/api/v3'
+    futures_api_url = 'https://fapi.binance.com/fapi/v1'
+    recv_window = 5000
+    request_timeout_secs = 10
+
+    def __init__(self, api_key: str, api_secret: str, session: Optional[aiohttp.ClientSession] = None):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self._session = session
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={'Accept': 'application/json', 'X-MBX-APIKEY': self.api_key or ''},
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout_secs))
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self) -> 'AsyncBiClient':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def _sign(self, params: dict) -> str:
+        """Query string with timestamp and HMAC SHA256 signature"""
+        params = {**params, 'timestamp': int(time.time() * 1000), 'recvWindow': self.recv_window}
+        query = urlencode(params)
+        signature = hmac.new(self.api_secret.encode(), query.encode(), hashlib.sha256).hexdigest()
+        return f'{query}&signature={signature}'
+
+    async def _request(self, method: str, url: str, signed: bool = False, **params):
+        query = self._sign(params) if signed else urlencode(params)
+        async with self.session.request(method.upper(), f'{url}?{query}' if query else url) as response:
+            data = await response.json(content_type=None)
+            error = data if isinstance(data, dict) and data.get('code', 0) < 0 else None
+            if response.status >= 400 or error:
+                error = error or {}
+                raise AsyncAPIException(response.status, error.get('code'), error.get('msg', response.reason))
+            return data
+
+    async def request_spot(self, method: str, path: str, signed: bool = False, **params):
+        return await self._request(method, f'{self.spot_api_url}/{path}', signed, **params)
+
+    async def request_futures(self, method: str, path: str, signed: bool = False, **params):
+        return await self._request(method, f'{self.futures_api_url}/{path}', signed, **params)
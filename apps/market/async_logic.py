@@ -0,0 +1,93 @@
+import asyncio
+import logging
+
+from abc import abstractmethod
+from typing import Dict, List, Optional, Type, Union
+
+from apps.order.utils import OrderStatus, NOT_EXISTS_ORDER_STATUSES
+from .async_client import AsyncBiClient, AsyncAPIException
+from .base_model import BaseMarketLogic, PartialResponse
+from .models import BiMarketLogic, BiFuturesMarketLogic
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMarketLogicMixin:
+    """
+    Async counterparts of the I/O methods of the Market logic.
+    Parsing of responses is inherited from the sync logic
+    """
+    async_client: AsyncBiClient
+
+    def __init__(self, async_client: Optional[AsyncBiClient] = None):
+        self.async_client = async_client or AsyncBiClient(self.client_class.api_key, self.client_class.api_secret)
+
+    @abstractmethod
+    async def _async_request(self, method: str, path: str, signed: bool = False, **params):
+        pass
+
+    async def _async_get_order_info_api(self, symbol: str, custom_order_id: str) -> dict:
+        """Send request to get order info (the same alternative as @catch_exception of the sync logic)"""
+        try:
+            return await self._async_request('get', 'order', True, symbol=symbol, origClientOrderId=custom_order_id)
+        except AsyncAPIException as ex:
+            if ex.code == self.exception_class.api_errors.NO_SUCH_ORDER.value.code:
+                return {'status': OrderStatus.NOT_EXISTS.value, 'executedQty': 0.0, 'price': 0.0}
+            raise
+
+    async def async_get_order_info(self,
+                                   symbol: str,
+                                   custom_order_id: str,
+                                   retry_statuses: Optional[List[str]] = None,
+                                   retry_count: int = BaseMarketLogic.get_order_info_retry_count_default,
+                                   retry_delay: float = BaseMarketLogic.get_order_info_retry_delay_default,
+                                   ) -> PartialResponse:
+        """The same as get_order_info, but retries don't block other coroutines"""
+        data = dict()
+        retry_statuses = NOT_EXISTS_ORDER_STATUSES if not retry_statuses else retry_statuses
+        for i in range(retry_count):
+            if i:
+                await asyncio.sleep(retry_delay)
+            response = await self._async_get_order_info_api(symbol, custom_order_id)
+            data = self._get_partially_order_data_from_response(response)
+            if data.get('status') not in retry_statuses:
+                break
+        return data
+
+    @abstractmethod
+    async def async_get_current_price(self, symbol: str) -> float:
+        pass
+
+    async def close(self):
+        await self.async_client.close()
+
+
+class AsyncBiMarketLogic(AsyncMarketLogicMixin, BiMarketLogic):
+
+    async def _async_request(self, method: str, path: str, signed: bool = False, **params):
+        return await self.async_client.request_spot(method, path, signed, **params)
+
+    async def async_get_current_price(self, symbol: str) -> float:
+        response = await self._async_request('get', 'ticker/price', symbol=symbol)
+        return float(response[self.price_])
+
+
+class AsyncBiFuturesMarketLogic(AsyncMarketLogicMixin, BiFuturesMarketLogic):
+
+    async def _async_request(self, method: str, path: str, signed: bool = False, **params):
+        return await self.async_client.request_futures(method, path, signed, **params)
+
+    async def async_get_current_price(self, symbol: str) -> float:
+        """Mark price of the symbol (as get_current_price does by position info)"""
+        response = await self._async_request('get', 'premiumIndex', symbol=symbol)
+        return float(response['markPrice'])
+
+
+ASYNC_MARKET_LOGICS: Dict[str, Type[Union[AsyncBiMarketLogic, AsyncBiFuturesMarketLogic]]] = {
+    BiMarketLogic.name: AsyncBiMarketLogic,
+    BiFuturesMarketLogic.name: AsyncBiFuturesMarketLogic,
+}
+
+
+def get_async_market_logic(market_name: str) -> AsyncMarketLogicMixin:
+    return ASYNC_MARKET_LOGICS[market_name]()
@@ -2,7 +2,7 @@ import logging
 import time
 
 from abc import ABC, abstractmethod
-from typing import Tuple, Union, Optional, Callable, Type, List, TypedDict
+from typing import Tuple, Union, Optional, Callable, Type, List, TypedDict, TYPE_CHECKING
 
 from django.db import models
 
@@ -14,6 +14,9 @@ from .utils import MarketAPIExceptionError
 
 from tools.tools import debug_input_and_returned
 
+if TYPE_CHECKING:
+    from apps.order.base_model import BaseOrder
+
 logger = logging.getLogger(__name__)
 
 
@@ -179,6 +182,11 @@ class BaseMarketLogic(ABC):
     def cancel_order(self, order):
         pass
 
+    def cancel_orders(self, orders: List['BaseOrder']):
+        """Cancel several orders (one request per order if the Market has no bulk cancel)"""
+        for order in orders:
+            order.cancel_into_market()
+
 
 class BaseMarket(SystemBaseModel):
     name: str
@@ -1,4 +1,6 @@
+import json
 import logging
+import time
 
 from asgiref.sync import sync_to_async
 from django.db import models
@@ -7,16 +9,18 @@ from django.contrib.auth import get_user_model
 from typing import (
     Tuple, TypedDict, TYPE_CHECKING,
     Union, Callable, Type, Any,
-    Optional, List
+    Optional, List, Dict,
 )
 
 from binance import client
 from binance.exceptions import BinanceAPIException
-from apps.order.utils import OrderStatus
+from apps.order.utils import OrderStatus, OrderType
+from apps.signal.utils import MarginType
 from .base_model import (
     BaseMarket,
     BaseMarketLogic,
     BaseMarketException,
+    BaseExternalAPIException,
     PartialResponse,
 )
 from .utils import (
@@ -244,7 +248,7 @@ class BiMarketLogic(BaseMarketLogic,
     def _push_buy_limit_order(self, symbol: str, quantity: float, price: float, custom_order_id: str):
         """Send request to create Buy limit order"""
         response = self.my_client.order_limit_buy(
-            symbol=symbol, quantity=quantity, price=price_to_str(price), newClientOrderId=custom_order_id)
+            symbol=symbol, quantity=price_to_str(quantity), price=price_to_str(price), newClientOrderId=custom_order_id)
         return response
 
     @api_logging
@@ -259,7 +263,7 @@ class BiMarketLogic(BaseMarketLogic,
         """
         response = self.my_client.order_oco_sell(
             symbol=symbol,
-            quantity=quantity,
+            quantity=price_to_str(quantity),
             price=price_to_str(price),
             limitClientOrderId=custom_order_id,
             stopClientOrderId=custom_sl_order_id,
@@ -277,7 +281,7 @@ class BiMarketLogic(BaseMarketLogic,
         """
         response = self.my_client.order_market_sell(
             symbol=symbol,
-            quantity=quantity,
+            quantity=price_to_str(quantity),
             newClientOrderId=custom_order_id)
         return response
 
@@ -387,6 +391,15 @@ class BiFuturesMarketException(BaseMarketException):
     api_errors = MarketAPIExceptionError
 
 
+class BiBatchOrderError(BaseExternalAPIException):
+    """Error of one order from the response to a batch request"""
+
+    def __init__(self, code: int, message: str):
+        self.code = code
+        self.message = message
+        super().__init__(f'APIError(code={code}): {message}')
+
+
 class BiFuturesMarketLogic(BaseMarketLogic,
                            BinanceDataMixin,
                            BinanceFuturesDataMixin):
@@ -399,6 +412,16 @@ class BiFuturesMarketLogic(BaseMarketLogic,
     client_class = BiFuturesClient
     exception_class = BiFuturesMarketException
 
+    MARGIN_TYPES_MATCH: dict = {
+        'isolated': MarginType.ISOLATED.value,
+        'cross': MarginType.CROSSED.value,
+    }
+    # Leverage and margin type of the account by symbol (shared by all instances of the process)
+    _symbol_settings: Dict[str, dict] = {}
+    symbol_settings_stats: Dict[str, int] = {'hits': 0, 'misses': 0}
+    batch_orders_limit = 5
+    batch_cancel_limit = 10
+
     ORDER_STATUSES_MATCH: dict = {
         client_class.ORDER_STATUS_CANCELED:
             BaseMarketLogic.order_statuses.CANCELED.value,
@@ -500,7 +523,7 @@ class BiFuturesMarketLogic(BaseMarketLogic,
             symbol=symbol,
             side=self.my_client.SIDE_BUY,
             type=self.my_client.ORDER_TYPE_LIMIT,
-            quantity=quantity,
+            quantity=price_to_str(quantity),
             price=price_to_str(price),
             newClientOrderId=custom_order_id,
             timeInForce=self.my_client.TIME_IN_FORCE_GTC)
@@ -513,7 +536,7 @@ class BiFuturesMarketLogic(BaseMarketLogic,
             symbol=symbol,
             side=self.my_client.SIDE_SELL,
             type=self.my_client.ORDER_TYPE_LIMIT,
-            quantity=quantity,
+            quantity=price_to_str(quantity),
             price=price_to_str(price),
             newClientOrderId=custom_order_id,
             timeInForce=self.my_client.TIME_IN_FORCE_GTC)
@@ -526,7 +549,7 @@ class BiFuturesMarketLogic(BaseMarketLogic,
             symbol=symbol,
             side=self.my_client.SIDE_SELL,
             type=self.order_type_stop_market,
-            quantity=quantity,
+            quantity=price_to_str(quantity),
             reduceOnly=False,
             stopPrice=price_to_str(price),
             newClientOrderId=custom_order_id,
@@ -543,7 +566,7 @@ class BiFuturesMarketLogic(BaseMarketLogic,
             side=self.my_client.SIDE_SELL,
             type=self.my_client.ORDER_TYPE_TAKE_PROFIT,
             symbol=symbol,
-            quantity=quantity,
+            quantity=price_to_str(quantity),
             reduceOnly=True,
             price=price_to_str(price),
             newClientOrderId=custom_order_id,
@@ -561,7 +584,7 @@ class BiFuturesMarketLogic(BaseMarketLogic,
             side=self.my_client.SIDE_BUY,
             type=self.my_client.ORDER_TYPE_TAKE_PROFIT,
             symbol=symbol,
-            quantity=quantity,
+            quantity=price_to_str(quantity),
             reduceOnly=True,
             price=price_to_str(price),
             newClientOrderId=custom_order_id,
@@ -583,7 +606,7 @@ class BiFuturesMarketLogic(BaseMarketLogic,
             symbol=symbol,
             reduceOnly=False,
             stopPrice=price_to_str(stop_price),
-            quantity=quantity,
+            quantity=price_to_str(quantity),
             newClientOrderId=custom_order_id)
         return response
 
@@ -601,7 +624,7 @@ class BiFuturesMarketLogic(BaseMarketLogic,
             symbol=symbol,
             reduceOnly=True,
             stopPrice=price_to_str(stop_price),
-            quantity=quantity,
+            quantity=price_to_str(quantity),
             newClientOrderId=custom_order_id)
         return response
 
@@ -619,7 +642,7 @@ class BiFuturesMarketLogic(BaseMarketLogic,
             symbol=symbol,
             reduceOnly=True,
             stopPrice=price_to_str(stop_price),
-            quantity=quantity,
+            quantity=price_to_str(quantity),
             newClientOrderId=custom_order_id)
         return response
 
@@ -634,7 +657,7 @@ class BiFuturesMarketLogic(BaseMarketLogic,
             side=self.my_client.SIDE_SELL,
             type=self.my_client.ORDER_TYPE_MARKET,
             symbol=symbol,
-            quantity=quantity,
+            quantity=price_to_str(quantity),
             newClientOrderId=custom_order_id)
         return response
 
@@ -649,7 +672,7 @@ class BiFuturesMarketLogic(BaseMarketLogic,
             side=self.my_client.SIDE_BUY,
             type=self.my_client.ORDER_TYPE_MARKET,
             symbol=symbol,
-            quantity=quantity,
+            quantity=price_to_str(quantity),
             newClientOrderId=custom_order_id)
         return response
 
@@ -661,13 +684,64 @@ class BiFuturesMarketLogic(BaseMarketLogic,
         """Send request to cancel order"""
         return self.my_client.futures_cancel_order(symbol=symbol, origClientOrderId=custom_order_id)
 
+    @classmethod
+    def update_symbol_settings_cache(cls,
+                                     symbol: str,
+                                     leverage: Optional[int] = None,
+                                     margin_type: Optional[str] = None) -> dict:
+        """
+        Remember leverage and margin type of the symbol
+        (after changing them or by an account config update event)
+        """
+        symbol_settings = cls._symbol_settings.setdefault(symbol, {'leverage': None, 'margin_type': None})
+        if leverage is not None:
+            symbol_settings['leverage'] = int(leverage)
+        if margin_type is not None:
+            symbol_settings['margin_type'] = margin_type
+        symbol_settings['updated'] = time.monotonic()
+        return symbol_settings
+
+    def _get_symbol_settings(self, symbol: str) -> Tuple[dict, bool]:
+        """
+        Get cached leverage and margin type of the symbol,
+        seed the cache from the position info if it is absent or outdated
+        """
+        symbol_settings = self._symbol_settings.get(symbol)
+        if symbol_settings and \
+                time.monotonic() - symbol_settings['updated'] <= conf_obj.futures_symbol_settings_ttl_secs:
+            return symbol_settings, True
+        response = self._get_position_info(symbol=symbol)
+        position_info = response[0] if response else {}
+        symbol_settings = self.update_symbol_settings_cache(
+            symbol,
+            leverage=position_info.get('leverage'),
+            margin_type=self.MARGIN_TYPES_MATCH.get(position_info.get('marginType')))
+        return symbol_settings, False
+
     def _push_preconditions(self, order: 'BaseOrder'):
+        """Set leverage and margin type of the symbol if they differ from the Signal ones"""
+        leverage, margin_type = int(order.signal.leverage), order.signal.margin_type
         try:
+            symbol_settings, cached = self._get_symbol_settings(order.symbol)
+            if cached and symbol_settings['leverage'] == leverage and symbol_settings['margin_type'] == margin_type:
+                self.symbol_settings_stats['hits'] += 1
+                return
+            self.symbol_settings_stats['misses'] += 1
+            logger.debug(f"Push preconditions cache miss for '{order.symbol}': {symbol_settings}."
+                         f" Stats: {self.symbol_settings_stats}")
             # Set leverage
-            self._set_leverage(order.symbol, order.signal.leverage)
+            if symbol_settings['leverage'] != leverage:
+                self._set_leverage(order.symbol, leverage)
+                self.update_symbol_settings_cache(order.symbol, leverage=leverage)
             # Set margin type
-            self._change_margin_type(order.symbol, order.signal.margin_type)
+            if symbol_settings['margin_type'] != margin_type:
+                self._change_margin_type(order.symbol, margin_type)
+                self.update_symbol_settings_cache(order.symbol, margin_type=margin_type)
         except BiFuturesMarketException.api_exception as ex:
+            if ex.code == self.exception_class.api_errors.NO_NEED_TO_CHANGE_MARGIN_TYPE.value.code:
+                self.update_symbol_settings_cache(order.symbol, margin_type=margin_type)
+                return
+            self._symbol_settings.pop(order.symbol, None)
             logger.error(f'ORDER {order.id} for {order.symbol}, PUSH PRECONDITIONS ERROR: {ex}')
 
     def push_buy_limit_order(self, order: 'BuyOrder'):
@@ -809,6 +883,113 @@ class BiFuturesMarketLogic(BaseMarketLogic,
         order.update_order_api_history(default_status, default_executed_quantity, order.price)
         return response
 
+    def _get_batch_order_params(self, order: 'BaseOrder') -> dict:
+        """Parameters of the order for a batch request (the same as for pushing one by one)"""
+        side = self.my_client.SIDE_BUY if order.type_ == 'buy' else self.my_client.SIDE_SELL
+        params = {
+            'symbol': order.symbol,
+            'side': side,
+            'quantity': price_to_str(order.quantity),
+            'newClientOrderId': order.custom_order_id,
+        }
+        if order.type == OrderType.LIMIT.value:
+            params.update({'type': self.my_client.ORDER_TYPE_LIMIT,
+                           'price': price_to_str(order.price),
+                           'timeInForce': self.my_client.TIME_IN_FORCE_GTC})
+        elif order.type == OrderType.STOP_LIMIT.value:
+            params.update({'type': self.order_type_stop_market,
+                           'reduceOnly': False,
+                           'stopPrice': price_to_str(order.price)})
+        elif order.type == OrderType.STOP_MARKET.value:
+            params.update({'type': self.order_type_stop_market,
+                           'reduceOnly': True,
+                           'stopPrice': price_to_str(order.price)})
+        elif order.type == OrderType.TAKE_PROFIT.value:
+            params.update({'type': self.my_client.ORDER_TYPE_TAKE_PROFIT,
+                           'reduceOnly': True,
+                           'price': price_to_str(order.price),
+                           'stopPrice': price_to_str(order.trigger),
+                           'timeInForce': self.my_client.TIME_IN_FORCE_GTC})
+        elif order.type == OrderType.MARKET.value:
+            params.update({'type': self.my_client.ORDER_TYPE_MARKET})
+        # All values of batchOrders are sent as strings
+        return {key: str(value).lower() if isinstance(value, bool) else str(value) for key, value in params.items()}
+
+    @api_logging(text="Push batch of orders")
+    def _push_batch_orders(self, batch_orders: List[dict]) -> List[dict]:
+        """Send request to create several orders (up to batch_orders_limit) by one request"""
+        return self.my_client._request_futures_api(
+            'post', 'batchOrders', True, data={'batchOrders': json.dumps(batch_orders)})
+
+    def _update_order_by_batch_response(self, order: 'BaseOrder', response: dict):
+        """The same updating of the order as after pushing it one by one"""
+        if order.type == OrderType.TAKE_PROFIT.value:
+            order.update_order_api_history(OrderStatus.SENT.value, 0.0, order.price)
+            return
+        data = self._get_partially_order_data_from_response(response)
+        status, executed_quantity = data.get('status'), data.get('executed_quantity')
+        avg_executed_market_price = data.get('avg_executed_market_price')
+        if order.type == OrderType.STOP_MARKET.value:
+            avg_executed_market_price = avg_executed_market_price or order.price
+        order.update_order_api_history(status, executed_quantity, avg_executed_market_price)
+
+    def push_orders_batch(self,
+                          orders: List['BaseOrder']) -> List[Tuple['BaseOrder', Optional[BaseExternalAPIException]]]:
+        """
+        Push orders of one Signal by batches.
+        Returns pairs (order, exception) - exception is None if the order has been pushed
+        """
+        results = []
+        if not orders:
+            return results
+        self._push_preconditions(order=orders[0])
+        for i in range(0, len(orders), self.batch_orders_limit):
+            batch = orders[i:i + self.batch_orders_limit]
+            for order in batch:
+                order.push_count_increase()
+            try:
+                response = self._push_batch_orders([self._get_batch_order_params(order) for order in batch])
+            except self.exception_class.api_exception as ex:
+                results.extend((order, ex) for order in batch)
+                continue
+            for order, order_response in zip(batch, response):
+                if 'code' in order_response and not order_response.get(self.orderId_):
+                    results.append((order, BiBatchOrderError(order_response['code'], order_response.get('msg'))))
+                    continue
+                self._update_order_by_batch_response(order, order_response)
+                results.append((order, None))
+        return results
+
+    @api_logging(text="Cancel batch of orders into Market")
+    def _cancel_batch_orders(self, symbol: str, custom_order_ids: List[str]) -> List[dict]:
+        """Send request to cancel several orders (up to batch_cancel_limit) of the symbol"""
+        return self.my_client._request_futures_api(
+            'delete', 'batchOrders', True,
+            data={'symbol': symbol, 'origClientOrderIdList': json.dumps(custom_order_ids)})
+
+    def cancel_orders(self, orders: List['BaseOrder']):
+        """
+        Cancel orders by batches (per symbol) and update them
+        by the response at once without waiting for the pull job
+        """
+        orders_by_symbol: Dict[str, List['BaseOrder']] = dict()
+        for order in orders:
+            orders_by_symbol.setdefault(order.symbol, []).append(order)
+        for symbol, symbol_orders in orders_by_symbol.items():
+            for i in range(0, len(symbol_orders), self.batch_cancel_limit):
+                batch = {order.custom_order_id: order for order in symbol_orders[i:i + self.batch_cancel_limit]}
+                response = self._cancel_batch_orders(symbol, list(batch))
+                for custom_order_id, order_response in zip(batch, response):
+                    order = batch.get(order_response.get('clientOrderId'), batch[custom_order_id])
+                    if 'code' in order_response and not order_response.get(self.orderId_):
+                        log = logger.debug if order_response['code'] == \
+                            self.exception_class.api_errors.CANCEL_REJECTED.value.code else logger.warning
+                        log(f"Cancel order Error: Order: '{order}': {order_response}")
+                        continue
+                    data = self._get_partially_order_data_from_response(order_response)
+                    order.update_order_api_history(
+                        data.get('status'), data.get('executed_quantity'), data.get('avg_executed_market_price'))
+
     def cancel_order(self, order: 'BaseOrder'):
         """Cancel order"""
         self._cancel_order(order.symbol, order.custom_order_id)
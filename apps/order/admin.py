@@ -7,6 +7,7 @@ from .models import (
     SellOrder,
     HistoryApiBuyOrder,
     HistoryApiSellOrder,
+    OrderOutbox,
 )
 
 
@@ -229,3 +230,24 @@ class HistoryApiSellOrderAdmin(admin.ModelAdmin):
     @staticmethod
     def s_status(history_order):
         return history_order.main_order.signal.status
+
+
+@admin.register(OrderOutbox)
+class OrderOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id',
+                    'signal',
+                    'order_side',
+                    'order_id',
+                    'custom_order_id',
+                    'status',
+                    'attempts',
+                    'error',
+                    'created',
+                    'modified',
+                    ]
+    search_fields = ['id', 'custom_order_id', ]
+    list_filter = [
+        'status',
+        'order_side',
+        SignalIDFilter,
+    ]
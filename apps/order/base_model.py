@@ -3,7 +3,7 @@ import logging
 from abc import abstractmethod
 from typing import Optional, List, TYPE_CHECKING
 
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.db.models import F
 from django.utils import timezone
 
@@ -53,7 +53,7 @@ class BaseOrder(SystemBaseModel):
     trigger = models.FloatField(default=0)
     index = models.PositiveIntegerField()
     push_count = models.PositiveIntegerField(default=0)
-    custom_order_id = models.CharField(max_length=36)
+    custom_order_id = models.CharField(max_length=36, unique=True)
     handled_worked = models.BooleanField(
         help_text="Did something if the order has worked",
         default=False)
@@ -65,6 +65,9 @@ class BaseOrder(SystemBaseModel):
         default=False)
     last_updated_by_api = models.DateTimeField(blank=True,
                                                null=True)
+    # The last state got by API (the same as the last record of API history)
+    api_status = models.CharField(max_length=32, blank=True, default='')
+    api_executed_quantity = models.FloatField(blank=True, null=True)
 
     objects = models.Manager()
 
@@ -79,16 +82,40 @@ class BaseOrder(SystemBaseModel):
             self.init_price = self.price
         if not self.pk and not self.custom_order_id:
             self.custom_order_id = self.form_order_id(
-                message_id=self.signal.outer_signal_id,
                 techannel_abbr=self.signal.techannel.abbr,
                 index=self.index)
-            # Check uniqueness of custom_order_id
-            # Don't create if exists
-            if type(self).objects.filter(custom_order_id=self.custom_order_id).exists():
-                logger.warning(f"Order '{self}' could not be created due to"
-                               f" custom_order_id already exists: '{self.custom_order_id}'")
-                return
-        super().save(*args, **kwargs)
+        if self.pk:
+            super().save(*args, **kwargs)
+            return
+        # The order row and its push intent are committed together
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                self._add_to_outbox()
+        except IntegrityError:
+            # custom_order_id is unique: don't create if exists. Any other violation is raised
+            if not type(self).objects.filter(custom_order_id=self.custom_order_id).exists():
+                raise
+            logger.warning(f"Order '{self}' could not be created due to"
+                           f" custom_order_id already exists: '{self.custom_order_id}'")
+            self.pk = None
+
+    @classmethod
+    def _create(cls, **params) -> 'BaseOrder':
+        """Create the order or add it to the order builder of the Signal if the builder is entered"""
+        builder = getattr(params['signal'], '_order_builder', None)
+        if builder is None:
+            return cls.objects.create(**params)
+        return builder.add(cls(**params))
+
+    def _add_to_outbox(self):
+        """Add intent to push the new order (if the outbox is enabled)"""
+        from apps.crontask.utils import get_or_create_crontask
+        from apps.order.models import OrderOutbox
+        if self.status != OrderStatus.NOT_SENT.value or self.no_need_push or \
+                not get_or_create_crontask().order_outbox_enabled:
+            return
+        OrderOutbox.add_intent(self)
 
     @property
     def market_logic(self):
@@ -122,15 +149,18 @@ class BaseOrder(SystemBaseModel):
         pass
 
     def form_order_id(self,
-                      message_id: Optional[int],
                       techannel_abbr: str,
                       index: Optional[int]) -> str:
+        """
+        The id is unique by the Signal and index: the same order of the Signal gets the same id.
+        Leading number is the number of copies
+        """
         start_number_of_copies = 0
-        if not (message_id or index or techannel_abbr):
-            return f'{start_number_of_copies}{self.market_logic.order_id_separator[-2:]}{self.get_signal_position()}' \
-                   f'{self.order_type_separator}{gen_short_uuid()}'
-        return f'{start_number_of_copies}{self.market_logic.order_id_separator[-2:]}{self.get_signal_position()}' \
-               f'{self.order_type_separator}{techannel_abbr}_{str(message_id)[-4:]}_{str(index)[:2]}'
+        prefix = f'{start_number_of_copies}{self.market.logic.order_id_separator[-2:]}' \
+                 f'{self.get_signal_position()}{self.order_type_separator}'
+        if not (self.signal_id or index or techannel_abbr):
+            return f'{prefix}{gen_short_uuid()}'
+        return f'{prefix}{techannel_abbr}_s{self.signal_id}_{index}'
 
     @classmethod
     def form_sl_order_id(cls, main_order: 'BaseOrder') -> str:
@@ -152,6 +182,15 @@ class BaseOrder(SystemBaseModel):
         """Update last_updated_by_api field by current time"""
         self.last_updated_by_api = timezone.now()
 
+    def _is_api_state_changed(self, status: str, executed_quantity: float) -> bool:
+        return self.api_status != status or self.api_executed_quantity != executed_quantity
+
+    def _save_api_state(self, status: str, executed_quantity: float, *fields: str):
+        """Save the new API state and the fields changed by it"""
+        self.api_status, self.api_executed_quantity = status, executed_quantity
+        self.save(update_fields=['_status', 'price', 'last_updated_by_api',
+                                 'api_status', 'api_executed_quantity', 'modified', *fields])
+
     def cancel(self):
         logger.debug(f"LOCAL CANCEL ORDER: '{self}'")
         now_ = timezone.now()
@@ -0,0 +1,163 @@
+import logging
+
+from typing import Dict, Iterable, List, Optional, Set, Type, TYPE_CHECKING
+
+from django.db import transaction, IntegrityError
+
+from utils.framework.models import get_increased_leading_number
+
+if TYPE_CHECKING:
+    from apps.signal.models import Signal
+    from .base_model import BaseOrder
+
+logger = logging.getLogger(__name__)
+
+
+class OrderBuilder:
+    """
+    Collect new orders of one step and create them by one bulk_create by model.
+    While the builder is entered the form_* methods of orders of its Signals add orders to it.
+    custom_order_ids are checked in memory by ids of the Signals orders (got once):
+    formed id of an existing order means the same order, it isn't created again;
+    leading number of a copied order id is increased until the id is free
+    """
+
+    def __init__(self, *signals: 'Signal'):
+        self.signals = signals
+        self._orders: List['BaseOrder'] = []
+        self._taken_ids: Dict[Type['BaseOrder'], Set[str]] = dict()
+        self._outer: Optional['OrderBuilder'] = None
+
+    def __enter__(self) -> 'OrderBuilder':
+        # The nested step adds orders to the outer builder
+        self._outer = getattr(self.signals[0], '_order_builder', None)
+        if self._outer is not None:
+            return self._outer
+        for signal in self.signals:
+            signal._order_builder = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._outer is not None:
+            return False
+        try:
+            if exc_type is None:
+                self.create()
+        finally:
+            for signal in self.signals:
+                signal._order_builder = None
+        return False
+
+    def _get_taken_ids(self, model: Type['BaseOrder']) -> Set[str]:
+        if model not in self._taken_ids:
+            self._taken_ids[model] = set(model.objects.filter(
+                signal__in=[signal.pk for signal in self.signals]).values_list('custom_order_id', flat=True))
+        return self._taken_ids[model]
+
+    @staticmethod
+    def _get_free_id(custom_order_id: str, taken_ids: Set[str]) -> str:
+        while custom_order_id in taken_ids:
+            custom_order_id = get_increased_leading_number(custom_order_id)
+        return custom_order_id
+
+    @staticmethod
+    def _get_not_saved_related(order: 'BaseOrder') -> List['BaseOrder']:
+        """Related orders (tp_order of SL order) formed by the same step"""
+        res = []
+        for field in order._meta.concrete_fields:
+            if field.is_relation and field.is_cached(order):
+                related = field.get_cached_value(order)
+                if related is not None and related.pk is None:
+                    res.append(related)
+        return res
+
+    def _is_added(self, order: 'BaseOrder') -> bool:
+        return any(order is added_order for added_order in self._orders)
+
+    def add(self, order: 'BaseOrder') -> 'BaseOrder':
+        """Form custom_order_id and keep the order to create"""
+        taken_ids = self._get_taken_ids(type(order))
+        if not order.custom_order_id:
+            order.custom_order_id = order.form_order_id(
+                techannel_abbr=order.signal.techannel.abbr,
+                index=order.index)
+            if order.custom_order_id in taken_ids:
+                logger.warning(f"Order '{order}' could not be created due to"
+                               f" custom_order_id already exists: '{order.custom_order_id}'")
+                return order
+        else:
+            order.custom_order_id = self._get_free_id(order.custom_order_id, taken_ids)
+        if not all(self._is_added(related) for related in self._get_not_saved_related(order)):
+            logger.warning(f"Order '{order}' could not be created due to its related order is not created")
+            return order
+        order.init_price = order.price
+        taken_ids.add(order.custom_order_id)
+        self._orders.append(order)
+        return order
+
+    def discard(self, signal_ids: Optional[Iterable[int]] = None):
+        """Don't create orders of the Signals (all orders by default)"""
+        if signal_ids is None:
+            self._orders = []
+            return
+        signal_ids = set(signal_ids)
+        self._orders = [order for order in self._orders if order.signal_id not in signal_ids]
+
+    def get_orders(self, signal_id: Optional[int] = None) -> List['BaseOrder']:
+        return [order for order in self._orders if signal_id is None or order.signal_id == signal_id]
+
+    def _bulk_create(self):
+        from apps.crontask.utils import get_or_create_crontask
+        from .models import OrderOutbox
+        outbox_enabled = get_or_create_crontask().order_outbox_enabled
+        pending = list(self._orders)
+        with transaction.atomic():
+            while pending:
+                # Orders referred by other orders of the step are created first
+                ready = [order for order in pending if not self._get_not_saved_related(order)]
+                if not ready:
+                    raise ValueError(f"Related orders of '{pending}' have not been created")
+                orders_by_model: Dict[Type['BaseOrder'], List['BaseOrder']] = dict()
+                for order in ready:
+                    for field in order._meta.concrete_fields:
+                        # Ids of related orders are known only after their creation
+                        if field.is_relation and field.is_cached(order) and field.get_cached_value(order) is not None:
+                            setattr(order, field.attname, field.get_cached_value(order).pk)
+                    orders_by_model.setdefault(type(order), []).append(order)
+                for model, orders in orders_by_model.items():
+                    model.objects.bulk_create(orders)
+                    if outbox_enabled:
+                        OrderOutbox.add_intents(orders)
+                pending = [order for order in pending if not any(order is created for created in ready)]
+
+    def _resolve_taken_ids_globally(self):
+        """Copied ids of old orders may be taken by orders of other Signals"""
+        for order in self._orders:
+            order.pk = None
+            order._state.adding = True
+        models = {type(order) for order in self._orders}
+        for model in models:
+            orders = [order for order in self._orders if type(order) is model]
+            db_taken_ids = set(model.objects.filter(
+                custom_order_id__in=[order.custom_order_id for order in orders]).values_list(
+                'custom_order_id', flat=True))
+            taken_ids = self._get_taken_ids(model)
+            taken_ids.update(db_taken_ids)
+            for order in orders:
+                if order.custom_order_id in db_taken_ids:
+                    order.custom_order_id = self._get_free_id(order.custom_order_id, taken_ids)
+                    taken_ids.add(order.custom_order_id)
+
+    def create(self) -> List['BaseOrder']:
+        """Create all collected orders by one transaction"""
+        if not self._orders:
+            return []
+        try:
+            self._bulk_create()
+        except IntegrityError as ex:
+            logger.warning(f"Order builder: custom_order_ids are taken, they will be changed: '{ex}'")
+            self._resolve_taken_ids_globally()
+            self._bulk_create()
+        orders, self._orders = self._orders, []
+        logger.debug(f"Order builder: {len(orders)} orders have been created")
+        return orders
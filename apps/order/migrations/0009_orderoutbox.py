@@ -0,0 +1,35 @@
+# Generated by Django 3.0.8 on 2026-10-19 10:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('signal', '0022_auto_20220604_0012'),
+        ('order', '0008_auto_20220604_0012'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderOutbox',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('order_side', models.CharField(choices=[('buy', 'BUY'), ('sell', 'SELL')], max_length=4)),
+                ('order_id', models.PositiveIntegerField()),
+                ('custom_order_id', models.CharField(max_length=36, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'PENDING'), ('sending', 'SENDING'), ('sent', 'SENT'), ('skipped', 'SKIPPED'), ('failed', 'FAILED')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('signal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_outbox', to='signal.Signal')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
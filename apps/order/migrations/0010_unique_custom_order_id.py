@@ -0,0 +1,38 @@
+# Generated by Django 3.0.8 on 2026-10-19 10:00
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicated_custom_order_ids(apps, schema_editor):
+    """The latest order keeps its custom_order_id, older duplicates get the suffix by pk"""
+    for model_name in ['BuyOrder', 'SellOrder']:
+        model = apps.get_model('order', model_name)
+        duplicated_ids = model.objects.values('custom_order_id').annotate(
+            count=Count('id')).filter(count__gt=1).values_list('custom_order_id', flat=True)
+        for custom_order_id in list(duplicated_ids):
+            for order in model.objects.filter(custom_order_id=custom_order_id).order_by('-id')[1:]:
+                suffix = f'_d{order.pk}'
+                order.custom_order_id = f'{custom_order_id[:36 - len(suffix)]}{suffix}'
+                order.save(update_fields=['custom_order_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0009_orderoutbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicated_custom_order_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='buyorder',
+            name='custom_order_id',
+            field=models.CharField(max_length=36, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='sellorder',
+            name='custom_order_id',
+            field=models.CharField(max_length=36, unique=True),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.0.8 on 2026-10-19 13:00
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_api_state(apps, schema_editor):
+    """The last state is got from the last record of API history"""
+    for model_name, history_model_name, quantity_field in [
+            ('BuyOrder', 'HistoryApiBuyOrder', 'bought_quantity'),
+            ('SellOrder', 'HistoryApiSellOrder', 'sold_quantity')]:
+        model = apps.get_model('order', model_name)
+        history_model = apps.get_model('order', history_model_name)
+        last_history = history_model.objects.filter(main_order=OuterRef('pk')).order_by('-id')
+        model.objects.filter(pk__in=history_model.objects.values('main_order')).update(
+            api_status=Subquery(last_history.values('status')[:1]),
+            api_executed_quantity=Subquery(last_history.values(quantity_field)[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0010_unique_custom_order_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='buyorder',
+            name='api_status',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='buyorder',
+            name='api_executed_quantity',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sellorder',
+            name='api_status',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='sellorder',
+            name='api_executed_quantity',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_api_state, migrations.RunPython.noop),
+    ]
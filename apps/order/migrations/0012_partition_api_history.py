@@ -0,0 +1,29 @@
+# Generated by Django 3.0.8 on 2026-10-19 14:00
+
+from django.db import migrations
+
+from utils.framework.partitions import convert_to_partitioned
+
+PARTITIONS_AHEAD_MONTHS = 3
+
+
+def partition_api_history(apps, schema_editor):
+    """API history of orders is partitioned by month of the created field (PostgreSQL only)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        convert_to_partitioned(cursor, 'order_historyapibuyorder', 'main_order_id', 'order_buyorder',
+                               PARTITIONS_AHEAD_MONTHS)
+        convert_to_partitioned(cursor, 'order_historyapisellorder', 'main_order_id', 'order_sellorder',
+                               PARTITIONS_AHEAD_MONTHS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0011_api_state'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_api_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.0.8 on 2026-10-19 18:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0012_partition_api_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderoutbox',
+            name='due_time',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
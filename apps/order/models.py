@@ -1,13 +1,23 @@
 import logging
 
-from typing import Optional, TYPE_CHECKING
+from datetime import timedelta
+from typing import Dict, List, Optional, TYPE_CHECKING
 
 from django.db import models, transaction
+from django.db.models import Q
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
-from apps.order.utils import OrderStatus, OrderType, COMPLETED_ORDER_STATUSES, ORDER_STATUSES_FOR_PULL_JOB
+from apps.order.utils import (
+    OrderStatus, OrderType, OutboxStatus,
+    BALANCE_CHANGING_ORDER_STATUSES, COMPLETED_ORDER_STATUSES, NOT_EXISTS_ORDER_STATUSES, NOT_FINISHED_OUTBOX_STATUSES,
+    ORDER_STATUSES_FOR_PULL_JOB, ORDER_STATUSES_FOR_PUSH_JOB,
+)
 from apps.market.models import Market
+from apps.signal.balance import BalanceService
 from apps.signal.models import Signal
+from binfun.settings import conf_obj
+from utils.framework.models import SystemBaseModel
 from .base_model import (
     BaseBuyOrder,
     BaseSellOrder,
@@ -15,7 +25,8 @@ from .base_model import (
 )
 
 if TYPE_CHECKING:
-    from apps.market.base_model import BaseMarket
+    from apps.market.base_model import BaseMarket, PartialResponse
+    from .base_model import BaseOrder
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -55,7 +66,7 @@ class BuyOrder(BaseBuyOrder):
         """Form BUY TAKE PROFIT order"""
         calculated_real_trigger_price = signal.get_real_stop_price(
             price=price, lower=False) if trigger_price is None else trigger_price
-        order = cls.objects.create(
+        order = cls._create(
             market=market,
             symbol=signal.symbol,
             quantity=quantity,
@@ -74,7 +85,7 @@ class BuyOrder(BaseBuyOrder):
                               index: int):
         """Form BUY LIMIT order"""
         default_stop_loss = 0
-        order = cls.objects.create(
+        order = cls._create(
             market=market,
             symbol=signal.symbol,
             quantity=quantity,
@@ -93,7 +104,7 @@ class BuyOrder(BaseBuyOrder):
                                price: float,
                                custom_order_id: Optional[str]):
         """Form BUY MARKET order"""
-        order = cls.objects.create(
+        order = cls._create(
             market=market,
             symbol=signal.symbol,
             quantity=quantity,
@@ -109,9 +120,10 @@ class BuyOrder(BaseBuyOrder):
                                    signal: Signal,
                                    quantity: float,
                                    price: float,
-                                   custom_order_id: Optional[str]):
+                                   custom_order_id: Optional[str],
+                                   index: int):
         """Form BUY STOP LIMIT order"""
-        order = cls.objects.create(
+        order = cls._create(
             market=market,
             symbol=signal.symbol,
             quantity=quantity,
@@ -119,7 +131,7 @@ class BuyOrder(BaseBuyOrder):
             signal=signal,
             custom_order_id=custom_order_id,
             type=OrderType.STOP_LIMIT.value,
-            index=cls.MARKET_INDEX)
+            index=index)
         return order
 
     @classmethod
@@ -140,12 +152,13 @@ class BuyOrder(BaseBuyOrder):
                                   signal: Signal,
                                   quantity: float,
                                   price: float,
+                                  index: int,
                                   custom_order_id: Optional[str] = None):
         """Form STOP_LIMIT BUY order:
         """
         order = cls._form_buy_stop_limit_order(
             market=market, signal=signal, quantity=quantity, price=price,
-            custom_order_id=custom_order_id)
+            custom_order_id=custom_order_id, index=index)
         return order
 
     @classmethod
@@ -155,7 +168,7 @@ class BuyOrder(BaseBuyOrder):
                           price: float,
                           custom_order_id: Optional[str]):
         """Form BUY Global Stop_loss order"""
-        order = cls.objects.create(
+        order = cls._create(
             market=market,
             symbol=signal.symbol,
             quantity=quantity,
@@ -240,6 +253,10 @@ class BuyOrder(BaseBuyOrder):
             return
         logger.debug(f"Get info about BUY order by API: {self}")
         data = self.market_logic.get_order_info(self.symbol, self.custom_order_id)
+        self.update_order_info_by_api_data(data)
+
+    def update_order_info_by_api_data(self, data: 'PartialResponse'):
+        """Update OrderHistory table by already got order info"""
         status, bought_quantity = data.get('status'), data.get('executed_quantity')
         avg_executed_market_price = data.get('avg_executed_market_price')
         self.update_order_api_history(status, bought_quantity, avg_executed_market_price)
@@ -247,23 +264,25 @@ class BuyOrder(BaseBuyOrder):
     # @transaction.atomic
     def update_order_api_history(self, status, executed_quantity, price=None):
         """
-        Create HistoryApiBuyOrder entity if not exists or we got new data (status or executed_quantity).
-        Set Order status (for the first time - SENT)
+        Create HistoryApiBuyOrder entity if we got new data (status or executed_quantity).
+        Set Order status (for the first time - SENT).
+        The last API state is kept by the order: nothing is written if it has not changed
         """
+        if not self._is_api_state_changed(status, executed_quantity):
+            return
         self._set_updated_by_api_without_saving()
-        last_api_history = HistoryApiBuyOrder.objects.filter(main_order=self).last()
-        if not last_api_history or (last_api_history.status != status or
-                                    last_api_history.bought_quantity != executed_quantity):
-            if price and status in COMPLETED_ORDER_STATUSES:
-                logger.debug(f"'{self}': Update price field for COMPLETED order '{self.price}' -> '{price}'")
-                self.price = price
-            self.status = status
-            self.bought_quantity = executed_quantity
-            HistoryApiBuyOrder.objects.create(main_order=self,
-                                              status=status,
-                                              price=price if price else 0,
-                                              bought_quantity=executed_quantity)
-        self.save()
+        if price and status in COMPLETED_ORDER_STATUSES:
+            logger.debug(f"'{self}': Update price field for COMPLETED order '{self.price}' -> '{price}'")
+            self.price = price
+        self.status = status
+        self.bought_quantity = executed_quantity
+        if status in BALANCE_CHANGING_ORDER_STATUSES:
+            BalanceService.invalidate(self.market_id)
+        HistoryApiBuyOrder.objects.create(main_order=self,
+                                          status=status,
+                                          price=price if price else 0,
+                                          bought_quantity=executed_quantity)
+        self._save_api_state(status, executed_quantity, 'bought_quantity')
 
 
 class SellOrder(BaseSellOrder):
@@ -300,7 +319,7 @@ class SellOrder(BaseSellOrder):
         """Form Stop Loss order by Take Profit order"""
         calculated_real_stop_loss = tp_order.signal.get_real_stop_price(stop_loss_trigger)
         custom_sl_order_id = cls.form_sl_order_id(tp_order)
-        order = cls.objects.create(
+        order = cls._create(
             market=tp_order.market,
             symbol=tp_order.symbol,
             quantity=tp_order.quantity,
@@ -318,7 +337,7 @@ class SellOrder(BaseSellOrder):
     def _form_limit_maker_order(cls, market: 'BaseMarket', signal: Signal, quantity: float,
                                 take_profit: float, custom_order_id: Optional[str], index: int):
         """Form LIMIT MAKER order (TP for OCO) order"""
-        order = cls.objects.create(
+        order = cls._create(
             market=market,
             symbol=signal.symbol,
             quantity=quantity,
@@ -340,7 +359,7 @@ class SellOrder(BaseSellOrder):
         """Form Take Profit order"""
         index = cls.MARKET_INDEX + cls.SPECIAL_APPEND_INDEX + additional_index if \
             additional_index else cls.MARKET_INDEX
-        order = cls.objects.create(
+        order = cls._create(
             market=market,
             symbol=signal.symbol,
             quantity=quantity,
@@ -361,7 +380,7 @@ class SellOrder(BaseSellOrder):
                             trigger_price: Optional[float] = None):
         """Form SELL TAKE PROFIT order"""
         calculated_real_trigger_price = signal.get_real_stop_price(price) if trigger_price is None else trigger_price
-        order = cls.objects.create(
+        order = cls._create(
             market=market,
             symbol=signal.symbol,
             quantity=quantity,
@@ -381,7 +400,7 @@ class SellOrder(BaseSellOrder):
                                custom_order_id: Optional[str],
                                index: int):
         """Form SELL LIMIT order"""
-        order = cls.objects.create(
+        order = cls._create(
             market=market,
             symbol=signal.symbol,
             quantity=quantity,
@@ -400,7 +419,7 @@ class SellOrder(BaseSellOrder):
                                     custom_order_id: Optional[str],
                                     index: int):
         """Form SELL STOP LIMIT order"""
-        order = cls.objects.create(
+        order = cls._create(
             market=market,
             symbol=signal.symbol,
             quantity=quantity,
@@ -418,7 +437,7 @@ class SellOrder(BaseSellOrder):
                           price: float,
                           custom_order_id: Optional[str]):
         """Form SELL Global Stop_loss order"""
-        order = cls.objects.create(
+        order = cls._create(
             market=market,
             symbol=signal.symbol,
             quantity=quantity,
@@ -552,6 +571,10 @@ class SellOrder(BaseSellOrder):
             return
         logger.debug(f"Get info about SELL order by API: {self}")
         data = self.market_logic.get_order_info(self.symbol, self.custom_order_id)
+        self.update_order_info_by_api_data(data)
+
+    def update_order_info_by_api_data(self, data: 'PartialResponse'):
+        """Update OrderHistory table by already got order info"""
         status, sold_quantity, price = data.get('status'), data.get('executed_quantity'), data.get('price')
         avg_executed_market_price = data.get('avg_executed_market_price')
         self.update_order_api_history(status,
@@ -561,28 +584,30 @@ class SellOrder(BaseSellOrder):
     # @transaction.atomic
     def update_order_api_history(self, status: str, executed_quantity: float, price: Optional[float] = None):
         """
-        Create HistoryApiSellOrder entity if not exists or we got new data (status or executed_quantity).
-        Set Order status (for the first time - SENT)
+        Create HistoryApiSellOrder entity if we got new data (status or executed_quantity).
+        Set Order status (for the first time - SENT).
+        The last API state is kept by the order: nothing is written if it has not changed
         """
+        if not self._is_api_state_changed(status, executed_quantity):
+            return
         self._set_updated_by_api_without_saving()
-        last_api_history = HistoryApiSellOrder.objects.filter(main_order=self).last()
-        if not last_api_history or (last_api_history.status != status or
-                                    last_api_history.sold_quantity != executed_quantity):
-            # Update order
-            if price and status in COMPLETED_ORDER_STATUSES:
-                logger.debug(f"'{self}': Update price field for COMPLETED order '{self.price}' -> '{price}'")
-                self.price = price
-            self.status = status
-            self.sold_quantity = executed_quantity
-            if self.type == OrderType.MARKET.value and price:
-                logger.debug(f"Update price for Market order '{self}' = {self.price} -> {price}")
-                self.price = price
-            # Create history record
-            HistoryApiSellOrder.objects.create(main_order=self,
-                                               status=status,
-                                               price=price if price else 0,
-                                               sold_quantity=executed_quantity)
-        self.save()
+        # Update order
+        if price and status in COMPLETED_ORDER_STATUSES:
+            logger.debug(f"'{self}': Update price field for COMPLETED order '{self.price}' -> '{price}'")
+            self.price = price
+        self.status = status
+        self.sold_quantity = executed_quantity
+        if status in BALANCE_CHANGING_ORDER_STATUSES:
+            BalanceService.invalidate(self.market_id)
+        if self.type == OrderType.MARKET.value and price:
+            logger.debug(f"Update price for Market order '{self}' = {self.price} -> {price}")
+            self.price = price
+        # Create history record
+        HistoryApiSellOrder.objects.create(main_order=self,
+                                           status=status,
+                                           price=price if price else 0,
+                                           sold_quantity=executed_quantity)
+        self._save_api_state(status, executed_quantity, 'sold_quantity')
 
 
 class HistoryApiBuyOrder(HistoryApiBaseOrder):
@@ -608,6 +633,130 @@ class HistoryApiSellOrder(HistoryApiBaseOrder):
     def __str__(self):
         return f"HASO_{self.pk}:Main_order:{self.main_order}"
 
+class OrderOutbox(SystemBaseModel):
+    """
+    Intents to push new orders to the Market (transactional outbox).
+    An intent is created in the same transaction as the order and drained by order_outbox_sender.
+    custom_order_id is the idempotency key: a retried order is pushed only if the Market doesn't know it.
+    Intents of a busy Signal and postponed ones (minor api errors, backoff by attempts) wait until due_time
+    """
+    ORDER_SIDES = [('buy', 'BUY'), ('sell', 'SELL')]
+
+    signal = models.ForeignKey(to=Signal,
+                               related_name='order_outbox',
+                               on_delete=models.CASCADE)
+    order_side = models.CharField(max_length=4, choices=ORDER_SIDES)
+    order_id = models.PositiveIntegerField()
+    custom_order_id = models.CharField(max_length=36, unique=True)
+    status = models.CharField(max_length=16,
+                              choices=OutboxStatus.choices(),
+                              default=OutboxStatus.PENDING.value)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    due_time = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = models.Manager()
+
+    def __str__(self):
+        return f"OB_{self.pk}:{self.order_side}:{self.custom_order_id}:{self.status}"
+
+    @classmethod
+    def add_intent(cls, order: 'BaseOrder') -> 'OrderOutbox':
+        return cls.objects.create(signal_id=order.signal_id,
+                                  order_side=order.type_,
+                                  order_id=order.pk,
+                                  custom_order_id=order.custom_order_id)
+
+    @classmethod
+    def add_intents(cls, orders: List['BaseOrder']) -> List['OrderOutbox']:
+        """Add intents of bulk created orders"""
+        return cls.objects.bulk_create([
+            cls(signal_id=order.signal_id,
+                order_side=order.type_,
+                order_id=order.pk,
+                custom_order_id=order.custom_order_id) for order in orders
+            if order.status == OrderStatus.NOT_SENT.value and not order.no_need_push])
+
+    @classmethod
+    def get_not_finished_custom_order_ids(cls, signal: Signal):
+        return cls.objects.filter(signal=signal,
+                                  status__in=NOT_FINISHED_OUTBOX_STATUSES).values_list('custom_order_id', flat=True)
+
+    @classmethod
+    def claim(cls, batch_size: int) -> List['OrderOutbox']:
+        """
+        Take due PENDING intents (and SENDING ones stuck by a crashed sender).
+        Rows locked by another sender are skipped
+        """
+        now_ = timezone.now()
+        stuck_time = now_ - timedelta(seconds=conf_obj.allowable_duration_of_task_secs)
+        with transaction.atomic():
+            intents = list(cls.objects.select_for_update(skip_locked=True).filter(
+                Q(status=OutboxStatus.PENDING.value, due_time__lte=now_) |
+                Q(status=OutboxStatus.SENDING.value, modified__lt=stuck_time)).order_by('id')[:batch_size])
+            cls.objects.filter(pk__in=[intent.pk for intent in intents]).update(
+                status=OutboxStatus.SENDING.value, modified=timezone.now())
+        return intents
+
+    @classmethod
+    def drain(cls, batch_size: Optional[int] = None) -> int:
+        """Push orders of a batch of intents grouped by Signal. Returns number of sent intents"""
+        intents = cls.claim(batch_size or conf_obj.order_outbox_batch_size)
+        intents_by_signal: Dict[int, List['OrderOutbox']] = dict()
+        for intent in intents:
+            intents_by_signal.setdefault(intent.signal_id, []).append(intent)
+        for signal in Signal.objects.filter(pk__in=intents_by_signal):
+            signal_intents = intents_by_signal[signal.pk]
+            if not signal.push_outbox_intents(signal_intents):
+                # The Signal is busy with another task, the intents will be claimed after the delay
+                cls.objects.filter(pk__in=[intent.pk for intent in signal_intents]).update(
+                    status=OutboxStatus.PENDING.value,
+                    due_time=timezone.now() + timedelta(seconds=conf_obj.order_outbox_retry_delay_secs))
+        # Postponed and not handled intents don't keep the sender from the idle pause
+        return sum(intent.status == OutboxStatus.SENT.value for intent in intents)
+
+    def get_order(self) -> Optional['BaseOrder']:
+        order_class = BuyOrder if self.order_side == 'buy' else SellOrder
+        return order_class.objects.filter(pk=self.order_id).first()
+
+    def _finish(self, status: str, error: str = ''):
+        self.status = status
+        self.error = error
+        self.save()
+
+    def postpone(self, ex: Exception):
+        """Minor error: the order will be pushed again after the delay doubled by each attempt"""
+        delay_secs = min(conf_obj.order_outbox_retry_delay_secs * 2 ** max(self.attempts - 1, 0),
+                         conf_obj.order_outbox_max_retry_delay_secs)
+        self.due_time = timezone.now() + timedelta(seconds=delay_secs)
+        self._finish(OutboxStatus.PENDING.value, str(ex))
+
+    def fail(self, ex: Exception):
+        self._finish(OutboxStatus.FAILED.value, str(ex))
+
+    def send(self, order: Optional['BaseOrder']) -> bool:
+        """
+        Push the order if it is still NOT_SENT and the Market doesn't know it yet.
+        True if the order is on the Market now
+        """
+        if not order or order.status not in ORDER_STATUSES_FOR_PUSH_JOB or order.local_canceled or order.no_need_push:
+            self._finish(OutboxStatus.SKIPPED.value)
+            return False
+        if self.attempts:
+            # The previous attempt could reach the Market before the crash, don't push the order twice
+            data = order.market_logic.get_order_info(order.symbol, order.custom_order_id, retry_count=1)
+            if data.get('status') not in NOT_EXISTS_ORDER_STATUSES:
+                logger.debug(f"Order '{order}' is already known by the Market: '{data.get('status')}'")
+                order.update_order_info_by_api_data(data)
+                self._finish(OutboxStatus.SENT.value)
+                return True
+        self.attempts += 1
+        self.save()
+        order.push_to_market()
+        self._finish(OutboxStatus.SENT.value)
+        return True
+
+
 # class BuyOrderWorker(SystemBaseModel):
 #     master_buy_order = models.ForeignKey(to=BuyOrder,
 #                                          related_name='buy_worker',
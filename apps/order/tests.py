@@ -0,0 +1,38 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.crontask.models import CronTask
+from apps.market.models import Market
+from apps.order.models import BuyOrder, SellOrder
+from apps.order.utils import OrderType
+from apps.signal.models import Signal, SignalOrig, EntryPoint
+from apps.techannel.models import Techannel
+
+
+class StopLimitEntryPointsTest(TestCase):
+    """Futures LONG Signal formed with STOP_LIMIT entries gets an order by each EP"""
+    entry_points = [100.0, 95.0, 90.0]
+
+    def setUp(self):
+        # bulk_create: without pairs refresh by the Market API and history writes on save
+        market, = Market.objects.bulk_create([Market(name='BiFutures')])
+        techannel, = Techannel.objects.bulk_create([Techannel(name='test_channel', abbr='tst')])
+        signal_orig, = SignalOrig.objects.bulk_create([SignalOrig(
+            techannel=techannel, symbol='BTCUSDT', outer_signal_id=1, main_coin='USDT', stop_loss=80.0)])
+        self.signal, = Signal.objects.bulk_create([Signal(
+            signal_orig=signal_orig, market=market, techannel=techannel,
+            symbol='BTCUSDT', outer_signal_id=1, main_coin='USDT', stop_loss=80.0)])
+        EntryPoint.objects.bulk_create([EntryPoint(signal=self.signal, value=value) for value in self.entry_points])
+        CronTask.objects.create(entry_with_stop_limit=True)
+
+    @mock.patch.object(Signal, '_get_distributed_toc_quantity', return_value=1.0)
+    def test_each_entry_point_gets_order(self, _):
+        self.assertTrue(self.signal._first_formation_futures_long_orders())
+
+        orders = BuyOrder.objects.filter(signal=self.signal, type=OrderType.STOP_LIMIT.value)
+        self.assertEqual(orders.count(), len(self.entry_points))
+        self.assertEqual(len(set(orders.values_list('custom_order_id', flat=True))), len(self.entry_points))
+        self.assertEqual(sorted(orders.values_list('price', flat=True)), sorted(self.entry_points))
+        gl_sl_order = SellOrder.objects.get(signal=self.signal, index=SellOrder.GL_SM_INDEX)
+        self.assertEqual(gl_sl_order.quantity, len(self.entry_points))
@@ -48,6 +48,12 @@ SENT_ORDERS_STATUSES = [
     OrderStatus.PARTIAL.value,
     OrderStatus.NOT_EXISTS.value,
 ]
+# Free balance of the account changes (see BalanceService)
+BALANCE_CHANGING_ORDER_STATUSES = [
+    OrderStatus.COMPLETED.value,
+    OrderStatus.PARTIAL.value,
+    OrderStatus.CANCELED.value,
+]
 
 
 class OrderType(Enum):
@@ -65,3 +71,20 @@ class OrderType(Enum):
     def choices(cls):
         return [(key.value, key.name) for key in cls]
 
+
+class OutboxStatus(Enum):
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    SKIPPED = 'skipped'
+    FAILED = 'failed'
+
+    @classmethod
+    def choices(cls):
+        return [(key.value, key.name) for key in cls]
+
+
+NOT_FINISHED_OUTBOX_STATUSES = [
+    OutboxStatus.PENDING.value,
+    OutboxStatus.SENDING.value,
+]
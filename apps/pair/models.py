@@ -4,6 +4,7 @@ from asgiref.sync import sync_to_async
 from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from .base_model import BasePair
+from .ticks import PairTicks
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -33,6 +34,10 @@ class Pair(BasePair):
     def __str__(self):
         return f"{self.symbol}:{self.market}"
 
+    @property
+    def ticks(self) -> PairTicks:
+        return PairTicks.from_steps(self.step_price, self.step_quantity)
+
     @classmethod
     def get_pair(cls, symbol: str, market: Market):
         pair = cls.objects.filter(symbol=symbol, market=market).first()
@@ -0,0 +1,83 @@
+import logging
+
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from apps.market.base_model import BaseMarket
+
+logger = logging.getLogger(__name__)
+
+# Characters which OCR usually mixes up (both directions)
+OCR_CONFUSIONS = (
+    ('I', 'L'), ('I', '1'), ('I', 'V'), ('I', 'T'), ('O', '0'), ('O', 'D'), ('O', 'Q'),
+    ('S', '5'), ('B', '8'), ('Z', '2'), ('G', '6'), ('U', 'V'), ('M', 'N'),
+)
+OCR_TRANSLATION = str.maketrans({'l': 'I', '|': 'I', '0': 'O'})
+
+
+class SymbolIndex:
+    """
+    Snapshot of known symbols and their last ticker prices (from the Pair table)
+    with lookup of misrecognized symbols: only substitutions of OCR-confusable characters are corrected
+    and only if one known symbol is the closest (a new symbol isn't taken for another pair).
+    Pairs without ticker price yet (default 0) aren't indexed: the price is used as a real one
+    """
+    confusion_cost = 0.5
+    max_distance = 1.0
+
+    def __init__(self, prices: Dict[str, float]):
+        self.prices = prices
+        self._confusions = {frozenset(pair) for pair in OCR_CONFUSIONS}
+
+    @classmethod
+    def load(cls, market: Optional['BaseMarket'] = None) -> 'SymbolIndex':
+        """Build the index by one query"""
+        from apps.market.models import get_or_create_market
+        from apps.pair.models import Pair
+        market = market or get_or_create_market()
+        prices = dict(Pair.objects.filter(market=market, last_ticker_price__gt=0).values_list(
+            'symbol', 'last_ticker_price'))
+        logger.debug(f"Symbol index has been loaded: {len(prices)} symbols of '{market}'")
+        return cls(prices)
+
+    def _distance(self, first: str, second: str) -> Optional[float]:
+        """Cost of substitutions of OCR-confusable characters (None if other edits are needed)"""
+        if len(first) != len(second):
+            return None
+        distance = 0.0
+        for first_char, second_char in zip(first, second):
+            if first_char == second_char:
+                continue
+            if frozenset((first_char, second_char)) not in self._confusions:
+                return None
+            distance += self.confusion_cost
+        return distance
+
+    def find_symbol(self, symbol: str) -> Optional[str]:
+        """Get the known symbol or the closest one if the symbol was misrecognized"""
+        if not symbol:
+            return None
+        if symbol in self.prices:
+            return symbol
+        symbol = '1INCHUSDT' if 'INCHUSDT' in symbol else symbol.translate(OCR_TRANSLATION).upper()
+        if symbol in self.prices:
+            return symbol
+        candidates: List[Tuple[float, str]] = []
+        for known_symbol in self.prices:
+            distance = self._distance(symbol, known_symbol)
+            if distance is not None and distance <= self.max_distance:
+                candidates.append((distance, known_symbol))
+        candidates.sort()
+        if not candidates:
+            logger.warning(f"Symbol '{symbol}' not found in the symbol index")
+            return None
+        if len(candidates) > 1 and candidates[0][0] == candidates[1][0]:
+            logger.warning(f"Symbol '{symbol}' is ambiguous: "
+                           f"{[known_symbol for distance, known_symbol in candidates if distance == candidates[0][0]]}")
+            return None
+        distance, found_symbol = candidates[0]
+        logger.debug(f"Symbol '{symbol}' has been corrected to '{found_symbol}' (distance {distance})")
+        return found_symbol
+
+    def get_price(self, symbol: str) -> Optional[float]:
+        return self.prices.get(symbol)
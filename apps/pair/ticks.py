@@ -0,0 +1,72 @@
+import logging
+
+from decimal import Decimal
+from functools import lru_cache
+from typing import NamedTuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class TickSize(NamedTuple):
+    """
+    Fixed-point representation of values by the step of the Pair (step_price or step_quantity).
+    A value is kept as integer number of ticks: value = ticks * units / scale
+    """
+    decimals: int
+    scale: int
+    units: int
+    # Float noise of value * scale is much less than one millionth of the smallest decimal unit
+    guard = 1e-6
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def from_step(cls, step: float) -> 'TickSize':
+        step_decimal = Decimal(repr(step)).normalize()
+        decimals = max(-step_decimal.as_tuple().exponent, 0)
+        scale = 10 ** decimals
+        units = int(step_decimal * scale)
+        if units <= 0:
+            raise ValueError(f"Step must be positive: '{step}'")
+        return cls(decimals=decimals, scale=scale, units=units)
+
+    def to_ticks(self, value: float) -> int:
+        """Number of whole steps in the value (rounding down)"""
+        return int(np.floor(value * self.scale + self.guard)) // self.units
+
+    def to_ticks_array(self, values: np.ndarray) -> np.ndarray:
+        """The same as to_ticks for arrays of values (order ladders)"""
+        return np.floor(np.asarray(values, dtype=float) * self.scale + self.guard).astype(np.int64) // self.units
+
+    def to_float(self, ticks: Union[int, np.ndarray]) -> Union[float, np.ndarray]:
+        """The nearest float of the exact decimal value"""
+        return ticks * self.units / self.scale
+
+    def to_str(self, ticks: int) -> str:
+        """Exact decimal value for the API"""
+        units = int(ticks) * self.units
+        sign = '-' if units < 0 else ''
+        integer_part, fractional_part = divmod(abs(units), self.scale)
+        if not self.decimals:
+            return f'{sign}{integer_part}'
+        return f'{sign}{integer_part}.{fractional_part:0{self.decimals}d}'
+
+    def floor(self, value: float) -> float:
+        return self.to_float(self.to_ticks(value))
+
+    def floor_array(self, values: np.ndarray) -> np.ndarray:
+        return self.to_float(self.to_ticks_array(values))
+
+    def format(self, value: float) -> str:
+        return self.to_str(self.to_ticks(value))
+
+
+class PairTicks(NamedTuple):
+    """Precomputed tick sizes of the Pair"""
+    price: TickSize
+    quantity: TickSize
+
+    @classmethod
+    def from_steps(cls, step_price: float, step_quantity: float) -> 'PairTicks':
+        return cls(price=TickSize.from_step(step_price), quantity=TickSize.from_step(step_quantity))
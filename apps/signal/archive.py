@@ -0,0 +1,153 @@
+import logging
+
+from datetime import timedelta
+from typing import Dict, List, NamedTuple, Optional, Sequence, Type
+
+from django.db import connection, models, transaction
+from django.db.models.query import RawQuerySet
+from django.utils import timezone
+
+from binfun.settings import conf_obj
+from .utils import SignalStatus
+
+logger = logging.getLogger(__name__)
+
+
+class ArchivedModel(NamedTuple):
+    """Model moved to the archive with the Signal and the field which refers to the Signal"""
+    model: Type[models.Model]
+    signal_lookup: str
+
+
+class SignalArchive:
+    """
+    CLOSED Signals older than N days are moved with their points, orders and history
+    into the tables of the archive schema (the same columns, without constraints).
+    Views '<table>_all' of the archive schema join live and archived rows for reporting (see raw)
+    """
+    schema = 'archive'
+
+    def __init__(self, days: Optional[float] = None, batch_size: Optional[int] = None):
+        self.days = conf_obj.archive_closed_signals_after_days if days is None else days
+        self.batch_size = batch_size or conf_obj.archive_batch_size
+
+    @staticmethod
+    def get_archived_models() -> List[ArchivedModel]:
+        """Parents first"""
+        from apps.order.models import BuyOrder, SellOrder, HistoryApiBuyOrder, HistoryApiSellOrder, OrderOutbox
+        from .models import Signal, EntryPoint, TakeProfit, HistorySignal
+        return [
+            ArchivedModel(Signal, 'pk'),
+            ArchivedModel(EntryPoint, 'signal'),
+            ArchivedModel(TakeProfit, 'signal'),
+            ArchivedModel(HistorySignal, 'main_signal'),
+            ArchivedModel(BuyOrder, 'signal'),
+            ArchivedModel(SellOrder, 'signal'),
+            ArchivedModel(HistoryApiBuyOrder, 'main_order__signal'),
+            ArchivedModel(HistoryApiSellOrder, 'main_order__signal'),
+            ArchivedModel(OrderOutbox, 'signal'),
+        ]
+
+    @classmethod
+    def _quote(cls, name: str) -> str:
+        return connection.ops.quote_name(name)
+
+    @classmethod
+    def _get_archive_table(cls, model: Type[models.Model]) -> str:
+        return f'{cls._quote(cls.schema)}.{cls._quote(model._meta.db_table)}'
+
+    @classmethod
+    def get_view(cls, model: Type[models.Model]) -> str:
+        return f'{cls._quote(cls.schema)}.{cls._quote(model._meta.db_table + "_all")}'
+
+    @staticmethod
+    def _get_columns(model: Type[models.Model]) -> List[str]:
+        return [field.column for field in model._meta.concrete_fields]
+
+    @classmethod
+    def prepare(cls):
+        """Create the archive tables and views (columns added by later migrations are added too)"""
+        quote = cls._quote
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {quote(cls.schema)}')
+            for archived in cls.get_archived_models():
+                model = archived.model
+                table = model._meta.db_table
+                cursor.execute(f'CREATE TABLE IF NOT EXISTS {cls._get_archive_table(model)} (LIKE {quote(table)})')
+                cursor.execute('SELECT column_name FROM information_schema.columns '
+                               'WHERE table_schema = %s AND table_name = %s', [cls.schema, table])
+                archived_columns = {row[0] for row in cursor.fetchall()}
+                for field in model._meta.concrete_fields:
+                    if field.column not in archived_columns:
+                        cursor.execute(f'ALTER TABLE {cls._get_archive_table(model)} '
+                                       f'ADD COLUMN {quote(field.column)} {field.db_type(connection)}')
+                columns = ', '.join(quote(column) for column in cls._get_columns(model))
+                cursor.execute(f'DROP VIEW IF EXISTS {cls.get_view(model)}')
+                cursor.execute(f'CREATE VIEW {cls.get_view(model)} AS '
+                               f'SELECT {columns} FROM {quote(table)} '
+                               f'UNION ALL SELECT {columns} FROM {cls._get_archive_table(model)}')
+
+    def _get_signal_ids(self) -> List[int]:
+        from .models import Signal
+        border = timezone.now() - timedelta(days=self.days)
+        return list(Signal.objects.filter(
+            _status=SignalStatus.CLOSED.value, modified__lt=border).order_by('id').values_list(
+            'id', flat=True)[:self.batch_size])
+
+    def _move(self, cursor, model: Type[models.Model], ids: Sequence[int]):
+        if not ids:
+            return
+        quote = self._quote
+        columns = ', '.join(quote(column) for column in self._get_columns(model))
+        table = quote(model._meta.db_table)
+        cursor.execute(f'INSERT INTO {self._get_archive_table(model)} ({columns}) '
+                       f'SELECT {columns} FROM {table} WHERE id = ANY(%s)', [list(ids)])
+
+    @staticmethod
+    def _delete(cursor, model: Type[models.Model], ids: Sequence[int]):
+        if ids:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+                           f'WHERE id = ANY(%s)', [list(ids)])
+
+    def archive_batch(self) -> int:
+        """Move one batch of Signals by one transaction. Returns number of archived Signals"""
+        with transaction.atomic():
+            signal_ids = self._get_signal_ids()
+            if not signal_ids:
+                return 0
+            from .models import SignalWorkItem
+            # Work items aren't archived
+            SignalWorkItem.objects.filter(signal__in=signal_ids).delete()
+            archived_models = self.get_archived_models()
+            ids_by_model: Dict[Type[models.Model], List[int]] = {
+                archived.model: list(archived.model.objects.filter(
+                    **{f'{archived.signal_lookup}__in': signal_ids}).values_list('id', flat=True))
+                for archived in archived_models
+            }
+            with connection.cursor() as cursor:
+                for archived in archived_models:
+                    self._move(cursor, archived.model, ids_by_model[archived.model])
+                # Constraints are deferred, children are deleted first anyway
+                for archived in reversed(archived_models):
+                    self._delete(cursor, archived.model, ids_by_model[archived.model])
+        logger.debug(f"Archive: {len(signal_ids)} CLOSED Signals have been archived")
+        return len(signal_ids)
+
+    def run(self) -> int:
+        """Archive all CLOSED Signals older than N days by batches"""
+        if connection.vendor != 'postgresql':
+            logger.warning("Archive: only PostgreSQL is supported")
+            return 0
+        self.prepare()
+        archived = 0
+        while True:
+            count = self.archive_batch()
+            archived += count
+            if count < self.batch_size:
+                return archived
+
+    @classmethod
+    def raw(cls, model: Type[models.Model], where: str = '', params: Sequence = ()) -> RawQuerySet:
+        """Live and archived objects of the model (for reporting). where is SQL condition by columns"""
+        condition = f' WHERE {where}' if where else ''
+        return model.objects.raw(f'SELECT * FROM {cls.get_view(model)}{condition}', params)
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from django.db import close_old_connections
+
+from apps.crontask.utils import get_or_create_crontask
+from apps.market.async_logic import AsyncMarketLogicMixin, get_async_market_logic
+from binfun.settings import conf_obj
+from .models import Signal
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncStage(NamedTuple):
+    """Step of the Signal life cycle run by the async worker"""
+    crontask_flag: str
+    get_ids_method: str
+    by_one_signal_method: Optional[str]
+
+
+ASYNC_STAGES: Dict[str, AsyncStage] = {
+    'push': AsyncStage('push_job_enabled', 'push_signals', 'push_orders_by_one_signal'),
+    # Orders info is got by the async Market client, see AsyncSignalWorker._pull
+    'pull': AsyncStage('pull_job_enabled', 'update_signals_info_by_api', None),
+    'trail': AsyncStage('trailing_stop_enabled', 'trailing_stop_worker', 'trail_stop_by_one_signal'),
+}
+
+
+class AsyncSignalWorker:
+    """
+    Run steps of many Signals concurrently on one event loop
+    (instead of one Signal per Celery prefork process).
+    Market requests of the pull step are made by the async client,
+    DB access and the other steps (push and trail use the sync Market logic) are run in a thread pool
+    """
+
+    def __init__(self,
+                 stages: Iterable[str] = tuple(ASYNC_STAGES),
+                 concurrency: Optional[int] = None,
+                 db_threads: Optional[int] = None,
+                 period: Optional[float] = None):
+        self.stages: List[str] = list(stages)
+        self.concurrency = concurrency or conf_obj.async_worker_concurrency
+        self.period = period or conf_obj.common_period_of_cron_celery_tasks_secs
+        self._executor = ThreadPoolExecutor(
+            max_workers=db_threads or conf_obj.async_worker_db_threads, thread_name_prefix='async_worker')
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._async_logics: Dict[str, AsyncMarketLogicMixin] = dict()
+
+    @staticmethod
+    def _call_with_db(func: Callable, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Threads of the pool are long-lived, don't keep stale connections
+            close_old_connections()
+
+    async def _run_in_thread(self, func: Callable, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, lambda: self._call_with_db(func, *args, **kwargs))
+
+    def _get_async_logic(self, market_name: str) -> AsyncMarketLogicMixin:
+        if market_name not in self._async_logics:
+            self._async_logics[market_name] = get_async_market_logic(market_name)
+        return self._async_logics[market_name]
+
+    @staticmethod
+    def _get_signal(signal_id: int) -> Optional[Signal]:
+        return Signal.objects.select_related('market').filter(pk=signal_id).first()
+
+    @staticmethod
+    def _run_by_one_signal(signal_id: int, method_name: str, *args):
+        signal = AsyncSignalWorker._get_signal(signal_id)
+        if signal:
+            getattr(signal, method_name)(*args)
+
+    async def _pull(self, signal_id: int):
+        """Get info about SENT orders of the Signal by concurrent requests and update the orders"""
+        signal = await self._run_in_thread(self._get_signal, signal_id)
+        if not signal:
+            return
+        orders = await self._run_in_thread(signal.get_orders_for_pull)
+        if not orders:
+            return
+        logic = self._get_async_logic(signal.market.name)
+        results = await asyncio.gather(
+            *(logic.async_get_order_info(order.symbol, order.custom_order_id) for order in orders),
+            return_exceptions=True)
+        orders_data = []
+        for order, result in zip(orders, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Get order info Error: Signal:'{signal}' Order: '{order}': Ex: '{result}'")
+                continue
+            orders_data.append((order, result))
+        if orders_data:
+            # The Signal loaded before the requests could be changed by other workers meanwhile
+            await self._run_in_thread(
+                self._run_by_one_signal, signal_id, 'update_orders_info_by_api_data', orders_data)
+
+    async def _run_step(self, stage_name: str, signal_id: int):
+        stage = ASYNC_STAGES[stage_name]
+        async with self._semaphore:
+            try:
+                if stage.by_one_signal_method:
+                    await self._run_in_thread(self._run_by_one_signal, signal_id, stage.by_one_signal_method)
+                else:
+                    await self._pull(signal_id)
+            except Exception as ex:
+                logger.error(f"Async worker: stage '{stage_name}' failed for Signal '{signal_id}': '{ex}'")
+
+    async def run_stage(self, stage_name: str):
+        stage = ASYNC_STAGES[stage_name]
+        crontask = await self._run_in_thread(get_or_create_crontask)
+        if not getattr(crontask, stage.crontask_flag):
+            return
+        ids_list = await self._run_in_thread(
+            lambda: list(getattr(Signal, stage.get_ids_method)(only_get_ids=True)))
+        await asyncio.gather(*(self._run_step(stage_name, signal_id) for signal_id in ids_list))
+        logger.debug(f"Async worker: stage '{stage_name}' has been done for {len(ids_list)} signals")
+
+    async def run(self, once: bool = False):
+        loop = asyncio.get_event_loop()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            while True:
+                started = loop.time()
+                for stage_name in self.stages:
+                    await self.run_stage(stage_name)
+                if once:
+                    break
+                await asyncio.sleep(max(self.period - (loop.time() - started), 0))
+        finally:
+            for logic in self._async_logics.values():
+                await logic.close()
+            self._executor.shutdown(wait=True)
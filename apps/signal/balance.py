@@ -0,0 +1,127 @@
+import logging
+import time
+
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+import redis
+
+from binfun.settings import conf_obj
+from .waits import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class BalanceSnapshot(NamedTuple):
+    """
+    free: available balance got from the Market
+    reserved: amount of not sent EP orders of FORMED Signals
+    committed: amount of EP orders pushed after the balance was got (the Market free balance doesn't reflect it yet)
+    """
+    free: float
+    reserved: float
+    committed: float = 0.0
+
+    @property
+    def available(self) -> float:
+        return self.free - self.reserved - self.committed
+
+
+class BalanceService:
+    """
+    Balance snapshot of the account by main coin kept in Redis.
+    Reservations of FORMED Signals are kept by Signal, so formation and pushing
+    change the snapshot without requests to the Market and aggregates over all Signals.
+    Fills invalidate the snapshot, it is refreshed by the next reading
+    """
+    key_prefix = 'binfun:balance:'
+
+    def __init__(self, market_id: int, coin: str):
+        self.market_id = market_id
+        self.coin = coin
+        self.key = f'{self.key_prefix}{market_id}'
+        self.reservations_key = f'{self.key}:reservations'
+
+    def _get_reservation_field(self, signal_id: int) -> str:
+        return f'{self.coin}:{signal_id}'
+
+    def _read(self) -> Tuple[dict, Dict[bytes, bytes]]:
+        pipe = get_redis_client().pipeline(transaction=True)
+        pipe.hgetall(self.key)
+        pipe.hgetall(self.reservations_key)
+        snapshot_data, reservations = pipe.execute()
+        return snapshot_data, reservations
+
+    def _store(self, free: float, reservations: Dict[int, float], old_fields: List[bytes]):
+        ttl_secs = int(conf_obj.balance_snapshot_ttl_secs)
+        pipe = get_redis_client().pipeline(transaction=True)
+        pipe.hset(self.key, mapping={f'{self.coin}:free': free,
+                                     f'{self.coin}:committed': 0,
+                                     f'{self.coin}:updated': time.time()})
+        # Reservations of the coin are replaced by the actual ones
+        if old_fields:
+            pipe.hdel(self.reservations_key, *old_fields)
+        if reservations:
+            pipe.hset(self.reservations_key, mapping={
+                self._get_reservation_field(signal_id): amount for signal_id, amount in reservations.items()})
+        pipe.expire(self.key, ttl_secs)
+        pipe.expire(self.reservations_key, ttl_secs)
+        pipe.execute()
+
+    def get_snapshot(self, refresh: Callable[[], Tuple[float, Dict[int, float]]]) -> BalanceSnapshot:
+        """
+        Read the snapshot by one transaction.
+        refresh returns free balance from the Market and reservations of FORMED Signals (by Signal id)
+        """
+        try:
+            snapshot_data, reservations = self._read()
+            prefix = f'{self.coin}:'.encode()
+            coin_reservations = {field: amount for field, amount in reservations.items() if field.startswith(prefix)}
+            updated = float(snapshot_data.get(prefix + b'updated', 0))
+            if time.time() - updated <= conf_obj.balance_snapshot_ttl_secs:
+                return BalanceSnapshot(
+                    free=float(snapshot_data[prefix + b'free']),
+                    reserved=sum(float(amount) for amount in coin_reservations.values()),
+                    committed=float(snapshot_data.get(prefix + b'committed', 0)))
+            free, reservations_by_signal = refresh()
+            self._store(free, reservations_by_signal, list(coin_reservations))
+        except redis.RedisError as ex:
+            logger.warning(f"Balance snapshot: Redis is not available, the balance is got from the Market: '{ex}'")
+            free, reservations_by_signal = refresh()
+        snapshot = BalanceSnapshot(free=free, reserved=sum(reservations_by_signal.values()))
+        logger.debug(f"Balance snapshot of '{self.coin}' has been refreshed: {snapshot}")
+        return snapshot
+
+    def reserve(self, signal_id: int, amount: float):
+        """The Signal has been formed"""
+        try:
+            get_redis_client().hset(self.reservations_key, self._get_reservation_field(signal_id), amount)
+        except redis.RedisError as ex:
+            logger.warning(f"Balance snapshot: reservation of Signal '{signal_id}' failed: '{ex}'")
+
+    def release(self, signal_id: int, commit: bool = False):
+        """
+        The Signal is not FORMED anymore.
+        If its orders have been pushed the reserved amount is committed
+        """
+        field = self._get_reservation_field(signal_id)
+        try:
+            client = get_redis_client()
+            amount = client.hget(self.reservations_key, field)
+            if amount is None:
+                return
+            pipe = client.pipeline(transaction=True)
+            pipe.hdel(self.reservations_key, field)
+            if commit:
+                pipe.hincrbyfloat(self.key, f'{self.coin}:committed', float(amount))
+            pipe.execute()
+        except redis.RedisError as ex:
+            logger.warning(f"Balance snapshot: release of Signal '{signal_id}' failed: '{ex}'")
+
+    @classmethod
+    def invalidate(cls, market_id: int):
+        """Orders of the market have been filled: free balance has to be got from the Market again"""
+        try:
+            key = f'{cls.key_prefix}{market_id}'
+            get_redis_client().delete(key, f'{key}:reservations')
+        except redis.RedisError as ex:
+            logger.warning(f"Balance snapshot: invalidation failed: '{ex}'")
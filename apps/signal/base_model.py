@@ -101,6 +101,10 @@ class BaseSignal(BaseBaseSignal):
     class Meta:
         abstract = True
 
+    def _write_in_history(self, status: str):
+        """Signals with history add the status to it"""
+        pass
+
     @property
     def market_logic(self) -> 'BaseMarketLogic':
         return self.market.logic
@@ -116,8 +120,10 @@ class BaseSignal(BaseBaseSignal):
     @status.setter
     def status(self, value):
         logger.debug(f'Set Signal status: {self}: {self._status.upper()} -> {value.upper()}')
-        BaseHistorySignal.write_in_history(signal=self, status=value)
+        self._write_in_history(value)
         self._status = value
+        # Waiters of the status are notified after saving
+        self._status_to_notify = value
 
 
 class BasePointOrig(SystemBaseModel):
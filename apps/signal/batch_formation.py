@@ -0,0 +1,173 @@
+import logging
+
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.crontask.utils import get_or_create_crontask
+from apps.order.builder import OrderBuilder
+from apps.order.utils import OrderType
+from apps.pair.models import Pair
+from binfun.settings import conf_obj
+from tools.tools import subtract_fee
+from .models import Signal
+from .utils import SignalStatus
+
+logger = logging.getLogger(__name__)
+
+
+class BatchFormation:
+    """
+    First formation of NEW Signals in one pass.
+    The balance snapshot is read once by Market and main coin, the amount allocated to a Signal
+    is subtracted from the available balance before the next Signal is formed, so Signals don't race for it.
+    Quantities are calculated by arrays of Entry points, orders of all Signals are created in one transaction
+    by the order builder
+    """
+    digits = 8
+
+    def __init__(self, signals: Iterable[Signal], fake_balance: Optional[float] = None):
+        self.signals: List[Signal] = list(signals)
+        self.fake_balance = fake_balance
+        self.crontask = get_or_create_crontask()
+        self._pairs: Dict[Tuple[int, str], Pair] = dict()
+        self._available: Dict[Tuple[int, str], float] = dict()
+        self._not_enough: List[Signal] = []
+        self._builder = OrderBuilder(*self.signals)
+
+    @classmethod
+    def get_new_signals(cls, **params) -> Iterable[Signal]:
+        return Signal.objects.filter(_status=SignalStatus.NEW.value, **params).select_related(
+            'market', 'techannel').prefetch_related('entry_points', 'take_profits').order_by('id')
+
+    def _load_pairs(self):
+        """Trading rules of all symbols by one query"""
+        symbols = {signal.symbol for signal in self.signals}
+        market_ids = {signal.market_id for signal in self.signals}
+        for pair in Pair.objects.filter(symbol__in=symbols, market_id__in=market_ids):
+            self._pairs.setdefault((pair.market_id, pair.symbol), pair)
+
+    def _get_available_balance(self, signal: Signal) -> float:
+        key = (signal.market_id, signal.main_coin)
+        if key not in self._available:
+            self._available[key] = signal._get_current_balance_of_main_coin(fake_balance=self.fake_balance)
+        return self._available[key]
+
+    def _subtract_allocated_amount(self, signal: Signal, amount: float):
+        self._available[(signal.market_id, signal.main_coin)] -= amount
+
+    def _get_turnover(self, signal: Signal) -> float:
+        """How much money we allocate for the Signal (the same as Signal.__get_turnover_by_coin_pair)"""
+        available_minus_inviolable = subtract_fee(self._get_available_balance(signal),
+                                                  conf_obj.inviolable_balance_perc)
+        return round(available_minus_inviolable * signal.techannel.balance_to_signal_perc /
+                     conf_obj.one_hundred_percent, self.digits)
+
+    def _check_if_balance_enough_for_spot(self, signal: Signal, pair: Pair,
+                                          turnover: float, ep_prices: np.ndarray) -> bool:
+        """The same as Signal._check_if_balance_enough_for_signal"""
+        ep_count = len(ep_prices)
+        tp_count = len(signal.take_profits.all()) or 1
+        amount_quantity = subtract_fee(round(turnover / (ep_count * tp_count), self.digits),
+                                       signal.get_market_fee() * ep_count)
+        if amount_quantity < pair.min_amount:
+            logger.debug(f"Bad Check: amount_quantity < min_amount: {amount_quantity} < {pair.min_amount}!")
+            return False
+        coin_quantity = amount_quantity / ep_prices[-1]
+        if coin_quantity < pair.min_quantity:
+            logger.debug(f"Bad Check: coin_quantity < min_quantity: {coin_quantity} < {pair.min_quantity}!")
+            return False
+        return True
+
+    def _calculate_quantities(self, signal: Signal, pair: Pair, ep_prices: np.ndarray) -> Optional[np.ndarray]:
+        """Quantities of all EP orders of the Signal. None if the balance is not enough"""
+        turnover = self._get_turnover(signal)
+        if turnover <= 0:
+            return None
+        if signal._is_market_type_spot() and \
+                not self._check_if_balance_enough_for_spot(signal, pair, turnover, ep_prices):
+            return None
+        toc = turnover * signal.leverage
+        quantities = pair.ticks.quantity.floor_array(toc / len(ep_prices) / ep_prices)
+        if not quantities.all():
+            return None
+        return quantities
+
+    def _new_order(self, model, signal: Signal, quantity: float, price: float, type_: str, index: int):
+        self._builder.add(model(market=signal.market,
+                                signal=signal,
+                                symbol=signal.symbol,
+                                quantity=quantity,
+                                price=price,
+                                type=type_,
+                                index=index))
+
+    def _build_orders(self, signal: Signal, pair: Pair, quantities: np.ndarray, ep_prices: np.ndarray):
+        """EP orders and Global Stop_loss order (for Futures) of the Signal"""
+        from apps.order.models import BuyOrder, SellOrder
+        futures = signal._is_market_type_futures()
+        ep_model, gl_sl_model = (SellOrder, BuyOrder) if signal.is_position_short() else (BuyOrder, SellOrder)
+        ep_type = OrderType.STOP_LIMIT.value \
+            if futures and self.crontask.entry_with_stop_limit else OrderType.LIMIT.value
+        for index, (quantity, price) in enumerate(zip(quantities, ep_prices)):
+            self._new_order(ep_model, signal, float(quantity), float(price), ep_type, index)
+        if futures:
+            self._new_order(gl_sl_model, signal,
+                            quantity=pair.ticks.quantity.floor(float(quantities.sum())),
+                            price=signal.stop_loss,
+                            type_=OrderType.STOP_MARKET.value,
+                            index=gl_sl_model.GL_SM_INDEX)
+
+    def _form_signal(self, signal: Signal) -> bool:
+        pair = self._pairs.get((signal.market_id, signal.symbol))
+        if not pair:
+            logger.warning(f"Pair {signal.symbol} does not exist in '{signal.market}'")
+            return False
+        ep_prices = np.array([entry_point.value for entry_point in signal.entry_points.all()], dtype=float)
+        if not ep_prices.size:
+            logger.warning(f"No Entry points for Signal '{signal}'")
+            return False
+        quantities = self._calculate_quantities(signal, pair, ep_prices)
+        if quantities is None:
+            logger.debug(f"Not enough amount for Signal '{signal}'")
+            self._not_enough.append(signal)
+            return False
+        # The same as amount_by_ep_order of the reserved amount
+        self._subtract_allocated_amount(signal, float((quantities * ep_prices).sum()) / signal.leverage)
+        self._build_orders(signal, pair, quantities, ep_prices)
+        return True
+
+    def _save(self, formed_ids: List[int]) -> List[Signal]:
+        """Create orders of all formed Signals and set the status by one transaction"""
+        busy_border = timezone.now() - timedelta(seconds=conf_obj.allowable_duration_of_task_secs)
+        with transaction.atomic():
+            # Signals taken by another formation are skipped
+            free_ids = set(Signal.objects.select_for_update(skip_locked=True).filter(
+                Q(busy_setting_time__isnull=True) | Q(busy_setting_time__lt=busy_border),
+                pk__in=formed_ids, _status=SignalStatus.NEW.value).values_list('id', flat=True))
+            self._builder.discard(signal_ids=set(formed_ids) - free_ids)
+            self._builder.create()
+            formed_signals = [signal for signal in self.signals if signal.pk in free_ids]
+            for signal in formed_signals:
+                signal.status = SignalStatus.FORMED.value
+                signal.save()
+        return formed_signals
+
+    def run(self) -> List[Signal]:
+        """Form all Signals. Returns formed ones"""
+        if not self.signals:
+            return []
+        self._load_pairs()
+        formed_ids = [signal.pk for signal in self.signals if self._form_signal(signal)]
+        formed_signals = self._save(formed_ids) if formed_ids else []
+        logger.debug(f"BATCH FORMATION: {len(formed_signals)} of {len(self.signals)} Signals have been formed")
+        if self._not_enough and self.crontask.allow_remove_tps_of_eps_for_first_formation:
+            # Removing of TPs or EPs is done by the formation of one Signal
+            for signal in self._not_enough:
+                signal.first_formation_orders_by_one_signal(fake_balance=self.fake_balance)
+        return formed_signals
@@ -0,0 +1,89 @@
+import logging
+import time
+
+from typing import Dict, Iterable, List
+
+import redis
+
+from binfun.settings import conf_obj
+from .waits import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class TaskCoalescer:
+    """
+    Pending markers of queued tasks by (stage, Signal) kept in Redis (sorted set by stage, scored by enqueue time).
+    A marker is set at enqueue and cleared when the task starts: a Signal already waiting in the queue
+    is not enqueued again. Markers older than task_pending_ttl_secs are taken for lost tasks.
+    Number of pending markers is the backlog of the stage
+    """
+    pending_key = 'binfun:pending:{}'
+    dropped_key = 'binfun:pending_dropped'
+
+    def __init__(self, stage_name: str):
+        self.stage_name = stage_name
+        self.key = self.pending_key.format(stage_name)
+
+    def mark_pending(self, signal_ids: Iterable[int]) -> List[int]:
+        """Ids which have to be enqueued (not pending yet)"""
+        signal_ids = list(signal_ids)
+        if not signal_ids:
+            return signal_ids
+        now_ = time.time()
+        try:
+            pipe = get_redis_client().pipeline(transaction=True)
+            pipe.zremrangebyscore(self.key, '-inf', now_ - conf_obj.task_pending_ttl_secs)
+            for signal_id in signal_ids:
+                pipe.zadd(self.key, {signal_id: now_}, nx=True)
+            pipe.zcard(self.key)
+            results = pipe.execute()
+        except redis.RedisError as ex:
+            logger.warning(f"Task coalescing: Redis is not available, all tasks are enqueued: '{ex}'")
+            return signal_ids
+        added = results[1:-1]
+        to_enqueue = [signal_id for signal_id, is_added in zip(signal_ids, added) if is_added]
+        dropped = len(signal_ids) - len(to_enqueue)
+        if dropped:
+            self._count_dropped(dropped)
+            logger.warning(f"Task coalescing: stage '{self.stage_name}': {dropped} tasks are still queued,"
+                           f" backlog: {results[-1]}")
+        return to_enqueue
+
+    def _count_dropped(self, dropped: int):
+        try:
+            get_redis_client().hincrby(self.dropped_key, self.stage_name, dropped)
+        except redis.RedisError:
+            pass
+
+    def clear(self, *signal_ids: int):
+        """The tasks have started"""
+        if not signal_ids:
+            return
+        try:
+            get_redis_client().zrem(self.key, *signal_ids)
+        except redis.RedisError as ex:
+            logger.debug(f"Task coalescing: markers of stage '{self.stage_name}' failed to clear: '{ex}'")
+
+    @classmethod
+    def get_backlog(cls, stage_names: Iterable[str]) -> Dict[str, Dict[str, float]]:
+        """Pending tasks, age of the oldest one (secs) and dropped enqueues by stage"""
+        stage_names = list(stage_names)
+        client = get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        for stage_name in stage_names:
+            key = cls.pending_key.format(stage_name)
+            pipe.zcard(key)
+            pipe.zrange(key, 0, 0, withscores=True)
+        results = pipe.execute()
+        dropped = client.hgetall(cls.dropped_key)
+        now_ = time.time()
+        backlog = dict()
+        for i, stage_name in enumerate(stage_names):
+            pending, oldest = results[2 * i], results[2 * i + 1]
+            backlog[stage_name] = {
+                'pending': pending,
+                'oldest_secs': round(now_ - oldest[0][1], 1) if oldest else 0.0,
+                'dropped': int(dropped.get(stage_name.encode(), 0)),
+            }
+        return backlog
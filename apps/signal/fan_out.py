@@ -0,0 +1,118 @@
+import logging
+import time
+
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import redis
+
+from django.db.models import QuerySet
+
+from binfun.settings import conf_obj, QUEUE_HIGH, QUEUE_MEDIUM, QUEUE_LOW
+from .models import Signal
+from .waits import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class FanOutStage(NamedTuple):
+    """Step of the Signal life cycle run by chunks of Signals"""
+    by_one_signal_method: str
+    # The same queue as the per-signal task of the stage (see CELERY_TASK_ROUTES)
+    queue: str
+    # Points are deleted by the first formation (removing of EPs and TPs), so they aren't prefetched for it
+    prefetch_points: bool = True
+
+
+FAN_OUT_STAGES: Dict[str, FanOutStage] = {
+    'first_forming': FanOutStage('first_formation_orders_by_one_signal', QUEUE_HIGH, prefetch_points=False),
+    'push': FanOutStage('push_orders_by_one_signal', QUEUE_HIGH),
+    'pull': FanOutStage('update_orders_info_by_one_signal', QUEUE_LOW),
+    'bought': FanOutStage('worker_for_bought_orders_by_one_signal', QUEUE_HIGH),
+    'sold': FanOutStage('worker_for_sold_orders_by_one_signal', QUEUE_HIGH),
+    'spoil': FanOutStage('try_to_spoil_by_one_signal', QUEUE_MEDIUM),
+    'close': FanOutStage('try_to_close_by_one_signal', QUEUE_HIGH),
+    'trail': FanOutStage('trail_stop_by_one_signal', QUEUE_MEDIUM),
+}
+
+
+class ChunkedFanOut:
+    """
+    One Celery task handles a chunk of Signals loaded by one query.
+    Chunk size of the stage is adapted by measured cost of one Signal (kept in Redis):
+    a task takes about fan_out_target_task_secs
+    """
+    cost_key = 'binfun:fan_out:cost:{}'
+    # Weight of the last measurement in the smoothed cost
+    cost_smoothing = 0.2
+    # Status and busy flag of not handled Signals of the chunk are read again (by one query) after it
+    stale_secs = 1.0
+
+    def __init__(self, stage_name: str):
+        self.stage_name = stage_name
+        self.stage = FAN_OUT_STAGES[stage_name]
+        self.key = self.cost_key.format(stage_name)
+
+    def _get_cost(self) -> Optional[float]:
+        """Smoothed duration of handling of one Signal, secs"""
+        try:
+            cost = get_redis_client().get(self.key)
+        except redis.RedisError as ex:
+            logger.debug(f"Fan-out: cost of stage '{self.stage_name}' failed to get: '{ex}'")
+            return None
+        return float(cost) if cost else None
+
+    def _record_cost(self, cost: float):
+        old_cost = self._get_cost()
+        if old_cost is not None:
+            cost = old_cost * (1 - self.cost_smoothing) + cost * self.cost_smoothing
+        try:
+            get_redis_client().set(self.key, cost)
+        except redis.RedisError as ex:
+            logger.debug(f"Fan-out: cost of stage '{self.stage_name}' failed to set: '{ex}'")
+
+    def get_chunk_size(self) -> int:
+        cost = self._get_cost()
+        if not cost:
+            return conf_obj.fan_out_chunk_size
+        return max(1, min(int(conf_obj.fan_out_target_task_secs / cost), conf_obj.fan_out_max_chunk_size))
+
+    def split(self, signal_ids: Sequence[int]) -> List[List[int]]:
+        signal_ids = list(signal_ids)
+        chunk_size = self.get_chunk_size()
+        return [signal_ids[i:i + chunk_size] for i in range(0, len(signal_ids), chunk_size)]
+
+    def load(self, signal_ids: Sequence[int]) -> QuerySet:
+        signals = Signal.objects.filter(pk__in=signal_ids).select_related('market', 'techannel').order_by('id')
+        if self.stage.prefetch_points:
+            signals = signals.prefetch_related('entry_points', 'take_profits')
+        return signals
+
+    @staticmethod
+    def _refresh(signals: List[Signal]):
+        """
+        Read status and busy flag of the Signals again by one query.
+        Other fields aren't written back by the lease of refuse_if_busy (update_fields)
+        """
+        states = {pk: (status, busy_setting_time) for pk, status, busy_setting_time in Signal.objects.filter(
+            pk__in=[signal.pk for signal in signals]).values_list('pk', '_status', 'busy_setting_time')}
+        for signal in signals:
+            if signal.pk in states:
+                signal._status, signal.busy_setting_time = states[signal.pk]
+
+    def run_chunk(self, signal_ids: Sequence[int]) -> int:
+        """Handle Signals of the chunk one by one. Returns number of handled Signals"""
+        started = loaded_at = time.monotonic()
+        signals = list(self.load(signal_ids))
+        for i, signal in enumerate(signals):
+            if time.monotonic() - loaded_at > self.stale_secs:
+                self._refresh(signals[i:])
+                loaded_at = time.monotonic()
+            try:
+                getattr(signal, self.stage.by_one_signal_method)()
+            except Exception as ex:
+                # The other Signals of the chunk are handled anyway
+                logger.error(f"Fan-out: stage '{self.stage_name}' failed for Signal '{signal}': '{ex}'")
+        if signals:
+            self._record_cost((time.monotonic() - started) / len(signals))
+        logger.debug(f"Fan-out: stage '{self.stage_name}' has been done for {len(signals)} signals")
+        return len(signals)
@@ -0,0 +1,116 @@
+import atexit
+import logging
+import os
+import threading
+
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional, TYPE_CHECKING
+
+from django.db import close_old_connections, IntegrityError
+
+from binfun.settings import conf_obj
+
+if TYPE_CHECKING:
+    from .models import Signal
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryRecord(NamedTuple):
+    signal: 'Signal'
+    status: str
+
+
+class HistoryBuffer:
+    """
+    Append-only buffer of status changes of Signals.
+    A committed status change is only appended in memory, records are written by one bulk_create
+    by the flusher thread (each flush period or if the buffer is full), at exit
+    and at shutdown of a Celery worker process.
+    The price is taken from the cached prices (Pair table) at flush
+    """
+
+    def __init__(self):
+        self._records: Deque[HistoryRecord] = deque()
+        self._flush_event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def append(self, signal: 'Signal', status: str):
+        self._records.append(HistoryRecord(signal=signal, status=status))
+        self._start_if_needed()
+        if len(self._records) >= conf_obj.history_buffer_size:
+            self._flush_event.set()
+
+    def _start_if_needed(self):
+        # Forked processes (Celery prefork) don't inherit the thread
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='history_flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._flush_event.wait(conf_obj.history_flush_secs)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception as ex:
+                logger.error(f"HistorySignal records failed to write: '{ex}'")
+            finally:
+                close_old_connections()
+
+    def _take(self) -> List[HistoryRecord]:
+        records = []
+        while self._records:
+            records.append(self._records.popleft())
+        return records
+
+    def flush(self) -> int:
+        from apps.pair.models import Pair
+        from .models import HistorySignal
+        records = self._take()
+        if not records:
+            return 0
+        prices = {
+            (market_id, symbol): price for market_id, symbol, price in Pair.objects.filter(
+                symbol__in={record.signal.symbol for record in records},
+                market_id__in={record.signal.market_id for record in records}).values_list(
+                'market_id', 'symbol', 'last_ticker_price')
+        }
+        history_signals = [
+            HistorySignal(main_signal_id=record.signal.pk,
+                          status=record.status,
+                          current_price=prices.get((record.signal.market_id, record.signal.symbol)) or None)
+            for record in records
+        ]
+        try:
+            HistorySignal.objects.bulk_create(history_signals)
+        except IntegrityError as ex:
+            # The Signal has been deleted (archived) since
+            logger.warning(f"HistorySignal records of not existing Signals are dropped: '{ex}'")
+            from .models import Signal
+            existing_ids = set(Signal.objects.filter(
+                pk__in={record.signal.pk for record in records}).values_list('id', flat=True))
+            history_signals = [history_signal for history_signal in history_signals
+                               if history_signal.main_signal_id in existing_ids]
+            HistorySignal.objects.bulk_create(history_signals)
+        logger.debug(f"{len(history_signals)} HistorySignal records have been written")
+        return len(history_signals)
+
+
+history_buffer = HistoryBuffer()
+
+
+@atexit.register
+def flush_at_exit():
+    """Also connected to worker_process_shutdown: atexit handlers may not run in Celery prefork children"""
+    try:
+        history_buffer.flush()
+    except Exception as ex:
+        logger.error(f"HistorySignal records failed to write at exit: '{ex}'")
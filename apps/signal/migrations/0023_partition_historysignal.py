@@ -0,0 +1,27 @@
+# Generated by Django 3.0.8 on 2026-10-19 14:00
+
+from django.db import migrations
+
+from utils.framework.partitions import convert_to_partitioned
+
+PARTITIONS_AHEAD_MONTHS = 3
+
+
+def partition_history_signal(apps, schema_editor):
+    """HistorySignal is partitioned by month of the created field (PostgreSQL only)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        convert_to_partitioned(cursor, 'signal_historysignal', 'main_signal_id', 'signal_signal',
+                               PARTITIONS_AHEAD_MONTHS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('signal', '0022_auto_20220604_0012'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_history_signal, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.0.8 on 2026-10-19 16:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('signal', '0023_partition_historysignal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SignalWorkItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('stage', models.CharField(max_length=16)),
+                ('due_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_until', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('signal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='work_items', to='signal.Signal')),
+            ],
+            options={
+                'unique_together': {('signal', 'stage')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='signalworkitem',
+            index=models.Index(fields=['stage', 'due_time'], name='signal_sign_stage_6f1c2a_idx'),
+        ),
+    ]
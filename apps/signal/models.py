@@ -1,14 +1,16 @@
 import logging
 
-from typing import Optional, List, Set, Union, TYPE_CHECKING, Tuple
+from datetime import timedelta
+from typing import Optional, Dict, List, Set, Union, TYPE_CHECKING, Tuple
 
 from asgiref.sync import sync_to_async
 from django.db import models, transaction
-from django.db.models import QuerySet, Sum, F, Case, When, Avg
+from django.db.models import QuerySet, Sum, F, Case, When, Avg, Min, Max, OuterRef, Q, Subquery
 from django.utils import timezone
 
 from utils.framework.models import (
     BinfunError,
+    SystemBaseModel,
     get_increased_leading_number,
     get_increased_trailing_number,
 )
@@ -29,6 +31,9 @@ from .utils import (
     PUSHED_BOUGHT_SOLD_CANCELING__SIG_STATS, BOUGHT_SOLD__SIG_STATS, BOUGHT__SIG_STATS,
     ERROR__SIG_STATS, STARTED__SIG_STATS, CANCELING__SIG_STATS,
 )
+from .balance import BalanceService, BalanceSnapshot
+from .history import history_buffer
+from .waits import publish_signal_status
 from .exceptions import (
     MainCoinNotServicedError,
     ShortSpotCombinationError,
@@ -42,6 +47,7 @@ from apps.market.models import Market
 from apps.market.utils import MarketType
 from apps.pair.exceptions import PairNotExistsError
 from apps.pair.models import Pair
+from apps.pair.ticks import TickSize
 from apps.techannel.models import Techannel
 from binfun.settings import conf_obj
 from tools.tools import (
@@ -57,6 +63,8 @@ from ..crontask.models import CronTask
 if TYPE_CHECKING:
     from apps.order.models import SellOrder, BuyOrder
     from apps.order.base_model import BaseOrder
+    from apps.market.base_model import PartialResponse
+    from apps.order.models import OrderOutbox
 
 logger = logging.getLogger(__name__)
 
@@ -499,11 +507,19 @@ class Signal(BaseSignal):
         unique_together = ['techannel', 'outer_signal_id', 'market']
 
     def save(self, *args, **kwargs):
-        if self.pk is None:
+        created = self.pk is None
+        if created:
             self.main_coin = self._get_main_coin(self.symbol)
         super().save(*args, **kwargs)
-        if self.pk is None:
-            HistorySignal.write_in_history(self, self.status)
+        if created:
+            self._write_in_history(self.status)
+        if getattr(self, '_status_to_notify', None):
+            self._update_balance_reservation()
+            publish_signal_status(self.pk, self._status_to_notify)
+            self._status_to_notify = None
+
+    def _write_in_history(self, status: str):
+        HistorySignal.write_in_history(self, status)
 
     @rounded_result
     def __get_calculated_amount_spot_or_long(self):
@@ -591,30 +607,59 @@ class Signal(BaseSignal):
         """
         if fake_balance is not None:
             logger.debug(f"FAKE BALANCE: '{fake_balance}'")
-            result = fake_balance
-        else:
-            result = self.market_logic.get_current_balance(self.main_coin)
-        result -= self._get_sum_of_not_sent_orders_for_formed_signals()
-        return result
+            return fake_balance - self._get_sum_of_not_sent_orders_for_formed_signals()
+        # The snapshot is read once for the whole formation of the Signal
+        balance_snapshot = getattr(self, '_balance_snapshot', None) or self._get_balance_snapshot()
+        return balance_snapshot.available
+
+    def _get_balance_service(self) -> BalanceService:
+        return BalanceService(self.market_id, self.main_coin)
+
+    def _get_balance_snapshot(self) -> BalanceSnapshot:
+        return self._get_balance_service().get_snapshot(
+            refresh=lambda: (self.market_logic.get_current_balance(self.main_coin),
+                             self._get_amounts_of_not_sent_orders_for_formed_signals()))
+
+    def _get_formed_signals_with_amounts(self, **params) -> QuerySet:
+        """Annotate amount of not_sent EP orders"""
+        return Signal.objects.filter(**params).annotate(amount_by_ep_order=Sum(Case(
+            When(position='long', then=(
+                    F('buy_orders__quantity') * F('buy_orders__price') / F('leverage'))),
+            When(position='short', then=(
+                    F('sell_orders__quantity') * F('sell_orders__price') / F('leverage'))),
+            output_field=models.FloatField())))
 
     @debug_input_and_returned
-    def _get_sum_of_not_sent_orders_for_formed_signals(self) -> float:
+    def _get_amounts_of_not_sent_orders_for_formed_signals(self) -> Dict[int, float]:
         """
-        Get amount of not_sent EP orders of Formed Signals
+        Get amounts of not_sent EP orders of Formed Signals by Signal id
         """
         params = {
             'main_coin': self.main_coin,
             'market': self.market,
             '_status__in': FORMED__SIG_STATS,
         }
-        qs = Signal.objects.filter(**params).annotate(amount_by_ep_order=Sum(Case(
-            When(position='long', then=(
-                    F('buy_orders__quantity') * F('buy_orders__price') / F('leverage'))),
-            When(position='short', then=(
-                    F('sell_orders__quantity') * F('sell_orders__price') / F('leverage'))),
-            output_field=models.FloatField())))
-        qs = qs.aggregate(Sum('amount_by_ep_order'))
-        return qs['amount_by_ep_order__sum'] or 0
+        qs = self._get_formed_signals_with_amounts(**params).values_list('id', 'amount_by_ep_order')
+        return {signal_id: amount or 0 for signal_id, amount in qs}
+
+    @debug_input_and_returned
+    def _get_sum_of_not_sent_orders_for_formed_signals(self) -> float:
+        """
+        Get amount of not_sent EP orders of Formed Signals
+        """
+        return sum(self._get_amounts_of_not_sent_orders_for_formed_signals().values())
+
+    def _update_balance_reservation(self):
+        """
+        Keep the balance snapshot up to date after the status change:
+        FORMED Signal reserves amount of its EP orders, the amount is committed after pushing
+        """
+        balance_service = self._get_balance_service()
+        if self._status in FORMED__SIG_STATS:
+            qs = self._get_formed_signals_with_amounts(pk=self.pk).values_list('amount_by_ep_order', flat=True)
+            balance_service.reserve(self.pk, qs.first() or 0)
+        else:
+            balance_service.release(self.pk, commit=self._status == SignalStatus.PUSHED.value)
 
     def _get_current_price(self):
         return self.market_logic.get_current_price(self.symbol)
@@ -623,7 +668,10 @@ class Signal(BaseSignal):
         return self.market_logic.market_fee
 
     def _get_pair(self):
-        return Pair.get_pair(self.symbol, self.market)
+        # Rules of the Pair are got once for the Signal object
+        if getattr(self, '_pair', None) is None:
+            self._pair = Pair.get_pair(self.symbol, self.market)
+        return self._pair
 
     @debug_input_and_returned
     @rounded_result
@@ -648,7 +696,6 @@ class Signal(BaseSignal):
         return executed_quantity / self.__get_distribution_by_take_profits()
 
     @staticmethod
-    @rounded_result
     def __find_not_fractional_by_step(value: float, step: float) -> float:
         """
         Round by Market rules
@@ -657,12 +704,9 @@ class Signal(BaseSignal):
         pair.step_price = 0.001
         res = 0.123
         """
-        # For python specific [1.9//0.1*0.1 = 1.8]
-        # [1.90000001//0.1*0.1 = 1.90000001]
-        # we want 1.9, but not 1.8
-        one_satoshi = 0.00000001
-        value += one_satoshi
-        return (value // step) * step
+        # Whole number of steps is counted by integer ticks, so
+        # 1.9 by step 0.1 is 1.9 (not 1.8 as 1.9//0.1*0.1)
+        return TickSize.from_step(step).floor(value)
 
     @debug_input_and_returned
     @rounded_result
@@ -868,7 +912,7 @@ class Signal(BaseSignal):
         return order
 
     @debug_input_and_returned
-    def __form_buy_stop_limit_order(self, quantity: float, price: float) -> 'BuyOrder':
+    def __form_buy_stop_limit_order(self, quantity: float, price: float, index: int) -> 'BuyOrder':
         """
         Form BUY STOP_LIMIT order for the signal
         """
@@ -879,6 +923,7 @@ class Signal(BaseSignal):
             signal=self,
             quantity=quantity,
             price=price,
+            index=index,
         )
         return order
 
@@ -1073,11 +1118,13 @@ class Signal(BaseSignal):
         """
         Function for creating Sell orders
         """
+        from apps.order.builder import OrderBuilder
         distributed_quantity = self._get_distributed_quantity_by_take_profits(sell_quantity)
-        for index, take_profit in enumerate(self.take_profits.all()):
-            self.__form_sell_tp_order(
-                quantity=distributed_quantity,
-                price=take_profit.value, index=index)
+        with OrderBuilder(self):
+            for index, take_profit in enumerate(self.take_profits.all()):
+                self.__form_sell_tp_order(
+                    quantity=distributed_quantity,
+                    price=take_profit.value, index=index)
 
     def __second_formation_sell_orders_spot(self, sell_quantity: float) -> None:
         """
@@ -1088,34 +1135,38 @@ class Signal(BaseSignal):
         custom_order_id = get_increased_leading_number(last_sell_order.custom_order_id) if \
             last_sell_order else None
 
+        from apps.order.builder import OrderBuilder
         distributed_quantity = self._get_distributed_quantity_by_take_profits(sell_quantity)
-        for index, take_profit in enumerate(self.take_profits.all()):
-
-            # if there were sell_orders (1imlossch_7868_1) we replaced it by (1imlossch_7868_0) if index==0
-            if custom_order_id:
-                custom_order_id = get_increased_trailing_number(string=custom_order_id, default=index)
-
-            if take_profit.value > self._get_current_price():
-                self.__form_oco_sell_order(
-                    distributed_quantity=distributed_quantity,
-                    take_profit=take_profit.value, index=index,
-                    custom_order_id=custom_order_id)
-            else:
-                self.__form_sell_market_order(
-                    quantity=distributed_quantity,
-                    price=take_profit.value,
-                    additional_index=index,
-                    custom_order_id=custom_order_id)
+        with OrderBuilder(self):
+            for index, take_profit in enumerate(self.take_profits.all()):
+
+                # if there were sell_orders (1imlossch_7868_1) we replaced it by (1imlossch_7868_0) if index==0
+                if custom_order_id:
+                    custom_order_id = get_increased_trailing_number(string=custom_order_id, default=index)
+
+                if take_profit.value > self._get_current_price():
+                    self.__form_oco_sell_order(
+                        distributed_quantity=distributed_quantity,
+                        take_profit=take_profit.value, index=index,
+                        custom_order_id=custom_order_id)
+                else:
+                    self.__form_sell_market_order(
+                        quantity=distributed_quantity,
+                        price=take_profit.value,
+                        additional_index=index,
+                        custom_order_id=custom_order_id)
 
     def _second_formation_buy_orders_futures_short(self, buy_quantity: float) -> None:
         """
         [SHORT] Function for creating BUY orders
         """
+        from apps.order.builder import OrderBuilder
         distributed_quantity = self._get_distributed_quantity_by_take_profits(buy_quantity)
-        for index, take_profit in enumerate(self.take_profits.all()):
-            self.__form_buy_tp_order(
-                quantity=distributed_quantity,
-                price=take_profit.value, index=index)
+        with OrderBuilder(self):
+            for index, take_profit in enumerate(self.take_profits.all()):
+                self.__form_buy_tp_order(
+                    quantity=distributed_quantity,
+                    price=take_profit.value, index=index)
 
     def _second_formation_sell_orders(self, sell_quantity: float, futures: bool = False) -> None:
         """
@@ -1188,26 +1239,26 @@ class Signal(BaseSignal):
         """
         Form copied Buy orders with new buy_quantity
         """
+        from apps.order.builder import OrderBuilder
+        from apps.order.models import BuyOrder
         res = list()
-        original_orders_ids.sort()
         techannel_abbr = self.techannel.abbr
-        for order_id in original_orders_ids:
-            res.append(self._formation_copied_buy_order_futures_short(techannel=techannel_abbr,
-                                                                      original_order_id=order_id,
-                                                                      buy_quantity=buy_quantity))
+        with OrderBuilder(self):
+            for order in BuyOrder.objects.filter(id__in=original_orders_ids).order_by('id'):
+                res.append(self._formation_copied_buy_order_futures_short(techannel=techannel_abbr,
+                                                                          original_order=order,
+                                                                          buy_quantity=buy_quantity))
         return res
 
     @debug_input_and_returned
     def _formation_copied_sell_order_spot(self,
-                                          original_order_id: int,
+                                          original_order: 'SellOrder',
                                           sell_quantity: Optional[float] = None,
                                           new_stop_loss: Optional[float] = None):
         """
         Form one copied Sell order by original Sell order (with updated quantity or stop_loss)
         """
-        from apps.order.models import SellOrder
-
-        order = SellOrder.objects.filter(id=original_order_id).first()
+        order = original_order
         new_custom_order_id = get_increased_leading_number(order.custom_order_id)
         logger.debug(f"New copied SELL order custom_order_id = '{new_custom_order_id}'")
         new_sell_order = self.__form_oco_sell_order(
@@ -1227,25 +1278,26 @@ class Signal(BaseSignal):
         """
         Form copied Sell orders with new stop_loss or new sell_quantity
         """
+        from apps.order.builder import OrderBuilder
+        from apps.order.models import SellOrder
         if new_stop_loss is None and not sell_quantity:
             new_stop_loss = self._get_new_stop_loss_long_or_spot(worked_sell_orders)
         res = list()
-        original_orders_ids.sort()
-        for order_id in original_orders_ids:
-            res.append(self._formation_copied_sell_order_spot(
-                original_order_id=order_id, new_stop_loss=new_stop_loss, sell_quantity=sell_quantity))
+        with OrderBuilder(self):
+            for order in SellOrder.objects.filter(id__in=original_orders_ids).select_related(
+                    'sl_order').order_by('id'):
+                res.append(self._formation_copied_sell_order_spot(
+                    original_order=order, new_stop_loss=new_stop_loss, sell_quantity=sell_quantity))
         return res
 
     @debug_input_and_returned
     def _formation_copied_sell_order_futures_long(self,
-                                                  original_order_id: int,
+                                                  original_order: 'SellOrder',
                                                   sell_quantity: Optional[float] = None):
         """
         Form one copied Sell order by original Sell order (with updated quantity)
         """
-        from apps.order.models import SellOrder
-
-        order = SellOrder.objects.filter(id=original_order_id).first()
+        order = original_order
         new_custom_order_id = get_increased_leading_number(order.custom_order_id)
         logger.debug(f"New copied SELL order custom_order_id = '{new_custom_order_id}'")
         new_sell_order = self.__form_sell_tp_order(
@@ -1258,14 +1310,12 @@ class Signal(BaseSignal):
 
     @debug_input_and_returned
     def _formation_copied_buy_order_futures_short(self, techannel,
-                                                  original_order_id: int,
+                                                  original_order: 'BuyOrder',
                                                   buy_quantity: Optional[float] = None):
         """
         Form one copied Buy order by original Buy order (with updated quantity)
         """
-        from apps.order.models import BuyOrder
-
-        order = BuyOrder.objects.filter(id=original_order_id).first()
+        order = original_order
         new_custom_order_id = get_increased_leading_number(order.custom_order_id)
         logger.debug(f"[SHORT] New copied BUY order custom_order_id = '{new_custom_order_id}'")
         # If EP2 achieved the new TP order forms with the price EP2 to get only 1.5% from entry and EP1 1.5% from entry.
@@ -1296,11 +1346,13 @@ class Signal(BaseSignal):
         """
         Form copied Sell orders with new stop_loss or new sell_quantity
         """
+        from apps.order.builder import OrderBuilder
+        from apps.order.models import SellOrder
         res = list()
-        original_orders_ids.sort()
-        for order_id in original_orders_ids:
-            res.append(self._formation_copied_sell_order_futures_long(
-                original_order_id=order_id, sell_quantity=sell_quantity))
+        with OrderBuilder(self):
+            for order in SellOrder.objects.filter(id__in=original_orders_ids).order_by('id'):
+                res.append(self._formation_copied_sell_order_futures_long(
+                    original_order=order, sell_quantity=sell_quantity))
         return res
 
     @debug_input_and_returned
@@ -1680,40 +1732,46 @@ class Signal(BaseSignal):
         FUTURES Market
         LONG Position
         """
-        for index, entry_point in enumerate(self.entry_points.all()):
-            coin_quantity = self._get_distributed_toc_quantity(
-                entry_point_price=entry_point.value,
-                fake_balance=fake_balance)
-            if not coin_quantity:
-                logger.debug(f"Not enough amount for Signal: '{self}'")
-                return False
-            # TODO: Form buy orders
-
-            if get_or_create_crontask().entry_with_stop_limit():
-                self.__form_buy_stop_limit_order(distributed_toc=coin_quantity, entry_point=entry_point.value, index=index)
-            else:
-                self.__form_buy_order(distributed_toc=coin_quantity, entry_point=entry_point.value, index=index)
-        # self.__form_futures_sl_order()
-        # Create Global Stop_loss Order
-        planned_executed_quantity = self.__get_planned_executed_quantity(self.buy_orders.all())
-        self.__form_gl_sl_order(quantity=planned_executed_quantity, price=self.stop_loss)
+        from apps.order.builder import OrderBuilder
+        with OrderBuilder(self) as builder:
+            for index, entry_point in enumerate(self.entry_points.all()):
+                coin_quantity = self._get_distributed_toc_quantity(
+                    entry_point_price=entry_point.value,
+                    fake_balance=fake_balance)
+                if not coin_quantity:
+                    logger.debug(f"Not enough amount for Signal: '{self}'")
+                    builder.discard(signal_ids=[self.pk])
+                    return False
+                # TODO: Form buy orders
+
+                if get_or_create_crontask().entry_with_stop_limit:
+                    self.__form_buy_stop_limit_order(quantity=coin_quantity, price=entry_point.value, index=index)
+                else:
+                    self.__form_buy_order(distributed_toc=coin_quantity, entry_point=entry_point.value, index=index)
+            # self.__form_futures_sl_order()
+            # Create Global Stop_loss Order
+            planned_executed_quantity = rou(sum(order.quantity for order in builder.get_orders(signal_id=self.pk)))
+            self.__form_gl_sl_order(quantity=planned_executed_quantity, price=self.stop_loss)
         return True
 
     def _first_formation_futures_short_orders(self, fake_balance: Optional[float] = None) -> bool:
-        for index, entry_point in enumerate(self.entry_points.all()):
-            coin_quantity = self._get_distributed_toc_quantity(
-                entry_point_price=entry_point.value,
-                fake_balance=fake_balance)
-            if not coin_quantity:
-                logger.debug(f"Not enough amount for Signal: '{self}'")
-                return False
-            # TODO: Form TP sell orders
-            if get_or_create_crontask().entry_with_stop_limit():
-                self.__form_sell_stop_limit_order(quantity=coin_quantity, price=entry_point.value, index=index)
-            else:
-                self.__form_sell_limit_order(quantity=coin_quantity, price=entry_point.value, index=index)
-        planned_executed_quantity = self.__get_planned_executed_quantity(self.sell_orders.all())
-        self.__form_gl_sl_order(quantity=planned_executed_quantity, price=self.stop_loss)
+        from apps.order.builder import OrderBuilder
+        with OrderBuilder(self) as builder:
+            for index, entry_point in enumerate(self.entry_points.all()):
+                coin_quantity = self._get_distributed_toc_quantity(
+                    entry_point_price=entry_point.value,
+                    fake_balance=fake_balance)
+                if not coin_quantity:
+                    logger.debug(f"Not enough amount for Signal: '{self}'")
+                    builder.discard(signal_ids=[self.pk])
+                    return False
+                # TODO: Form TP sell orders
+                if get_or_create_crontask().entry_with_stop_limit:
+                    self.__form_sell_stop_limit_order(quantity=coin_quantity, price=entry_point.value, index=index)
+                else:
+                    self.__form_sell_limit_order(quantity=coin_quantity, price=entry_point.value, index=index)
+            planned_executed_quantity = rou(sum(order.quantity for order in builder.get_orders(signal_id=self.pk)))
+            self.__form_gl_sl_order(quantity=planned_executed_quantity, price=self.stop_loss)
         return True
 
     def _first_formation_futures_orders(self, fake_balance: Optional[float] = None):
@@ -1745,15 +1803,18 @@ class Signal(BaseSignal):
             if get_or_create_crontask().allow_remove_tps_of_eps_for_first_formation:
                 self.__handle_insufficient_quantity_of_first_formation()
             return False
+        from apps.order.builder import OrderBuilder
+        with OrderBuilder(self) as builder:
+            for index, entry_point in enumerate(self.entry_points.all()):
+                coin_quantity = self._get_distributed_toc_quantity(
+                    entry_point_price=entry_point.value,
+                    fake_balance=fake_balance)
+                if not coin_quantity:
+                    logger.debug(f"Not enough amount for Signal '{self}'")
+                    builder.discard(signal_ids=[self.pk])
+                    return False
+                self.__form_buy_order(distributed_toc=coin_quantity, entry_point=entry_point.value, index=index)
         self.status = SignalStatus.FORMED.value
-        for index, entry_point in enumerate(self.entry_points.all()):
-            coin_quantity = self._get_distributed_toc_quantity(
-                entry_point_price=entry_point.value,
-                fake_balance=fake_balance)
-            if not coin_quantity:
-                logger.debug(f"Not enough amount for Signal '{self}'")
-                return False
-            self.__form_buy_order(distributed_toc=coin_quantity, entry_point=entry_point.value, index=index)
         self.save()
         return True
 
@@ -1894,46 +1955,11 @@ class Signal(BaseSignal):
         7)Change Signal status (NEW -> PUSHED) if this is the first launch
 
         """
-        from apps.order.utils import (
-            NOT_SENT_ORDERS_STATUSES, SENT_ORDERS_STATUSES, ORDER_STATUSES_FOR_PUSH_JOB,
-        )
-        cancelled_params = {
-            'local_canceled': True,
-        }
-        no_need_push_params = {
-            'no_need_push': False,
-        }
-        not_sent_params = {
-            '_status__in': NOT_SENT_ORDERS_STATUSES,
-        }
-        sent_params = {
-            '_status__in': SENT_ORDERS_STATUSES,
-        }
-        # cancel NOT_SENT local_cancelled BUY orders
-        for local_cancelled_order in self.buy_orders.filter(
-                **cancelled_params).filter(**not_sent_params):
-            local_cancelled_order.cancel_not_sent_order()
-        # cancel SENT local_cancelled BUY orders
-        for local_cancelled_order in self.buy_orders.filter(
-                **cancelled_params).filter(**sent_params).filter(**no_need_push_params):
-            local_cancelled_order.cancel_into_market()
-        # cancel NOT_SENT local_cancelled SELL orders
-        for local_cancelled_order in self.sell_orders.filter(
-                **cancelled_params).filter(**not_sent_params):
-            local_cancelled_order.cancel_not_sent_order()
-        # cancel SENT local_cancelled SELL orders
-        for local_cancelled_order in self.sell_orders.filter(
-                **cancelled_params).filter(**sent_params).filter(**no_need_push_params):
-            local_cancelled_order.cancel_into_market()
-        orders_params_for_pushing = {
-            '_status__in': ORDER_STATUSES_FOR_PUSH_JOB,
-            'local_canceled': False,
-            'no_need_push': False,
-        }
+        self._cancel_local_cancelled_orders()
         # push NOT_SENT SELL orders
         # TODO: Maybe move both try except into market.models
         error_status_flag = False
-        for sell_order in self.sell_orders.filter(**orders_params_for_pushing):
+        for sell_order in self._get_orders_for_pushing(self.sell_orders):
             try:
                 sell_order.push_to_market()
             except self.market_exception_class.api_exception as ex:
@@ -1945,7 +1971,7 @@ class Signal(BaseSignal):
                 break
 
         # push NOT_SENT BUY orders
-        for buy_order in self.buy_orders.filter(**orders_params_for_pushing):
+        for buy_order in self._get_orders_for_pushing(self.buy_orders):
             try:
                 buy_order.push_to_market()
             except self.market_exception_class.api_exception as ex:
@@ -1961,9 +1987,87 @@ class Signal(BaseSignal):
             self.status = SignalStatus.ERROR.value
             self.save()
 
+    def _get_orders_for_pushing(self, orders: QuerySet) -> QuerySet:
+        """
+        NOT_SENT orders to push.
+        Orders with not finished intents in the outbox are pushed by the outbox sender
+        """
+        from apps.order.models import OrderOutbox
+        from apps.order.utils import ORDER_STATUSES_FOR_PUSH_JOB
+        orders_params_for_pushing = {
+            '_status__in': ORDER_STATUSES_FOR_PUSH_JOB,
+            'local_canceled': False,
+            'no_need_push': False,
+        }
+        orders = orders.filter(**orders_params_for_pushing)
+        if get_or_create_crontask().order_outbox_enabled:
+            orders = orders.exclude(custom_order_id__in=OrderOutbox.get_not_finished_custom_order_ids(self))
+        return orders
+
+    def set_status_after_pushing(self, error_status_flag: bool, buy_order_pushed: bool):
+        """Change Signal status (-> ERROR or NEW -> PUSHED if this is the first launch)"""
+        if error_status_flag:
+            if self.status not in ERROR__SIG_STATS:
+                self.status = SignalStatus.ERROR.value
+                self.save()
+        # set status if at least one order has created
+        elif buy_order_pushed and self.status not in PUSHED_BOUGHT_SOLD__SIG_STATS:
+            self.status = SignalStatus.PUSHED.value
+            self.save()
+
+    def _cancel_local_cancelled_orders(self):
+        """Cancel local_cancelled orders (NOT_SENT ones locally, SENT ones into the Market)"""
+        from apps.order.utils import NOT_SENT_ORDERS_STATUSES, SENT_ORDERS_STATUSES
+        cancelled_params = {
+            'local_canceled': True,
+        }
+        no_need_push_params = {
+            'no_need_push': False,
+        }
+        not_sent_params = {
+            '_status__in': NOT_SENT_ORDERS_STATUSES,
+        }
+        sent_params = {
+            '_status__in': SENT_ORDERS_STATUSES,
+        }
+        # cancel NOT_SENT local_cancelled BUY orders
+        for local_cancelled_order in self.buy_orders.filter(
+                **cancelled_params).filter(**not_sent_params):
+            local_cancelled_order.cancel_not_sent_order()
+        # cancel NOT_SENT local_cancelled SELL orders
+        for local_cancelled_order in self.sell_orders.filter(
+                **cancelled_params).filter(**not_sent_params):
+            local_cancelled_order.cancel_not_sent_order()
+        # cancel SENT local_cancelled BUY and SELL orders (by bulk requests if the Market supports it)
+        sent_cancelled_orders = [
+            *self.buy_orders.filter(**cancelled_params).filter(**sent_params).filter(**no_need_push_params),
+            *self.sell_orders.filter(**cancelled_params).filter(**sent_params).filter(**no_need_push_params),
+        ]
+        if sent_cancelled_orders:
+            self.market_logic.cancel_orders(sent_cancelled_orders)
+
     @debug_input_and_returned
     def _push_futures_orders(self):
-        self._push_spot_orders()
+        """
+        FUTURES Market
+        The same as for SPOT, but NOT_SENT orders are pushed by batches (Sell orders go first)
+        and an error of one order doesn't stop pushing of the others
+        """
+        self._cancel_local_cancelled_orders()
+        orders = [*self._get_orders_for_pushing(self.sell_orders),
+                  *self._get_orders_for_pushing(self.buy_orders)]
+        if not orders:
+            return
+        error_status_flag = False
+        buy_order_pushed = False
+        for order, ex in self.market_logic.push_orders_batch(orders):
+            if ex is None:
+                buy_order_pushed = buy_order_pushed or order.type_ == 'buy'
+                continue
+            logger.warning(f"Push order Error: Signal:'{self}' Order: '{order}': Ex: '{ex}'")
+            if not self._handle_catching_api_exceptions(ex, order):
+                error_status_flag = True
+        self.set_status_after_pushing(error_status_flag, buy_order_pushed)
 
     @debug_input_and_returned
     def __remove_take_profits_except_nearest(self):
@@ -2601,10 +2705,15 @@ class Signal(BaseSignal):
                      f"'{self.techannel.balance_to_signal_perc}',"
                      f" slip_delta_sl_perc='{get_or_create_crontask().slip_delta_sl_perc}',"
                      f" inviolable_balance_perc='{conf_obj.inviolable_balance_perc}")
-        if self._is_market_type_futures():
-            return self._first_formation_futures_orders(fake_balance=fake_balance)
-        else:
-            return self._first_formation_spot_orders(fake_balance=fake_balance)
+        if fake_balance is None:
+            self._balance_snapshot = self._get_balance_snapshot()
+        try:
+            if self._is_market_type_futures():
+                return self._first_formation_futures_orders(fake_balance=fake_balance)
+            else:
+                return self._first_formation_spot_orders(fake_balance=fake_balance)
+        finally:
+            self._balance_snapshot = None
 
     @refuse_if_busy
     def update_balance_info(self):
@@ -2621,22 +2730,67 @@ class Signal(BaseSignal):
         else:
             return self._push_spot_orders()
 
-    @refuse_if_busy
-    def update_orders_info_by_one_signal(self, force: bool = False):
-        """
-        Get info for all Signals (except NEW) from Real Market by SENT orders
-        """
+    def get_orders_for_pull(self, force: bool = False) -> List['BaseOrder']:
+        """SENT Buy and Sell orders of the Signal (except NEW) to get info about from Real Market"""
         from apps.order.utils import ORDER_STATUSES_FOR_PULL_JOB
         if self._status not in PUSHED_BOUGHT_SOLD_CANCELING__SIG_STATS and not force:
-            return
+            return []
 
         params = {
             '_status__in': ORDER_STATUSES_FOR_PULL_JOB,
         }
-        for buy_order in self.buy_orders.filter(**params):
-            buy_order.update_buy_order_info_by_api()
-        for sell_order in self.sell_orders.filter(**params):
-            sell_order.update_sell_order_info_by_api()
+        return [*self.buy_orders.filter(**params), *self.sell_orders.filter(**params)]
+
+    @refuse_if_busy
+    def push_outbox_intents(self, intents: List['OrderOutbox']) -> bool:
+        """
+        Push orders of the Signal by their intents from the outbox (see OrderOutbox.drain).
+        The same handling of api exceptions as in the push job
+        """
+        error_status_flag = False
+        buy_order_pushed = False
+        for intent in intents:
+            order = intent.get_order()
+            try:
+                pushed = intent.send(order)
+            except self.market_exception_class.api_exception as ex:
+                logger.warning(f"Push order Error: Signal:'{self}' Order: '{order}': Ex: '{ex}'")
+                if self._handle_catching_api_exceptions(ex, order):
+                    intent.postpone(ex)
+                else:
+                    intent.fail(ex)
+                    error_status_flag = True
+                continue
+            buy_order_pushed = buy_order_pushed or (pushed and order.type_ == 'buy')
+        self.set_status_after_pushing(error_status_flag, buy_order_pushed)
+        return True
+
+    @refuse_if_busy
+    def update_orders_info_by_one_signal(self, force: bool = False):
+        """
+        Get info for all Signals (except NEW) from Real Market by SENT orders
+        """
+        for order in self.get_orders_for_pull(force=force):
+            if order.type_ == 'buy':
+                order.update_buy_order_info_by_api()
+            else:
+                order.update_sell_order_info_by_api()
+
+    @refuse_if_busy
+    def update_orders_info_by_api_data(self, orders_data: List[Tuple['BaseOrder', 'PartialResponse']]):
+        """
+        The same as update_orders_info_by_one_signal,
+        but info about orders has already been got (e.g. by the async Market client).
+        The orders are read again: they could be changed while the info was got,
+        info of an order which isn't pulled anymore (completed, cancelled) is older than its state
+        """
+        from apps.order.utils import ORDER_STATUSES_FOR_PULL_JOB
+        for order, data in orders_data:
+            order.refresh_from_db()
+            if order.status not in ORDER_STATUSES_FOR_PULL_JOB or order.local_canceled:
+                logger.debug(f"Order '{order}' has been changed while its info was got, skip it")
+                continue
+            order.update_order_info_by_api_data(data)
 
     @debug_input_and_returned
     @refuse_if_busy
@@ -2788,6 +2942,11 @@ class Signal(BaseSignal):
         new_signals = Signal.objects.filter(**params)
         if only_get_ids:
             return new_signals.values_list('id', flat=True)
+        if get_or_create_crontask().batch_formation_enabled:
+            from .batch_formation import BatchFormation
+            params.pop('_status')
+            BatchFormation(BatchFormation.get_new_signals(**params), fake_balance=fake_balance).run()
+            return
         for signal in new_signals:
             signal.first_formation_orders_by_one_signal(fake_balance=fake_balance)
 
@@ -2867,12 +3026,33 @@ class Signal(BaseSignal):
         if outer_signal_id:
             params.update({'outer_signal_id': outer_signal_id,
                            'techannel__abbr': techannel_abbr})
-        formed_signals = Signal.objects.filter(**params)
+        formed_signals = cls._get_spoil_candidates(Signal.objects.filter(**params))
         if only_get_ids:
             return formed_signals.values_list('id', flat=True)
         for signal in formed_signals:
             signal.try_to_spoil_by_one_signal()
 
+    @classmethod
+    def _get_spoil_candidates(cls, signals: QuerySet) -> QuerySet:
+        """
+        Signals whose cached price (Pair table) has reached min TP (LONG, SPOT) or max TP (SHORT), by one query.
+        The cached price is widened by the tolerance, Signals without cached price are checked by the current price
+        """
+        if not get_or_create_crontask().prices_update_worker_enabled:
+            return signals
+        tolerance = conf_obj.spoil_prescreen_tolerance_perc / conf_obj.one_hundred_percent
+        cached_price = Pair.objects.filter(
+            symbol=OuterRef('symbol'), market=OuterRef('market')).values('last_ticker_price')[:1]
+        return signals.annotate(
+            min_take_profit=Min('take_profits__value'),
+            max_take_profit=Max('take_profits__value'),
+            cached_price=Subquery(cached_price),
+        ).filter(
+            Q(cached_price__isnull=True) | Q(cached_price__lte=0) |
+            Q(position=SignalPosition.SHORT.value, cached_price__lte=F('max_take_profit') / (1 - tolerance)) |
+            (~Q(position=SignalPosition.SHORT.value) & Q(cached_price__gte=F('min_take_profit') / (1 + tolerance))),
+            min_take_profit__isnull=False)
+
     @classmethod
     def close_worker(cls,
                      only_get_ids: bool = False,
@@ -2905,6 +3085,10 @@ class Signal(BaseSignal):
             params.update({'outer_signal_id': outer_signal_id,
                            'techannel__abbr': techannel_abbr})
         signals = Signal.objects.filter(**params)
+        if fake_price is None:
+            # Only Signals which may need to move SL are handled
+            from .trailing import TrailingScreen
+            signals = Signal.objects.filter(pk__in=TrailingScreen(signals).get_ids_to_trail())
         if only_get_ids:
             return signals.values_list('id', flat=True)
         for signal in signals:
@@ -2997,11 +3181,77 @@ class HistorySignal(BaseHistorySignal):
     def write_in_history(cls,
                          signal: Signal,
                          status: str):
-        current_price = None
-        try:
-            current_price = signal.market_logic.get_current_price(signal.symbol)
-        except Exception as ex:
-            logger.warning(f"Current price for HistorySignal failed to get. Signal '{signal}'"
-                           f": Exception:'{ex}'")
-        cls.objects.create(main_signal=signal, status=status, current_price=current_price)
+        """
+        The record is written by the history buffer with the cached price.
+        It's buffered after commit: changes of rolled back transactions aren't written
+        """
+        transaction.on_commit(lambda: history_buffer.append(signal, status))
         logger.debug(f"Add HistorySignal Record for Signal '{signal}' status = '{status}'")
+
+
+class SignalWorkItem(SystemBaseModel):
+    """
+    Work item of a stage of the Signal (the stage is the same as of fan-out: push, pull, trail, ...).
+    Stage workers claim due items by SELECT ... FOR UPDATE SKIP LOCKED, so they take disjoint items.
+    A claimed item is invisible until claimed_until: if the worker crashed the item is claimed again
+    """
+    signal = models.ForeignKey(to=Signal,
+                               related_name='work_items',
+                               on_delete=models.CASCADE)
+    stage = models.CharField(max_length=16)
+    due_time = models.DateTimeField(default=timezone.now)
+    claimed_until = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+
+    objects = models.Manager()
+
+    class Meta:
+        unique_together = ['signal', 'stage']
+        indexes = [models.Index(fields=['stage', 'due_time'])]
+
+    def __str__(self):
+        return f"WI_{self.pk}:{self.stage}:{self.signal_id}"
+
+    @classmethod
+    def schedule(cls, stage: str, signal_ids: List[int], due_time=None):
+        """Add items of the Signals (an existing item is moved to the earlier due time)"""
+        due_time = due_time or timezone.now()
+        cls.objects.bulk_create([cls(signal_id=signal_id, stage=stage, due_time=due_time)
+                                 for signal_id in signal_ids], ignore_conflicts=True)
+        cls.objects.filter(signal_id__in=signal_ids, stage=stage, due_time__gt=due_time,
+                           claimed_until__isnull=True).update(due_time=due_time)
+
+    @classmethod
+    def claim(cls, stage: str, batch_size: int, symbols: Optional[List[str]] = None) -> List['SignalWorkItem']:
+        """
+        Take due items of the stage which aren't claimed by another worker (or whose claim has expired).
+        Only items of Signals with the symbols if they are set (the shard of the worker)
+        """
+        now_ = timezone.now()
+        params = {'signal__symbol__in': symbols} if symbols is not None else {}
+        with transaction.atomic():
+            items = list(cls.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                Q(claimed_until__isnull=True) | Q(claimed_until__lt=now_),
+                stage=stage, due_time__lte=now_, **params).order_by('due_time')[:batch_size])
+            cls.extend_claim([item.pk for item in items])
+        return items
+
+    @classmethod
+    def extend_claim(cls, ids: List[int]):
+        """Keep the items claimed for the visibility timeout from now"""
+        now_ = timezone.now()
+        cls.objects.filter(pk__in=ids).update(
+            claimed_until=now_ + timedelta(seconds=conf_obj.work_queue_visibility_timeout_secs), modified=now_)
+
+    def complete(self):
+        SignalWorkItem.objects.filter(pk=self.pk).delete()
+
+    def retry(self, delay_secs: float, error: Optional[str] = None):
+        """
+        Handle the item again not earlier than after the delay.
+        Failed attempt is counted if the error is set (not for a busy Signal)
+        """
+        params = {'attempts': F('attempts') + 1, 'error': error} if error is not None else {}
+        SignalWorkItem.objects.filter(pk=self.pk).update(
+            due_time=timezone.now() + timedelta(seconds=delay_secs), claimed_until=None, **params)
@@ -0,0 +1,127 @@
+import bisect
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import redis
+
+from binfun.settings import conf_obj
+from .waits import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Name of the shard served by the worker pool (set for sharded Celery workers and work_queue_worker)
+SHARD_ENV = 'BINFUN_SHARD'
+
+
+def get_own_shard() -> Optional[str]:
+    return os.getenv(SHARD_ENV) or None
+
+
+def get_shard_queue(queue: str, shard: str) -> str:
+    return f'{queue}.{shard}'
+
+
+def _hash(key: str) -> int:
+    return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+
+class SymbolRing:
+    """
+    Consistent hash ring of shards: a symbol belongs to the first virtual node of a shard after its hash.
+    If a shard joins or leaves only symbols of its virtual nodes move
+    """
+
+    def __init__(self, shards: Iterable[str], virtual_nodes: Optional[int] = None):
+        virtual_nodes = virtual_nodes or conf_obj.shard_virtual_nodes
+        self.shards = sorted(set(shards))
+        nodes = sorted((_hash(f'{shard}#{i}'), shard) for shard in self.shards for i in range(virtual_nodes))
+        self._keys = [key for key, _ in nodes]
+        self._shards = [shard for _, shard in nodes]
+
+    def __bool__(self) -> bool:
+        return bool(self.shards)
+
+    def get_shard(self, symbol: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(symbol)) % len(self._keys)
+        return self._shards[i]
+
+    def get_symbols(self, shard: str, symbols: Iterable[str]) -> List[str]:
+        """Symbols owned by the shard"""
+        return [symbol for symbol in symbols if self.get_shard(symbol) == shard]
+
+
+class ShardRegistry:
+    """
+    Live shards kept in Redis (sorted set scored by the last heartbeat).
+    A shard is live if its heartbeat is younger than shard_heartbeat_ttl_secs.
+    The ring is cached by process for a part of the TTL
+    """
+    shards_key = 'binfun:shards'
+    _ring: Optional[SymbolRing] = None
+    _ring_built_at = 0.0
+
+    @classmethod
+    def heartbeat(cls, shard: str):
+        try:
+            get_redis_client().zadd(cls.shards_key, {shard: time.time()})
+        except redis.RedisError as ex:
+            logger.warning(f"Sharding: heartbeat of shard '{shard}' failed: '{ex}'")
+
+    @classmethod
+    def leave(cls, shard: str):
+        try:
+            get_redis_client().zrem(cls.shards_key, shard)
+        except redis.RedisError as ex:
+            logger.warning(f"Sharding: shard '{shard}' failed to leave: '{ex}'")
+        cls._ring = None
+
+    @classmethod
+    def get_live_shards(cls) -> List[str]:
+        try:
+            shards = get_redis_client().zrangebyscore(
+                cls.shards_key, time.time() - conf_obj.shard_heartbeat_ttl_secs, '+inf')
+        except redis.RedisError as ex:
+            logger.warning(f"Sharding: live shards failed to get: '{ex}'")
+            return []
+        return [shard.decode() for shard in shards]
+
+    @classmethod
+    def get_ring(cls) -> SymbolRing:
+        if cls._ring is None or time.monotonic() - cls._ring_built_at > conf_obj.shard_heartbeat_ttl_secs / 3:
+            ring = SymbolRing(cls.get_live_shards())
+            if cls._ring is not None and ring.shards != cls._ring.shards:
+                logger.info(f"Sharding: shards have been rebalanced: {cls._ring.shards} -> {ring.shards}")
+            cls._ring, cls._ring_built_at = ring, time.monotonic()
+        return cls._ring
+
+    @classmethod
+    def start_heartbeat(cls, shard: str) -> threading.Thread:
+        """Daemon thread which keeps the shard live"""
+        def beat():
+            while True:
+                cls.heartbeat(shard)
+                time.sleep(conf_obj.shard_heartbeat_ttl_secs / 3)
+
+        thread = threading.Thread(target=beat, name=f'shard-heartbeat-{shard}', daemon=True)
+        thread.start()
+        logger.info(f"Sharding: shard '{shard}' has joined")
+        return thread
+
+
+def split_by_shard(signal_ids: Sequence[int]) -> Dict[Optional[str], List[int]]:
+    """Signal ids by the shard owning their symbol (None key if there are no live shards)"""
+    from .models import Signal
+    ring = ShardRegistry.get_ring()
+    if not ring:
+        return {None: list(signal_ids)}
+    res: Dict[Optional[str], List[int]] = dict()
+    for signal_id, symbol in Signal.objects.filter(pk__in=signal_ids).values_list('id', 'symbol'):
+        res.setdefault(ring.get_shard(symbol), []).append(signal_id)
+    return res
@@ -3,23 +3,79 @@ import logging
 from celery import shared_task, group
 from celery.schedules import crontab
 
-from .models import Signal
+from .archive import SignalArchive
+from .coalescing import TaskCoalescer
+from .fan_out import ChunkedFanOut, FAN_OUT_STAGES
+from .models import Signal, HistorySignal, SignalWorkItem
+from .sharding import get_shard_queue, split_by_shard
 from apps.crontask.utils import get_or_create_crontask
+from apps.order.models import HistoryApiBuyOrder, HistoryApiSellOrder
+from binfun.settings import conf_obj
+from utils.framework.partitions import ensure_month_partitions
 
 logger = logging.getLogger(__name__)
 
 
+def fan_out(stage_name: str, ids_list, by_one_signal_task):
+    """
+    One task by chunk of Signals (if enabled) or one task by Signal.
+    Signals whose tasks of the stage are still queued are skipped (if coalescing is enabled).
+    With the work queue enabled work items are added instead of tasks.
+    With sharding enabled tasks go to the queues of the shards owning symbols of the Signals
+    """
+    crontask = get_or_create_crontask()
+    if crontask.work_queue_enabled:
+        # Items are claimed by work_queue_worker
+        SignalWorkItem.schedule(stage_name, list(ids_list))
+        return
+    if crontask.task_coalescing_enabled:
+        ids_list = TaskCoalescer(stage_name).mark_pending(ids_list)
+    if not ids_list:
+        return
+    params = {'chunked': crontask.chunked_fan_out_enabled, 'coalesced': crontask.task_coalescing_enabled}
+    if crontask.symbol_sharding_enabled:
+        for shard, shard_ids in split_by_shard(ids_list).items():
+            _send_tasks(stage_name, shard_ids, by_one_signal_task, shard=shard, **params)
+        return
+    _send_tasks(stage_name, ids_list, by_one_signal_task, **params)
+
+
+def _send_tasks(stage_name: str, ids_list, by_one_signal_task, chunked: bool, coalesced: bool, shard=None):
+    """coalesced: the tasks clear pending markers of their Signals"""
+    queue = FAN_OUT_STAGES[stage_name].queue
+    if shard:
+        queue = get_shard_queue(queue, shard)
+    if chunked:
+        group(handle_signals_chunk_task.s(stage_name, chunk, coalesced=coalesced)
+              for chunk in ChunkedFanOut(stage_name).split(ids_list)).apply_async(queue=queue)
+        return
+    group(by_one_signal_task.s(i, coalesced=coalesced) for i in ids_list).apply_async(queue=queue)
+
+
+@shared_task(ignore_result=True)
+def handle_signals_chunk_task(stage_name, signal_ids, coalesced=False):
+    if coalesced:
+        TaskCoalescer(stage_name).clear(*signal_ids)
+    ChunkedFanOut(stage_name).run_chunk(signal_ids)
+
+
 # FIRST FORMING
 @shared_task(ignore_result=True)
 def first_forming_parent_task():
     if not get_or_create_crontask().first_forming_enabled:
         return
+    if get_or_create_crontask().batch_formation_enabled:
+        # All NEW signals are formed by one task
+        Signal.handle_new_signals()
+        return
     ids_list = Signal.handle_new_signals(only_get_ids=True)
-    group(first_forming_by_one_signal_task.s(i) for i in ids_list).apply_async()
+    fan_out('first_forming', ids_list, first_forming_by_one_signal_task)
 
 
 @shared_task(ignore_result=True)
-def first_forming_by_one_signal_task(signal_id):
+def first_forming_by_one_signal_task(signal_id, coalesced=False):
+    if coalesced:
+        TaskCoalescer('first_forming').clear(signal_id)
     signal = Signal.objects.filter(pk=signal_id).first()
     if signal:
         signal.first_formation_orders_by_one_signal()
@@ -31,11 +87,13 @@ def push_job_parent_task():
     if not get_or_create_crontask().push_job_enabled:
         return
     ids_list = Signal.push_signals(only_get_ids=True)
-    group(push_job_by_one_signal_task.s(i) for i in ids_list).apply_async()
+    fan_out('push', ids_list, push_job_by_one_signal_task)
 
 
 @shared_task(ignore_result=True)
-def push_job_by_one_signal_task(signal_id):
+def push_job_by_one_signal_task(signal_id, coalesced=False):
+    if coalesced:
+        TaskCoalescer('push').clear(signal_id)
     signal = Signal.objects.filter(pk=signal_id).first()
     if signal:
         signal.push_orders_by_one_signal()
@@ -47,11 +105,13 @@ def pull_job_parent_task():
     if not get_or_create_crontask().pull_job_enabled:
         return
     ids_list = Signal.update_signals_info_by_api(only_get_ids=True)
-    group(pull_job_by_one_signal_task.s(i) for i in ids_list).apply_async()
+    fan_out('pull', ids_list, pull_job_by_one_signal_task)
 
 
 @shared_task(ignore_result=True)
-def pull_job_by_one_signal_task(signal_id):
+def pull_job_by_one_signal_task(signal_id, coalesced=False):
+    if coalesced:
+        TaskCoalescer('pull').clear(signal_id)
     signal = Signal.objects.filter(pk=signal_id).first()
     if signal:
         signal.update_orders_info_by_one_signal()
@@ -63,11 +123,13 @@ def bought_worker_parent_task():
     if not get_or_create_crontask().bought_worker_enabled:
         return
     ids_list = Signal.bought_orders_worker(only_get_ids=True)
-    group(bought_worker_by_one_signal_task.s(i) for i in ids_list).apply_async()
+    fan_out('bought', ids_list, bought_worker_by_one_signal_task)
 
 
 @shared_task(ignore_result=True)
-def bought_worker_by_one_signal_task(signal_id):
+def bought_worker_by_one_signal_task(signal_id, coalesced=False):
+    if coalesced:
+        TaskCoalescer('bought').clear(signal_id)
     signal = Signal.objects.filter(pk=signal_id).first()
     if signal:
         signal.worker_for_bought_orders_by_one_signal()
@@ -79,11 +141,13 @@ def sold_worker_parent_task():
     if not get_or_create_crontask().sold_worker_enabled:
         return
     ids_list = Signal.sold_orders_worker(only_get_ids=True)
-    group(sold_worker_by_one_signal_task.s(i) for i in ids_list).apply_async()
+    fan_out('sold', ids_list, sold_worker_by_one_signal_task)
 
 
 @shared_task(ignore_result=True)
-def sold_worker_by_one_signal_task(signal_id):
+def sold_worker_by_one_signal_task(signal_id, coalesced=False):
+    if coalesced:
+        TaskCoalescer('sold').clear(signal_id)
     signal = Signal.objects.filter(pk=signal_id).first()
     if signal:
         signal.worker_for_sold_orders_by_one_signal()
@@ -94,12 +158,17 @@ def sold_worker_by_one_signal_task(signal_id):
 def spoil_worker_parent_task():
     if not get_or_create_crontask().spoil_worker_enabled:
         return
+    if get_or_create_crontask().price_triggers_enabled:
+        # Signals are handed out by price_trigger_worker
+        return
     ids_list = Signal.spoil_worker(only_get_ids=True)
-    group(spoil_worker_by_one_signal_task.s(i) for i in ids_list).apply_async()
+    fan_out('spoil', ids_list, spoil_worker_by_one_signal_task)
 
 
 @shared_task(ignore_result=True)
-def spoil_worker_by_one_signal_task(signal_id):
+def spoil_worker_by_one_signal_task(signal_id, coalesced=False):
+    if coalesced:
+        TaskCoalescer('spoil').clear(signal_id)
     signal = Signal.objects.filter(pk=signal_id).first()
     if signal:
         signal.try_to_spoil_by_one_signal()
@@ -111,11 +180,13 @@ def close_worker_parent_task():
     if not get_or_create_crontask().close_worker_enabled:
         return
     ids_list = Signal.close_worker(only_get_ids=True)
-    group(close_worker_by_one_signal_task.s(i) for i in ids_list).apply_async()
+    fan_out('close', ids_list, close_worker_by_one_signal_task)
 
 
 @shared_task(ignore_result=True)
-def close_worker_by_one_signal_task(signal_id):
+def close_worker_by_one_signal_task(signal_id, coalesced=False):
+    if coalesced:
+        TaskCoalescer('close').clear(signal_id)
     signal = Signal.objects.filter(pk=signal_id).first()
     if signal:
         signal.try_to_close_by_one_signal()
@@ -126,12 +197,31 @@ def close_worker_by_one_signal_task(signal_id):
 def trailing_stop_worker_parent_task():
     if not get_or_create_crontask().trailing_stop_enabled:
         return
+    if get_or_create_crontask().price_triggers_enabled:
+        # Signals are handed out by price_trigger_worker
+        return
     ids_list = Signal.trailing_stop_worker(only_get_ids=True)
-    group(trailing_stop_worker_by_one_signal_task.s(i) for i in ids_list).apply_async()
+    fan_out('trail', ids_list, trailing_stop_worker_by_one_signal_task)
 
 
 @shared_task(ignore_result=True)
-def trailing_stop_worker_by_one_signal_task(signal_id):
+def trailing_stop_worker_by_one_signal_task(signal_id, coalesced=False):
+    if coalesced:
+        TaskCoalescer('trail').clear(signal_id)
     signal = Signal.objects.filter(pk=signal_id).first()
     if signal:
         signal.trail_stop_by_one_signal()
+
+
+# ARCHIVE
+@shared_task(ignore_result=True)
+def archive_closed_signals_task():
+    if not get_or_create_crontask().archive_enabled:
+        return
+    SignalArchive().run()
+
+
+@shared_task(ignore_result=True)
+def ensure_history_partitions_task():
+    tables = [model._meta.db_table for model in (HistorySignal, HistoryApiBuyOrder, HistoryApiSellOrder)]
+    ensure_month_partitions(tables, conf_obj.history_partitions_ahead_months)
@@ -0,0 +1,154 @@
+import logging
+
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+from django.db.models import Avg, Exists, OuterRef, QuerySet, Subquery
+
+from apps.crontask.utils import get_or_create_crontask
+from apps.market.models import BiFuturesMarketLogic
+from apps.order.utils import OPENED_ORDER_STATUSES, COMPLETED_ORDER_STATUSES
+from apps.pair.models import Pair
+from binfun.settings import conf_obj
+from .utils import SignalPosition
+
+logger = logging.getLogger(__name__)
+
+
+class TrailingArrays(NamedTuple):
+    """Values of the trailing stop by Signal (NaN if there is no order or price)"""
+    ids: np.ndarray
+    symbols: List[str]
+    short: np.ndarray
+    sl_value: np.ndarray
+    gl_sl_completed: np.ndarray
+    zero_value: np.ndarray
+    price: np.ndarray
+
+    @property
+    def lost_gl_sl(self) -> np.ndarray:
+        return np.isnan(self.sl_value) & ~self.gl_sl_completed
+
+    @property
+    def has_values(self) -> np.ndarray:
+        return ~np.isnan(self.sl_value) & ~self.gl_sl_completed & (np.nan_to_num(self.zero_value) > 0)
+
+
+class TrailingScreen:
+    """
+    Pre-screen of the trailing stop for all Signals by one query and cached prices (Pair table).
+    The checks of Signal.__check_if_needs_to_move_sl_as_trailing_stop_* and of the new SL value
+    are calculated by arrays. The cached price is widened by the tolerance,
+    so only Signals which surely don't need to move SL are screened out
+    """
+
+    def __init__(self, signals: QuerySet):
+        self.signals = signals
+
+    @staticmethod
+    def _get_gl_sl_orders(model, **params) -> QuerySet:
+        return model.objects.filter(signal=OuterRef('pk'), index=model.GL_SM_INDEX, **params)
+
+    def _annotate(self) -> QuerySet:
+        from apps.order.models import BuyOrder, SellOrder
+        opened_params = {'local_canceled': False, 'handled_worked': False, '_status__in': OPENED_ORDER_STATUSES}
+
+        def avg_completed_price(model):
+            return Subquery(model.objects.filter(
+                signal=OuterRef('pk'), _status__in=COMPLETED_ORDER_STATUSES).values('signal').annotate(
+                avg_price=Avg('price')).values('avg_price')[:1])
+
+        return self.signals.filter(market__name=BiFuturesMarketLogic.name).annotate(
+            # LONG: GL_SL is SELL order, EP orders are BUY ones. SHORT: the opposite
+            long_sl_value=Subquery(self._get_gl_sl_orders(
+                SellOrder, **opened_params).order_by('-id').values('price')[:1]),
+            short_sl_value=Subquery(self._get_gl_sl_orders(
+                BuyOrder, **opened_params).order_by('id').values('price')[:1]),
+            long_gl_sl_completed=Exists(self._get_gl_sl_orders(
+                SellOrder, _status__in=COMPLETED_ORDER_STATUSES)),
+            short_gl_sl_completed=Exists(self._get_gl_sl_orders(
+                BuyOrder, _status__in=COMPLETED_ORDER_STATUSES)),
+            long_zero_value=avg_completed_price(BuyOrder),
+            short_zero_value=avg_completed_price(SellOrder),
+            cached_price=Subquery(Pair.objects.filter(
+                market=OuterRef('market'), symbol=OuterRef('symbol')).values('last_ticker_price')[:1]),
+        ).values_list('id', 'position', 'long_sl_value', 'short_sl_value', 'long_gl_sl_completed',
+                      'short_gl_sl_completed', 'long_zero_value', 'short_zero_value', 'cached_price', 'symbol')
+
+    @staticmethod
+    def get_trigger_prices(short: np.ndarray, sl_value: np.ndarray, zero_value: np.ndarray) -> np.ndarray:
+        """
+        Prices beyond which SL has to be moved: the threshold is crossed and the new SL value is better.
+        LONG: price > trigger, SHORT: price < trigger. Widened by the tolerance
+        """
+        tolerance = conf_obj.trailing_prescreen_tolerance_perc / conf_obj.one_hundred_percent
+        delta = zero_value * get_or_create_crontask().slip_delta_sl_perc / conf_obj.one_hundred_percent
+        # For the next crossing
+        old_value_of_price = 2 * sl_value - zero_value
+        # For the first crossing of the threshold
+        old_value_of_price = np.where(
+            short,
+            np.where(old_value_of_price > zero_value, zero_value - delta, old_value_of_price),
+            np.where(old_value_of_price < zero_value, zero_value + delta, old_value_of_price))
+        threshold = np.where(short, old_value_of_price - delta, old_value_of_price + delta)
+        # New SL value is (zero_value + price) / trail_oncoming_percent
+        better_sl_price = sl_value * conf_obj.trail_oncoming_percent - zero_value
+        trigger = np.where(short, np.minimum(threshold, better_sl_price), np.maximum(threshold, better_sl_price))
+        return np.where(short, trigger / (1 - tolerance), trigger / (1 + tolerance))
+
+    @classmethod
+    def _needs_to_move(cls, short: np.ndarray, sl_value: np.ndarray, zero_value: np.ndarray,
+                       price: np.ndarray) -> np.ndarray:
+        """Vectorised checks of the trailing stop by the cached price widened by the tolerance"""
+        trigger = cls.get_trigger_prices(short, sl_value, zero_value)
+        return np.where(short, price < trigger, price > trigger)
+
+    def get_arrays(self) -> TrailingArrays:
+        rows = list(self._annotate())
+
+        def by_position(long_index: int, short_index: int) -> np.ndarray:
+            return np.array([row[short_index] if row[1] == SignalPosition.SHORT.value else row[long_index]
+                             for row in rows], dtype=float)
+
+        # None values (no order, no price) become NaN
+        return TrailingArrays(
+            ids=np.array([row[0] for row in rows], dtype=np.int64),
+            symbols=[row[9] for row in rows],
+            short=np.array([row[1] == SignalPosition.SHORT.value for row in rows], dtype=bool),
+            sl_value=by_position(2, 3),
+            gl_sl_completed=np.array([bool(row[5] if row[1] == SignalPosition.SHORT.value else row[4])
+                                      for row in rows], dtype=bool),
+            zero_value=by_position(6, 7),
+            price=np.array([row[8] for row in rows], dtype=float))
+
+    def get_triggers(self) -> Tuple[List[Tuple[int, str, bool, float]], List[int]]:
+        """
+        Trigger prices of Signals: (id, symbol, short, trigger price)
+        and ids of Signals which have lost GL_SL order
+        """
+        arrays = self.get_arrays()
+        if not arrays.ids.size:
+            return [], []
+        with np.errstate(invalid='ignore', divide='ignore'):
+            triggers = self.get_trigger_prices(arrays.short, arrays.sl_value, arrays.zero_value)
+        selected = arrays.has_values & np.isfinite(triggers)
+        res = [(int(arrays.ids[i]), arrays.symbols[i], bool(arrays.short[i]), float(triggers[i]))
+               for i in np.flatnonzero(selected)]
+        return res, arrays.ids[arrays.lost_gl_sl].tolist()
+
+    def get_ids_to_trail(self) -> List[int]:
+        """Ids of Signals which may need to move SL (or have lost GL_SL order)"""
+        if not get_or_create_crontask().prices_update_worker_enabled:
+            # Cached prices are not updated
+            return list(self.signals.values_list('id', flat=True))
+        arrays = self.get_arrays()
+        if not arrays.ids.size:
+            return []
+        with np.errstate(invalid='ignore'):
+            needs_to_move = self._needs_to_move(arrays.short, arrays.sl_value, arrays.zero_value, arrays.price)
+        # Without cached price the Signal is checked by the current price
+        no_price = np.nan_to_num(arrays.price) <= 0
+        selected = arrays.lost_gl_sl | (arrays.has_values & (needs_to_move | no_price))
+        logger.debug(f"Trailing stop pre-screen: {int(selected.sum())} of {arrays.ids.size} Signals need to be checked")
+        return arrays.ids[selected].tolist()
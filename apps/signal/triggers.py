@@ -0,0 +1,249 @@
+import logging
+import time
+
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from django.db.models import Max, Min
+
+from apps.crontask.utils import get_or_create_crontask
+from apps.market.models import Market
+from apps.order.utils import OPENED_ORDER_STATUSES
+from binfun.settings import conf_obj, QUEUE_HIGH, QUEUE_LOW
+from .models import Signal, TakeProfit
+from .utils import SignalPosition, SIG_STATS_FOR_SPOIL_WORKER, PUSHED_BOUGHT_SOLD__SIG_STATS
+
+logger = logging.getLogger(__name__)
+
+
+class TriggerKind(Enum):
+    SPOIL = 'spoil'
+    TRAIL = 'trail'
+    GL_SL = 'gl_sl'
+
+
+class PriceLadder:
+    """
+    Thresholds of one symbol and one direction sorted by price.
+    Up: crossed if price >= threshold. Down: crossed if price <= threshold (kept negated).
+    Crossed thresholds are consumed: TriggerIndex keeps their Signals until the next build of the index
+    """
+
+    def __init__(self, up: bool, items: Iterable[Tuple[float, int]]):
+        self.up = up
+        items = sorted((price if up else -price, signal_id) for price, signal_id in items)
+        self._keys = np.array([key for key, _ in items], dtype=float)
+        self._signal_ids = [signal_id for _, signal_id in items]
+        self._start = 0
+
+    def __len__(self) -> int:
+        return len(self._signal_ids) - self._start
+
+    def crossed(self, price: float) -> List[int]:
+        """Signal ids of the crossed thresholds: O(log n) search by the sorted keys"""
+        end = int(np.searchsorted(self._keys, price if self.up else -price, side='right'))
+        if end <= self._start:
+            return []
+        res, self._start = self._signal_ids[self._start:end], end
+        return res
+
+
+class TriggerIndex:
+    """
+    Index of price thresholds of Signals by symbol:
+    - SPOIL: min TP (LONG, SPOT) or max TP (SHORT) of not bought Signals
+    - TRAIL: prices of the trailing stop (see TrailingScreen.get_trigger_prices)
+    - GL_SL: prices of opened Global Stop_loss orders
+    Fed by ticker prices it returns the affected Signal ids by kind.
+    Crossed Signals are returned again every retry_secs until the next build:
+    the task of the Signal could be refused as busy or fail, the build takes handled ones away
+    """
+
+    def __init__(self, retry_secs: Optional[float] = None):
+        self.retry_secs = retry_secs or conf_obj.price_trigger_retry_secs
+        self._items: Dict[Tuple[str, TriggerKind, bool], List[Tuple[float, int]]] = dict()
+        self._ladders: Dict[str, List[Tuple[TriggerKind, PriceLadder]]] = dict()
+        # Signals which are handled by the first feed regardless of the price
+        self._pending: Dict[TriggerKind, Set[int]] = dict()
+        # Signals returned by the previous feeds
+        self._crossed: Dict[TriggerKind, Set[int]] = dict()
+        self._retried_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return sum(len(ladder) for ladders in self._ladders.values() for _, ladder in ladders)
+
+    def add(self, kind: TriggerKind, symbol: str, signal_id: int, price: Optional[float], up: bool):
+        if price is None or not np.isfinite(price):
+            return
+        self._items.setdefault((symbol, kind, up), []).append((price, signal_id))
+
+    def add_pending(self, kind: TriggerKind, signal_ids: Iterable[int]):
+        self._pending.setdefault(kind, set()).update(signal_ids)
+
+    def build(self) -> 'TriggerIndex':
+        for (symbol, kind, up), items in self._items.items():
+            self._ladders.setdefault(symbol, []).append((kind, PriceLadder(up, items)))
+        self._items = dict()
+        return self
+
+    def feed(self, prices: Dict[str, float]) -> Dict[TriggerKind, Set[int]]:
+        """Crossed Signal ids by kind (and the ones crossed before if it's time to retry them)"""
+        res, self._pending = self._pending, dict()
+        for symbol, ladders in self._ladders.items():
+            price = prices.get(symbol)
+            if not price:
+                continue
+            for kind, ladder in ladders:
+                crossed = ladder.crossed(price)
+                if crossed:
+                    res.setdefault(kind, set()).update(crossed)
+        if time.monotonic() - self._retried_at >= self.retry_secs:
+            for kind, signal_ids in self._crossed.items():
+                res.setdefault(kind, set()).update(signal_ids)
+            self._retried_at = time.monotonic()
+        for kind, signal_ids in res.items():
+            self._crossed.setdefault(kind, set()).update(signal_ids)
+        return res
+
+    def _load_spoil(self, market: Market):
+        signals = Signal.objects.filter(market=market, _status__in=SIG_STATS_FOR_SPOIL_WORKER)
+        take_profits = TakeProfit.objects.filter(signal__in=signals).values(
+            'signal', 'signal__symbol', 'signal__position').annotate(min_value=Min('value'), max_value=Max('value'))
+        for take_profit in take_profits:
+            if take_profit['signal__position'] == SignalPosition.SHORT.value:
+                self.add(TriggerKind.SPOIL, take_profit['signal__symbol'], take_profit['signal'],
+                         take_profit['max_value'], up=False)
+            else:
+                self.add(TriggerKind.SPOIL, take_profit['signal__symbol'], take_profit['signal'],
+                         take_profit['min_value'], up=True)
+
+    def _load_trail(self, market: Market):
+        from .trailing import TrailingScreen
+        signals = Signal.objects.filter(
+            market=market, _status__in=PUSHED_BOUGHT_SOLD__SIG_STATS, trailing_stop_enabled=True)
+        triggers, lost_gl_sl_ids = TrailingScreen(signals).get_triggers()
+        for signal_id, symbol, short, price in triggers:
+            # Strict comparison of the trailing stop: the next tick beyond the price
+            self.add(TriggerKind.TRAIL, symbol, signal_id, float(np.nextafter(price, -np.inf if short else np.inf)),
+                     up=not short)
+        self.add_pending(TriggerKind.TRAIL, lost_gl_sl_ids)
+
+    def _load_gl_sl(self, market: Market):
+        from apps.order.models import BuyOrder, SellOrder
+        params = {
+            'market': market,
+            'local_canceled': False,
+            'handled_worked': False,
+            '_status__in': OPENED_ORDER_STATUSES,
+            'signal___status__in': PUSHED_BOUGHT_SOLD__SIG_STATS,
+        }
+        # SL of LONG is SELL order (worked if price falls), SL of SHORT is BUY one
+        for model, up in ((SellOrder, False), (BuyOrder, True)):
+            for signal_id, symbol, price in model.objects.filter(index=model.GL_SM_INDEX, **params).values_list(
+                    'signal', 'symbol', 'price'):
+                self.add(TriggerKind.GL_SL, symbol, signal_id, price, up=up)
+
+    @classmethod
+    def load(cls, market: Market, retry_secs: Optional[float] = None) -> 'TriggerIndex':
+        """Build the index of the Market by a few queries"""
+        crontask = get_or_create_crontask()
+        index = cls(retry_secs)
+        if crontask.spoil_worker_enabled:
+            index._load_spoil(market)
+        if crontask.trailing_stop_enabled:
+            index._load_trail(market)
+        if crontask.pull_job_enabled:
+            index._load_gl_sl(market)
+        index.build()
+        logger.debug(f"Trigger index of '{market}' has been built: {len(index)} thresholds")
+        return index
+
+
+class PriceTriggerWorker:
+    """
+    Event-driven spoil and trail steps: ticker prices of all symbols are got by one request by Market,
+    only Signals with crossed thresholds are handed out to the Celery tasks.
+    The index is rebuilt periodically to take new Signals and orders into account
+    """
+
+    def __init__(self,
+                 poll_secs: Optional[float] = None,
+                 rebuild_secs: Optional[float] = None,
+                 retry_secs: Optional[float] = None):
+        self.poll_secs = poll_secs or conf_obj.price_trigger_poll_secs
+        self.rebuild_secs = rebuild_secs or conf_obj.price_trigger_rebuild_secs
+        self.retry_secs = retry_secs or conf_obj.price_trigger_retry_secs
+        self._indexes: Dict[int, TriggerIndex] = dict()
+        self._built_at = 0.0
+
+    def _rebuild_if_needed(self, markets: List[Market]):
+        if time.monotonic() - self._built_at < self.rebuild_secs:
+            return
+        self._indexes = {market.pk: TriggerIndex.load(market, self.retry_secs) for market in markets}
+        self._built_at = time.monotonic()
+
+    @staticmethod
+    def _get_prices(market: Market) -> Dict[str, float]:
+        return {ticker_price['symbol']: float(ticker_price['price'])
+                for ticker_price in market.logic.get_ticker_current_prices()}
+
+    @staticmethod
+    def _dispatch(crossed: Dict[TriggerKind, Set[int]]):
+        from celery import chain
+        from .sharding import get_shard_queue, split_by_shard
+        from .tasks import (
+            fan_out,
+            spoil_worker_by_one_signal_task,
+            trailing_stop_worker_by_one_signal_task,
+            pull_job_by_one_signal_task,
+            sold_worker_by_one_signal_task,
+        )
+        fan_out('spoil', sorted(crossed.get(TriggerKind.SPOIL, ())), spoil_worker_by_one_signal_task)
+        fan_out('trail', sorted(crossed.get(TriggerKind.TRAIL, ())), trailing_stop_worker_by_one_signal_task)
+        # Worked GL_SL order is got from the Market and handled by the sold worker
+        gl_sl_ids = sorted(crossed.get(TriggerKind.GL_SL, ()))
+        if not gl_sl_ids:
+            return
+        if get_or_create_crontask().symbol_sharding_enabled:
+            ids_by_shard = split_by_shard(gl_sl_ids)
+        else:
+            ids_by_shard = {None: gl_sl_ids}
+        for shard, signal_ids in ids_by_shard.items():
+            pull_options = {'queue': get_shard_queue(QUEUE_LOW, shard)} if shard else {}
+            sold_options = {'queue': get_shard_queue(QUEUE_HIGH, shard)} if shard else {}
+            for signal_id in signal_ids:
+                chain(pull_job_by_one_signal_task.si(signal_id).set(**pull_options),
+                      sold_worker_by_one_signal_task.si(signal_id).set(**sold_options)).apply_async()
+
+    def run_once(self) -> int:
+        """Feed all indexes by current prices. Returns count of handed out Signals"""
+        markets = list(Market.objects.all())
+        self._rebuild_if_needed(markets)
+        handed_out = 0
+        for market in markets:
+            index = self._indexes.get(market.pk)
+            if index is None:
+                continue
+            crossed = index.feed(self._get_prices(market))
+            if crossed:
+                self._dispatch(crossed)
+                handed_out += sum(len(signal_ids) for signal_ids in crossed.values())
+                logger.debug(f"Price triggers of '{market}': "
+                             f"{ {kind.value: sorted(ids) for kind, ids in crossed.items()} }")
+        return handed_out
+
+    def run(self, once: bool = False):
+        while True:
+            started = time.monotonic()
+            if get_or_create_crontask().price_triggers_enabled:
+                try:
+                    self.run_once()
+                except Exception as ex:
+                    logger.error(f"Price trigger worker failed: '{ex}'")
+                    # The index will be built again
+                    self._built_at = 0.0
+            if once:
+                break
+            time.sleep(max(self.poll_secs - (time.monotonic() - started), 0))
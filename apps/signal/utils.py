@@ -149,7 +149,8 @@ def calculate_position(stop_loss: Union[float, str],
 def refuse_if_busy(func: Optional[Callable] = None):
     """
     Decorator to refuse doing the task if the object
-     of Signal model is busy with another task
+     of Signal model is busy with another task.
+    The refusal is kept in the flag _refused_as_busy of the object (the task could return None anyway)
     @refuse_if_busy
     @refuse_if_busy()
     """
@@ -162,9 +163,12 @@ def refuse_if_busy(func: Optional[Callable] = None):
         if self.busy_setting_time and\
                 (now_ - self.busy_setting_time).total_seconds() <= conf_obj.allowable_duration_of_task_secs:
             logger.debug(f"'{self}' - IS_BUSY_NOW")
+            self._refused_as_busy = True
             return
+        self._refused_as_busy = False
         self.busy_setting_time = now_
-        self.save()
+        # Only the flag: other fields of the object could be loaded earlier
+        self.save(update_fields=['busy_setting_time'])
         try:
             result = func(self, *args, **kwargs)
         except Exception as ex:
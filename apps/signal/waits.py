@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+
+from typing import Awaitable, Callable, Optional
+
+import redis
+
+from django.conf import settings
+
+from binfun.settings import conf_obj
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_STATUS_CHANNEL = 'binfun:signal_status:{}'
+
+_redis_client: Optional[redis.Redis] = None
+
+
+def get_redis_client() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_client
+
+
+def get_signal_status_channel(signal_id: int) -> str:
+    return SIGNAL_STATUS_CHANNEL.format(signal_id)
+
+
+def publish_signal_status(signal_id: Optional[int], status: str):
+    """Notify waiters that the status of the Signal has been changed"""
+    if not signal_id:
+        return
+    try:
+        get_redis_client().publish(get_signal_status_channel(signal_id), status)
+    except redis.RedisError as ex:
+        logger.debug(f"Signal status notification failed: '{ex}'")
+
+
+async def wait_for(predicate: Callable[[], Awaitable[bool]],
+                   timeout: Optional[float] = None,
+                   delay: float = 0.2,
+                   max_delay: Optional[float] = None,
+                   backoff: float = 2.0,
+                   channel: Optional[str] = None) -> bool:
+    """
+    Await the predicate becomes True without blocking the event loop.
+    Pauses between checks grow exponentially (up to max_delay) and are interrupted
+    by a message into the Redis channel (if set). Returns False on timeout
+    """
+    timeout = conf_obj.signal_wait_timeout_secs if timeout is None else timeout
+    max_delay = max_delay or conf_obj.signal_wait_max_delay_secs
+    loop = asyncio.get_event_loop()
+    deadline = time.monotonic() + timeout
+    pubsub = None
+    if channel:
+        try:
+            pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+            await loop.run_in_executor(None, pubsub.subscribe, channel)
+        except redis.RedisError as ex:
+            logger.debug(f"Subscription to '{channel}' failed, waiting without notifications: '{ex}'")
+            pubsub = None
+    try:
+        while True:
+            if await predicate():
+                return True
+            left = deadline - time.monotonic()
+            if left <= 0:
+                logger.debug(f"Waiting for '{getattr(predicate, '__name__', predicate)}' timed out")
+                return False
+            pause = min(delay, left)
+            if pubsub:
+                try:
+                    await loop.run_in_executor(None, pubsub.get_message, True, pause)
+                except redis.RedisError:
+                    pubsub = None
+                    await asyncio.sleep(pause)
+            else:
+                await asyncio.sleep(pause)
+            delay = min(delay * backoff, max_delay)
+    finally:
+        if pubsub:
+            pubsub.close()
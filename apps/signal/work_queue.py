@@ -0,0 +1,96 @@
+import logging
+import time
+
+from typing import Iterable, List, Optional
+
+from apps.crontask.utils import get_or_create_crontask
+from binfun.settings import conf_obj
+from .fan_out import FAN_OUT_STAGES
+from .models import Signal, SignalWorkItem
+from .sharding import ShardRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class WorkQueueWorker:
+    """
+    Stage worker of the work-item queue: claims due items (skipping locked ones) and handles their Signals.
+    A Signal busy with another stage (refused by refuse_if_busy) is retried shortly,
+    a failed item is retried with backoff up to work_queue_max_attempts failures.
+    Claim of the not handled items of the batch is extended while the batch is handled.
+    The worker of a shard takes only items of the symbols owned by the shard
+    """
+
+    def __init__(self,
+                 stages: Iterable[str] = tuple(FAN_OUT_STAGES),
+                 batch_size: Optional[int] = None,
+                 shard: Optional[str] = None):
+        self.stages: List[str] = list(stages)
+        self.batch_size = batch_size or conf_obj.work_queue_batch_size
+        self.shard = shard
+
+    def _get_symbols(self) -> Optional[List[str]]:
+        """Symbols owned by the shard of the worker (None - all symbols)"""
+        from apps.pair.models import Pair
+        if not self.shard or not get_or_create_crontask().symbol_sharding_enabled:
+            return None
+        ShardRegistry.heartbeat(self.shard)
+        symbols = Pair.objects.values_list('symbol', flat=True).distinct()
+        return ShardRegistry.get_ring().get_symbols(self.shard, symbols)
+
+    def _handle(self, stage_name: str, item: SignalWorkItem):
+        # The Signal is read right before the step: items of the batch are handled one by one
+        signal = Signal.objects.select_related('market', 'techannel').filter(pk=item.signal_id).first()
+        if not signal:
+            item.complete()
+            return
+        signal._refused_as_busy = False
+        try:
+            getattr(signal, FAN_OUT_STAGES[stage_name].by_one_signal_method)()
+        except Exception as ex:
+            failures = item.attempts + 1
+            if failures >= conf_obj.work_queue_max_attempts:
+                logger.error(f"Work queue: item '{item}' failed {failures} times and is dropped: '{ex}'")
+                item.complete()
+                return
+            logger.warning(f"Work queue: item '{item}' failed and will be retried: '{ex}'")
+            item.retry(conf_obj.work_queue_retry_delay_secs * 2 ** item.attempts, error=str(ex))
+            return
+        if signal._refused_as_busy:
+            # The Signal is handled by another stage now
+            item.retry(conf_obj.work_queue_retry_delay_secs)
+            return
+        item.complete()
+
+    def _handle_batch(self, stage_name: str, items: List[SignalWorkItem]):
+        claimed_at = time.monotonic()
+        for i, item in enumerate(items):
+            if time.monotonic() - claimed_at > conf_obj.work_queue_visibility_timeout_secs / 3:
+                SignalWorkItem.extend_claim([not_handled.pk for not_handled in items[i:]])
+                claimed_at = time.monotonic()
+            self._handle(stage_name, item)
+
+    def run_once(self) -> int:
+        """Claim and handle one batch of each stage. Returns number of handled items"""
+        handled = 0
+        symbols = self._get_symbols()
+        for stage_name in self.stages:
+            items = SignalWorkItem.claim(stage_name, self.batch_size, symbols)
+            self._handle_batch(stage_name, items)
+            handled += len(items)
+        return handled
+
+    def run(self, once: bool = False):
+        while True:
+            handled = 0
+            if get_or_create_crontask().work_queue_enabled:
+                try:
+                    handled = self.run_once()
+                except Exception as ex:
+                    logger.error(f"Work queue worker failed: '{ex}'")
+                if handled:
+                    logger.debug(f"Work queue: {handled} items have been handled")
+            if once:
+                break
+            if not handled:
+                time.sleep(conf_obj.work_queue_poll_secs)
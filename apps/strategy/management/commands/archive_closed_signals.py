@@ -0,0 +1,29 @@
+import logging
+
+from apps.signal.archive import SignalArchive
+from utils.framework.models import SystemCommand
+
+logger = logging.getLogger(__name__)
+
+
+class Command(SystemCommand):
+    help = 'Move CLOSED Signals older than N days with their orders and history to the archive schema'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float,
+                            help='Age of CLOSED Signals to archive')
+        parser.add_argument('--batch_size', type=int,
+                            help='Signals archived by one transaction')
+        parser.add_argument('--without_checking', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['without_checking']:
+            key = input('y/n: ')
+            if key.lower() in ['y', 'yes']:
+                logger.debug('You are agreed! Continue...')
+            else:
+                logger.debug("You typed No - The End")
+                quit()
+
+        archived = SignalArchive(days=options['days'], batch_size=options['batch_size']).run()
+        logger.debug(f"{archived} Signals have been archived")
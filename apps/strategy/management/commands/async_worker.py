@@ -0,0 +1,38 @@
+import asyncio
+import logging
+
+from apps.signal.async_worker import AsyncSignalWorker, ASYNC_STAGES
+from utils.framework.models import SystemCommand
+
+logger = logging.getLogger(__name__)
+
+
+class Command(SystemCommand):
+    help = 'Run push, pull and trail steps of all Signals concurrently on one event loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stages', nargs='+', choices=list(ASYNC_STAGES), default=list(ASYNC_STAGES))
+        parser.add_argument('--concurrency', type=int,
+                            help='Max number of Signals handled at the same time')
+        parser.add_argument('--db_threads', type=int,
+                            help='Size of the thread pool for DB access and sync steps')
+        parser.add_argument('--once', action='store_true',
+                            help='Run the stages once and exit')
+        parser.add_argument('--without_checking', action='store_true')
+
+    def handle(self, *args, **options):
+        stages = options['stages']
+        logger.debug(f"Async worker will run stages: {stages}")
+        if not options['without_checking']:
+            key = input('y/n: ')
+            if key.lower() in ['y', 'yes']:
+                logger.debug('You are agreed! Continue...')
+            else:
+                logger.debug("You typed No - The End")
+                quit()
+
+        worker = AsyncSignalWorker(stages=stages,
+                                   concurrency=options['concurrency'],
+                                   db_threads=options['db_threads'])
+        asyncio.get_event_loop().run_until_complete(worker.run(once=options['once']))
+        self.log_success('Async worker has been stopped')
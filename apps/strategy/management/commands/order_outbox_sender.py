@@ -0,0 +1,48 @@
+import logging
+import time
+
+from django.db import close_old_connections
+
+from apps.crontask.utils import get_or_create_crontask
+from apps.order.models import OrderOutbox
+from binfun.settings import conf_obj
+from utils.framework.models import SystemCommand
+
+logger = logging.getLogger(__name__)
+
+
+class Command(SystemCommand):
+    help = 'Push new orders by draining the order outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch_size', type=int,
+                            help='Intents taken at once')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain one batch and exit')
+        parser.add_argument('--without_checking', action='store_true')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if not options['without_checking']:
+            key = input('y/n: ')
+            if key.lower() in ['y', 'yes']:
+                logger.debug('You are agreed! Continue...')
+            else:
+                logger.debug("You typed No - The End")
+                quit()
+
+        while True:
+            handled = 0
+            try:
+                if get_or_create_crontask().order_outbox_enabled:
+                    handled = OrderOutbox.drain(batch_size=batch_size)
+                    if handled:
+                        logger.debug(f"Order outbox: {handled} intents have been handled")
+            except Exception as ex:
+                logger.error(f"Order outbox sender failed: '{ex}'")
+                # A broken DB connection is opened again by the next query
+                close_old_connections()
+            if options['once']:
+                break
+            if not handled:
+                time.sleep(conf_obj.order_outbox_poll_secs)
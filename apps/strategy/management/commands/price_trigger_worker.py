@@ -0,0 +1,34 @@
+import logging
+
+from apps.signal.triggers import PriceTriggerWorker
+from utils.framework.models import SystemCommand
+
+logger = logging.getLogger(__name__)
+
+
+class Command(SystemCommand):
+    help = 'Hand out Signals to spoil and trail steps when prices cross their thresholds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll_secs', type=float,
+                            help='Period of ticker prices requests')
+        parser.add_argument('--rebuild_secs', type=float,
+                            help='Period of rebuilding of the trigger index')
+        parser.add_argument('--retry_secs', type=float,
+                            help='Period of handing out of crossed Signals again till the rebuild')
+        parser.add_argument('--once', action='store_true',
+                            help='Feed the index once and exit')
+        parser.add_argument('--without_checking', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['without_checking']:
+            key = input('y/n: ')
+            if key.lower() in ['y', 'yes']:
+                logger.debug('You are agreed! Continue...')
+            else:
+                logger.debug("You typed No - The End")
+                quit()
+
+        PriceTriggerWorker(poll_secs=options['poll_secs'],
+                           rebuild_secs=options['rebuild_secs'],
+                           retry_secs=options['retry_secs']).run(once=options['once'])
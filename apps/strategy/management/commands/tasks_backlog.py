@@ -0,0 +1,16 @@
+import logging
+
+from apps.signal.coalescing import TaskCoalescer
+from apps.signal.fan_out import FAN_OUT_STAGES
+from utils.framework.models import SystemCommand
+
+logger = logging.getLogger(__name__)
+
+
+class Command(SystemCommand):
+    help = 'Show queued tasks of Signals by stage (task coalescing backlog)'
+
+    def handle(self, *args, **options):
+        for stage_name, backlog in TaskCoalescer.get_backlog(FAN_OUT_STAGES).items():
+            self.log_success(f"{stage_name}: pending {backlog['pending']}, oldest {backlog['oldest_secs']} secs,"
+                             f" dropped {backlog['dropped']}")
@@ -0,0 +1,36 @@
+import logging
+
+from apps.signal.fan_out import FAN_OUT_STAGES
+from apps.signal.sharding import get_own_shard
+from apps.signal.work_queue import WorkQueueWorker
+from utils.framework.models import SystemCommand
+
+logger = logging.getLogger(__name__)
+
+
+class Command(SystemCommand):
+    help = 'Claim and handle work items of Signals (SELECT ... FOR UPDATE SKIP LOCKED)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stages', nargs='+', choices=list(FAN_OUT_STAGES),
+                            default=list(FAN_OUT_STAGES),
+                            help='Stages handled by the worker')
+        parser.add_argument('--batch_size', type=int,
+                            help='Items claimed at once')
+        parser.add_argument('--shard', default=get_own_shard(),
+                            help='Shard of the worker (BINFUN_SHARD by default): only its symbols are handled')
+        parser.add_argument('--once', action='store_true',
+                            help='Handle one batch and exit')
+        parser.add_argument('--without_checking', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['without_checking']:
+            key = input('y/n: ')
+            if key.lower() in ['y', 'yes']:
+                logger.debug('You are agreed! Continue...')
+            else:
+                logger.debug("You typed No - The End")
+                quit()
+
+        WorkQueueWorker(stages=options['stages'], batch_size=options['batch_size'],
+                        shard=options['shard']).run(once=options['once'])
@@ -5,10 +5,14 @@ import shutil
 import time
 import matplotlib.pyplot as plt
 import logging
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from pytesseract import image_to_string
 from datetime import datetime
 
+from apps.signal.waits import wait_for
+from .ocr_cache import ocr_cache, preprocess_image, to_grayscale
+
 leverage_matches = ["LATHFFA", "EFA", "FFA", "EEA", "LETHEFA", "LATHEFA", "LETHFFA", "#LAT", "#LET", "HFFA"]
 regexp_numbers = '\d+\.?\d+'
 regexp_stop = '\d+\.?\d+$'
@@ -18,8 +22,14 @@ logger = logging.getLogger(__name__)
 class ChinaImageToSignal:
     def read_image(self, image):
         self.wait_for_file(image)
-        image = plt.imread(image)
-        text_in_image = image_to_string(image)
+        gray_image = to_grayscale(plt.imread(image))
+        image_hash = ocr_cache.get_hash(gray_image)
+        text_in_image = ocr_cache.get(image_hash)
+        if text_in_image is None:
+            text_in_image = image_to_string(preprocess_image(gray_image))
+            ocr_cache.set(image_hash, text_in_image)
+        else:
+            logger.debug(f"OCR cache: text of '{image}' has been taken from the cache")
         splitted_info = text_in_image.splitlines()
         return splitted_info
 
@@ -119,25 +129,37 @@ class ChinaImageToSignal:
         from .models import SignalModel
         return SignalModel(pair, None, None, position, leverage, entry_points, profits, stop_loss, message_id)
 
+    def _get_image_files(self):
+        return [filename for filename in os.listdir(settings.BASE_DIR)
+                if filename.endswith(".jpg") or filename.endswith(".png")]
+
     def iterate_files(self, message_id):
         pairs = []
         directory = settings.BASE_DIR
-        for filename in os.listdir(directory):
-            if filename.endswith(".jpg") or filename.endswith(".png"):
-                try:
-                    pair_info = self.get_parsed(filename, message_id)
-                    pairs.append(pair_info)
-                    now = str(datetime.now())[:19]
-                    now = now.replace(":", "_")
-                    if pair_info.pair == '':
-                        raise Exception
-                except:
-                    logger.error(f"Image parser ERROR: Cannot parse image'{filename}'")
-                finally:
-                    shutil.move(f"{directory}/{filename}",
-                                f"{settings.PARSED_IMAGES_STORAGE}/" + str(now) + ".jpg")
+        for filename in self._get_image_files():
+            try:
+                pair_info = self.get_parsed(filename, message_id)
+                pairs.append(pair_info)
+                now = str(datetime.now())[:19]
+                now = now.replace(":", "_")
+                if pair_info.pair == '':
+                    raise Exception
+            except:
+                logger.error(f"Image parser ERROR: Cannot parse image'{filename}'")
+            finally:
+                shutil.move(f"{directory}/{filename}",
+                            f"{settings.PARSED_IMAGES_STORAGE}/" + str(now) + ".jpg")
         return pairs
 
+    async def async_iterate_files(self, message_id):
+        """
+        Wait for downloaded images without blocking the event loop,
+        then recognize them in a thread
+        """
+        for filename in self._get_image_files():
+            await self.async_wait_for_file(filename)
+        return await sync_to_async(self.iterate_files)(message_id)
+
     def is_locked(self, filepath):
         locked = None
         file_object = None
@@ -158,4 +180,9 @@ class ChinaImageToSignal:
     def wait_for_file(self, filepath):
         wait_time = 1
         while self.is_locked(filepath):
-            time.sleep(wait_time)
\ No newline at end of file
+            time.sleep(wait_time)
+
+    async def async_wait_for_file(self, filepath):
+        async def is_unlocked():
+            return not self.is_locked(filepath)
+        await wait_for(is_unlocked, delay=0.1, max_delay=1)
@@ -0,0 +1,44 @@
+import logging
+import time
+
+from collections import defaultdict
+
+from apps.telegram.models import Telegram
+from apps.telegram.parser_corpus import load_corpus
+from apps.telegram.parser_registry import get_parser_spec
+from utils.framework.models import SystemCommand
+
+logger = logging.getLogger(__name__)
+
+
+class Command(SystemCommand):
+    help = 'Measure messages/second of the registered channel parsers over a corpus of stored messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', type=str, help='Path to the JSONL corpus of messages')
+        parser.add_argument('--channel', type=str, help='Benchmark only this channel (abbreviation)')
+        parser.add_argument('--repeat', type=int, default=100, help='How many times to parse every message')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        telegram = Telegram(client=None)
+        messages = defaultdict(list)
+        for message in load_corpus(options['corpus'], options['channel']):
+            messages[message.channel].append(message)
+
+        for channel, channel_messages in sorted(messages.items()):
+            spec = get_parser_spec(channel)
+            if not spec:
+                continue
+            errors = 0
+            started = time.perf_counter()
+            for _ in range(repeat):
+                for message in channel_messages:
+                    try:
+                        spec.parse(telegram, message.text, message.message_id)
+                    except Exception:
+                        errors += 1
+            elapsed = time.perf_counter() - started
+            parsed = len(channel_messages) * repeat
+            self.log_success(f"{channel}: {parsed / elapsed if elapsed else 0:.0f} messages/sec"
+                             f" ({len(channel_messages)} messages x {repeat}, errors: {errors // repeat})")
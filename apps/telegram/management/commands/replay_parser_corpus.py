@@ -0,0 +1,91 @@
+import logging
+import time
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from apps.telegram.parser_corpus import CorpusMessage, load_corpus, dump_corpus, get_diff, signal_model_to_dict
+from apps.telegram.parser_registry import IMAGE_CHANNELS, get_parser_spec
+from utils.framework.models import SystemCommand
+
+logger = logging.getLogger(__name__)
+
+_telegram = None
+
+
+def _parse_message(message: CorpusMessage) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+    """Run the registered parser of the message channel (in a worker process)"""
+    global _telegram
+    from apps.telegram.image_parser import ChinaImageToSignal
+    from apps.telegram.models import Telegram
+    if _telegram is None:
+        _telegram = Telegram(client=None)
+    try:
+        if message.channel in IMAGE_CHANNELS:
+            if not message.media:
+                return None, 'no media'
+            signals = [ChinaImageToSignal().get_parsed(message.media, message.message_id)]
+        else:
+            spec = get_parser_spec(message.channel)
+            if not spec:
+                return None, 'no registered parser'
+            signals = spec.parse(_telegram, message.text, message.message_id)
+    except Exception as ex:
+        return None, f'{type(ex).__name__}: {ex}'
+    return [signal_model_to_dict(signal) for signal in signals], None
+
+
+class Command(SystemCommand):
+    help = 'Replay the registered channel parsers over a JSONL corpus: accuracy diffs and throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', type=str, help='Path to the JSONL corpus of messages')
+        parser.add_argument('--channel', type=str, help='Replay only this channel (abbreviation)')
+        parser.add_argument('--workers', type=int, default=4, help='Number of parser processes')
+        parser.add_argument('--record', type=str,
+                            help='Write the corpus with parsed signals as expected ones into this file')
+
+    def handle(self, *args, **options):
+        messages = list(load_corpus(options['corpus'], options['channel']))
+        if not messages:
+            self.log_error('Corpus is empty')
+            return
+        chunk_size = max(len(messages) // (options['workers'] * 4), 1)
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            results = list(executor.map(_parse_message, messages, chunksize=chunk_size))
+        elapsed = time.perf_counter() - started
+
+        stats = defaultdict(lambda: defaultdict(int))
+        recorded = []
+        for message, (parsed, error) in zip(messages, results):
+            channel_stats = stats[message.channel]
+            channel_stats['total'] += 1
+            recorded.append(message._replace(expected=parsed) if parsed is not None else message)
+            if error:
+                channel_stats['errors'] += 1
+                self.log_error(f"{message.channel}:{message.message_id}: {error}")
+                continue
+            if message.expected is None:
+                channel_stats['without_expected'] += 1
+                continue
+            diff = get_diff(message.expected, parsed)
+            if diff:
+                channel_stats['mismatched'] += 1
+                self.log_error(f"{message.channel}:{message.message_id}: " + '; '.join(diff))
+            else:
+                channel_stats['matched'] += 1
+
+        for channel, channel_stats in sorted(stats.items()):
+            compared = channel_stats['matched'] + channel_stats['mismatched']
+            accuracy = channel_stats['matched'] / compared * 100 if compared else 0
+            self.log_success(f"{channel}: total {channel_stats['total']}, matched {channel_stats['matched']},"
+                             f" mismatched {channel_stats['mismatched']}, errors {channel_stats['errors']},"
+                             f" without expected {channel_stats['without_expected']}, accuracy {accuracy:.1f}%")
+        self.log_success(f"Parsed {len(messages)} messages in {elapsed:.2f}s"
+                         f" ({len(messages) / elapsed if elapsed else 0:.0f} messages/sec,"
+                         f" {options['workers']} workers)")
+        if options['record']:
+            dump_corpus(options['record'], recorded)
+            self.log_success(f"Corpus with parsed signals has been written into '{options['record']}'")
@@ -3,18 +3,19 @@ import logging
 from datetime import timedelta
 from sys import platform
 import pytesseract
-import time
 
 from asgiref.sync import sync_to_async
 from telethon.tl.types import User
 
 from apps.signal.models import SignalOrig, Signal, EntryPoint, TakeProfit, SignalDesc
+from apps.signal.waits import wait_for, get_signal_status_channel
 from apps.techannel.models import Techannel
 from binfun.settings import conf_obj
 from tools.tools import rounded_result
 from utils.parse_channels.str_parser import left_numbers, replace_rus_to_eng, handle_crypto_angel_to_array
 from .base_model import BaseTelegram
 from .image_parser import ChinaImageToSignal
+from .parser_registry import TOKENFAST_GRAMMAR, SERVER_GRAMMAR, get_parser_spec
 from apps.market.models import get_or_create_async_futures_market
 
 from .verify_signal import SignalVerification
@@ -58,13 +59,20 @@ class Telegram(BaseTelegram):
     name = 'Telegram'
     one_satoshi = 0.00000001
 
+    def parse_message(self, channel_abbr: str, message_text: str, message_id=None):
+        """Parse the message by the parser of the channel registered in PARSER_REGISTRY"""
+        spec = get_parser_spec(channel_abbr)
+        if not spec:
+            return None
+        return spec.call(self, message_text, message_id)
+
     async def parse_cf_trader_channel(self):
         channel_abbr = 'cf_tr'
         tca = int(conf_obj.CFTrader)
         async for message in self.client.iter_messages(tca, limit=7):
             exists = await self.is_signal_handled(message.id, channel_abbr)
             if message.text and not exists:
-                signal = self.parse_cf_trader_message(message.text, message.id)
+                signal = self.parse_message(channel_abbr, message.text, message.id)
                 if signal.pair:
                     urgent_action = signal.current_price
                     if urgent_action == 'cancel':
@@ -97,10 +105,10 @@ class Telegram(BaseTelegram):
         profits = []
         stop_loss = ['']
         signal_identification = 'CF Leverage Trading Signal'
-        should_entry = [i for i, s in enumerate(splitted_info) if 'Stop loss:' in s]
-        should_close = [i for i, s in enumerate(lower_info) if 'close' in s or 'closing' in s or 'closed' in s]
+        should_entry = 'Stop loss:' in text
+        should_close = 'close' in lower_text or 'closing' in lower_text
         if should_close:
-            reached_label = [i for i, s in enumerate(splitted_info) if 'reached' in s]
+            reached_label = 'reached' in text
             coin = ''
             if reached_label:
                 coin = splitted_info[0].split()[0]
@@ -114,7 +122,7 @@ class Telegram(BaseTelegram):
                                  leverage, entries, profits, stop_loss, message_id)
             return signal
         if not should_entry:
-            should_entry = [i for i, s in enumerate(splitted_info) if 'SL:' in s]
+            should_entry = 'SL:' in text
         if not should_entry:
             signal = SignalModel(pair, current_price, margin_type, position,
                                  leverage, entries, profits, stop_loss, message_id)
@@ -172,7 +180,7 @@ class Telegram(BaseTelegram):
     async def parse_tokenfast_channel(self):
         chat_id = int(conf_obj.lucrative_channel)
         async for message in self.client.iter_messages(chat_id, limit=16):
-            signal = self.parse_tokenfast_message(message.text)
+            signal = self.parse_message('tokenfast', message.text)
             exists = await self.is_signal_handled(signal.msg_id, signal.algorithm)
             if not exists and signal.pair:
                 urgent_action = signal.current_price
@@ -189,7 +197,7 @@ class Telegram(BaseTelegram):
         chat_id = int(conf_obj.Luck8414)
         async for message in self.client.iter_messages(chat_id, limit=6):
             if message.text:
-                signal = self.parse_tokenfast_message(message.text)
+                signal = self.parse_message('tokenfast', message.text)
                 is_shared = await self.is_signal_shared(signal.msg_id, signal.algorithm)
                 if not is_shared:
                     await self.send_shared_message(int(conf_obj.lucrative_channel), signal,
@@ -204,14 +212,8 @@ class Telegram(BaseTelegram):
                                                      outer_signal_id=signal.msg_id)
 
     def parse_tokenfast_message(self, message_text):
-        splitted_info = message_text.splitlines()
-        buy_label = 'Entry Points: '
-        pair_label = 'Pair:'
-        goals_label = 'Take Profits: '
-        stop_label = 'Stop Loss: '
         pair = ''
         current_price = ''
-        margin_type_label = 'Margin type:'
         margin_type = ''
         leverage = 'Leverage: '
         entries = ''
@@ -219,38 +221,28 @@ class Telegram(BaseTelegram):
         message_id = ''
         profits = []
         stop_loss = ''
-        datetime_label = 'Time:'
         algorithm = 'Algorithm: '
-        outer_id_label = 'ID: '
-        for line in splitted_info:
-            if line.startswith(pair_label):
-                possible_pair = line.split(' ')
-                pair = ''.join(filter(str.isalpha, possible_pair[1]))
-            if line.startswith(margin_type_label):
-                margin_type = line[12:]
-                margin_type = margin_type.replace('\'', '')
-                margin_type = margin_type.replace(' ', '')
-            if line.startswith(leverage):
-                possible_leverage = line.split(' ')
-                leverage = ''.join(filter(str.isdigit, possible_leverage[1]))
-            if line.startswith(buy_label):
-                possible_entries = line[14:]
-                entries = left_numbers(possible_entries.split(','))
-            if line.startswith(goals_label):
-                possible_profits = line[14:]
-                profits = left_numbers(possible_profits.split(','))
-            if line.startswith(stop_label):
-                stop_loss = line[11:].replace('\'', '')
-            if line.startswith(datetime_label):
-                current_price = line[7:].replace('\'', '')
-                if 'cancel' in current_price or 'activate' in current_price:
-                    current_price = current_price
-                else:
+        for field, value in TOKENFAST_GRAMMAR.tokenize(message_text):
+            if field == 'pair':
+                pair = ''.join(filter(str.isalpha, value.split(' ')[1]))
+            elif field == 'margin_type':
+                margin_type = value.replace('\'', '').replace(' ', '')
+            elif field == 'leverage':
+                leverage = ''.join(filter(str.isdigit, value.split(' ')[0]))
+            elif field == 'entries':
+                entries = left_numbers(value.split(','))
+            elif field == 'profits':
+                profits = left_numbers(value.split(','))
+            elif field == 'stop_loss':
+                stop_loss = value.replace('\'', '')
+            elif field == 'datetime':
+                current_price = value[2:].replace('\'', '')
+                if 'cancel' not in current_price and 'activate' not in current_price:
                     current_price = current_price + '+02:00'
-            if line.startswith(algorithm):
-                algorithm = line[len(algorithm):].replace('\'', '')
-            if line.startswith(outer_id_label):
-                message_id = line[4:].replace('\'', '')
+            elif field == 'algorithm':
+                algorithm = value.replace('\'', '')
+            elif field == 'outer_id':
+                message_id = value.replace('\'', '')
         if stop_loss and entries and profits:
             position = calculate_position(stop_loss, entries, profits)
         signal = SignalModel(pair, current_price, margin_type, position,
@@ -267,8 +259,8 @@ class Telegram(BaseTelegram):
             should_handle_msg = not exists
             if should_handle_msg and message.media:
                 await message.download_media()
-                pairs = info_getter.iterate_files(message.id)
-                signal = verify_signal.get_active_pairs_info(pairs)
+                pairs = await info_getter.async_iterate_files(message.id)
+                signal = await verify_signal.async_get_active_pairs_info(pairs)
                 if not signal:
                     return
                 inserted_to_db = await self.write_signal_to_db(channel_abbr, signal, message.id, message.date)
@@ -300,8 +292,8 @@ class Telegram(BaseTelegram):
 
             if not media_signal_exists and message.media:
                 await message.download_media()
-                pairs = info_getter.iterate_files(message.id)
-                signal = verify_signal.get_active_pairs_info(pairs)
+                pairs = await info_getter.async_iterate_files(message.id)
+                signal = await verify_signal.async_get_active_pairs_info(pairs)
                 if not signal:
                     return
                 inserted_to_db = await self.write_signal_to_db(channel_abbr, signal, message.id, message.date)
@@ -329,7 +321,7 @@ class Telegram(BaseTelegram):
             exists = await self.is_signal_handled(message.id, channel_abbr)
             should_handle_msg = not exists
             if message.text and should_handle_msg:
-                signal = self.parse_angel_message(message.text, message.id)
+                signal = self.parse_message(channel_abbr, message.text, message.id)
                 if signal.pair:
                     inserted_to_db = await self.write_signal_to_db(channel_abbr, signal, message.id, message.date)
                     if inserted_to_db != 'success':
@@ -345,7 +337,7 @@ class Telegram(BaseTelegram):
             exists = await self.is_signal_handled(message.id, channel_abbr)
             should_handle_msg = not exists
             if message.text and should_handle_msg:
-                signal = self.parse_crypto_futures_message(message.text, message.id)
+                signal = self.parse_message(channel_abbr, message.text, message.id)
                 if signal:
                     inserted_to_db = await self.write_signal_to_db(channel_abbr, signal, message.id, message.date)
                     if inserted_to_db != 'success':
@@ -449,7 +441,7 @@ class Telegram(BaseTelegram):
             exists = await self.is_signal_handled(message.id, channel_abbr)
             should_handle_msg = not exists
             if message.text and should_handle_msg:
-                signal = self.parse_white_bull_message(message.text, message.id)
+                signal = self.parse_message(channel_abbr, message.text, message.id)
                 if signal.entry_points and signal.pair:
                     inserted_to_db = await self.write_signal_to_db(channel_abbr, signal, message.id, message.date)
                     if inserted_to_db != 'success':
@@ -518,7 +510,7 @@ class Telegram(BaseTelegram):
             exists = await self.is_signal_handled(message.id, channel_abbr)
             should_handle_msg = not exists
             if message.text and should_handle_msg:
-                signal = self.parse_klondike_message(message.text, message.id)
+                signal = self.parse_message(channel_abbr, message.text, message.id)
                 if signal.entry_points and signal.pair:
                     inserted_to_db = await self.write_signal_to_db(channel_abbr, signal, message.id, message.date)
                     if inserted_to_db != 'success':
@@ -611,7 +603,7 @@ class Telegram(BaseTelegram):
         async for message in self.client.iter_messages(entity=channel_entity, limit=15):
             exists = await self.is_signal_handled(message.id, channel_abbr)
             if message.text and not exists:
-                signal = self.parse_wcse_message(message.text, message.id)
+                signal = self.parse_message(channel_abbr, message.text, message.id)
                 if signal.pair:
                     if signal.entry_points:
                         inserted_to_db = await self.write_signal_to_db(channel_abbr, signal, message.id, message.date)
@@ -677,15 +669,20 @@ class Telegram(BaseTelegram):
         return profits
 
     async def _close_signal(self, signal):
-        counter = 1
-        cancelled_signal = False
-        while not cancelled_signal and counter < 301:
-            logger.info(f'Trying to close the signal: {signal.symbol}, id:{signal.id}, Attempt #{counter}')
+        attempt = 0
+
+        async def try_to_close_signal():
+            nonlocal attempt
+            attempt += 1
+            logger.info(f'Trying to close the signal: {signal.symbol}, id:{signal.id}, Attempt #{attempt}')
             await signal.async_try_to_spoil_by_one_signal(True)
             cancelled_signal = await self._is_signal_cancelled(signal)
             logger.info(f'Is signal {signal.symbol} with id:{signal.id} cancelled: {cancelled_signal}')
-            time.sleep(1)
-            counter += 1
+            return cancelled_signal
+
+        closed = await wait_for(try_to_close_signal, channel=get_signal_status_channel(signal.id))
+        if not closed:
+            logger.warning(f'Signal {signal.symbol} with id:{signal.id} has not been closed in time')
 
     def parse_wcse_message(self, message_text, message_id):
         splitted_info = message_text.splitlines()
@@ -774,19 +771,16 @@ class Telegram(BaseTelegram):
         channel_abbr = 'server'
         async for message in self.client.iter_messages(channel_id, limit=5):
             if message.text:
-                signal = self.parse_server_message(message.text)
+                signal = self.parse_message(channel_abbr, message.text)
                 exists = await self.is_signal_handled(signal.msg_id, channel_abbr)
                 if signal.pair and not exists and signal.current_price != 'close':
                     inserted_to_db = await self.write_signal_to_db(channel_abbr, signal, signal.msg_id, message.date)
                     if inserted_to_db != 'success':
                         await self.send_error_message_to_yourself(signal, inserted_to_db)
                 if signal.pair and exists and 'close' in signal.current_price:
-                    cancelled_signal = False
                     signal_object = await self._get_async_processing_signal(signal.pair, channel_abbr, signal.msg_id)
-                    while not cancelled_signal:
-                        time.sleep(0.2)
-                        await signal_object.async_try_to_spoil_by_one_signal(True)
-                        cancelled_signal = await self._is_signal_cancelled()
+                    if signal_object:
+                        await self._close_signal(signal_object)
 
     async def parse_alertatron_channel(self):
         channel_id = int(conf_obj.fsvzo)
@@ -943,11 +937,6 @@ class Telegram(BaseTelegram):
         return stop_loss
 
     def parse_server_message(self, message_text):
-        splitted_info = message_text.splitlines()
-        buy_label = 'Entry Points: '
-        pair_label = 'Pair:'
-        goals_label = 'Take Profits: '
-        stop_label = 'Stop Loss: '
         pair = ''
         current_price = ''
         margin_type = False
@@ -956,34 +945,26 @@ class Telegram(BaseTelegram):
         message_id = ''
         profits = []
         stop_loss = ''
-        datetime_label = 'Time:'
         algorithm = 'Algorithm: '
-        outer_id_label = 'ID: '
-        for line in splitted_info:
-            if line.startswith(pair_label):
-                possible_pair = line.split(' ')
-                pair = ''.join(filter(str.isalpha, possible_pair[1]))
-            if line.startswith(leverage):
-                possible_leverage = line.split(' ')
-                leverage = ''.join(filter(str.isdigit, possible_leverage[1]))
-            if line.startswith(buy_label):
-                possible_entries = line[14:]
-                entries = left_numbers(possible_entries.split(','))
-            if line.startswith(goals_label):
-                possible_profits = line[14:]
-                profits = left_numbers(possible_profits.split(','))
-            if line.startswith(stop_label):
-                stop_loss = line[11:].replace('\'', '')
-            if line.startswith(datetime_label):
-                current_price = line[6:].replace('\'', '')
-                if 'close' in current_price:
-                    current_price = current_price
-                else:
+        for field, value in SERVER_GRAMMAR.tokenize(message_text):
+            if field == 'pair':
+                pair = ''.join(filter(str.isalpha, value.split(' ')[1]))
+            elif field == 'leverage':
+                leverage = ''.join(filter(str.isdigit, value.split(' ')[0]))
+            elif field == 'entries':
+                entries = left_numbers(value.split(','))
+            elif field == 'profits':
+                profits = left_numbers(value.split(','))
+            elif field == 'stop_loss':
+                stop_loss = value.replace('\'', '')
+            elif field == 'datetime':
+                current_price = value[1:].replace('\'', '')
+                if 'close' not in current_price:
                     current_price = current_price + '+02:00'
-            if line.startswith(algorithm):
-                algorithm = line[len(algorithm):].replace('\'', '')
-            if line.startswith(outer_id_label):
-                message_id = line[4:].replace('\'', '')
+            elif field == 'algorithm':
+                algorithm = value.replace('\'', '')
+            elif field == 'outer_id':
+                message_id = value.replace('\'', '')
         position = calculate_position(stop_loss, entries, profits)
         signal = SignalModel(pair, current_price, margin_type, position,
                              leverage, entries, profits, stop_loss, message_id, algorithm)
@@ -1001,7 +982,7 @@ class Telegram(BaseTelegram):
         async for message in self.client.iter_messages(chat_id, limit=5):
             exists = await self.is_signal_handled(message.id, channel_abbr)
             if message.text and not exists:
-                signal = self.parse_tca_message(message.text, message.id, channel_abbr)
+                signal = self.parse_message(channel_abbr, message.text, message.id)
                 if signal.pair:
                     inserted_to_db = await self.write_signal_to_db(channel_abbr, signal, message.id, message.date)
                     if inserted_to_db != 'success':
@@ -1059,7 +1040,7 @@ class Telegram(BaseTelegram):
         async for message in self.client.iter_messages(chat_id, limit=6):
             exists = await self.is_signal_handled(message.id, channel_abbr)
             if message.text and not exists:
-                signal = self.parse_vege_message(message.text, message.id, channel_abbr)
+                signal = self.parse_message(channel_abbr, message.text, message.id)
                 if signal[0].pair:
                     inserted_to_db = await self.write_signal_to_db(channel_abbr, signal[0], '-' + message.id, message.date)
                     if inserted_to_db != 'success':
@@ -1076,79 +1057,47 @@ class Telegram(BaseTelegram):
                                                             message.date, channel_abbr, message.id)
 
     def parse_vege_message(self, message_text, message_id, channel_abbr):
-        splitted_info = message_text.splitlines()
-
+        """
+        The message can contain two signals for the same pair:
+        N-th 'Вход:', 'Цели:', 'Стоп-лосс:' lines belong to the N-th signal
+        """
         buy_label = 'Покупка #'
         possible_take_profits = 'Цели:'
         stop_label = 'Стоп-лосс:'
         action_price = 'Вход:'
         margin_type = MarginType.ISOLATED.value
         leverage = 5
-        entries = []
-        entries2 = []
-        position = ''
         pair = ''
-        profits = []
-        profits2 = []
-        stop_loss = ''
-        stop_loss2 = ''
-        position2 = ''
-        signal_identification = ['#фьючерсы']
-        is_signal = signal_identification in splitted_info[0]
-        two_signals = True
-        if not is_signal:
-            signal = SignalModel(pair, action_price, margin_type, position,
-                                 leverage, entries, profits, stop_loss, message_id)
+        signal_identification = '#фьючерсы'
+        splitted_info = message_text.splitlines()
+        if not splitted_info or signal_identification not in splitted_info[0]:
+            signal = SignalModel(pair, action_price, margin_type, '',
+                                 leverage, [], [], '', message_id)
             return [signal]
 
-        action_index = [i for i, s in enumerate(splitted_info) if action_price in s]
-        profits_index = [i for i, s in enumerate(splitted_info) if possible_take_profits in s]
-        stop_index = [i for i, s in enumerate(splitted_info) if stop_label in s]
-        if len(action_index) == 2:
-            two_signals = True
-        for i, line in splitted_info:
+        entries, profits, stop_losses = [], [], []
+        for line in splitted_info:
             if buy_label in line:
                 possible_pair = line.split('#')[1]
                 pair = possible_pair.split(',')[0] + 'USDT'
-            if action_price in line and i == action_index[0]:
-                possible_entries = line.split(' ')[1]
-                if '—' in possible_entries:
-                    entries.append(possible_entries.split('—'))
-                else:
-                    entries.append(possible_entries)
-            if two_signals:
-                if action_price in line and i == action_index[1]:
-                    possible_entries = line.split(' ')[1]
-                    if '—' in possible_entries:
-                        entries2.append(possible_entries.split('—'))
-                    else:
-                        entries2.append(possible_entries)
-            if line.startswith(possible_take_profits) and i == profits_index[0]:
+            elif action_price in line:
+                possible_entries = line.split(action_price)[1].strip().split(' ')[0]
+                entries.append(left_numbers(possible_entries.split('—')))
+            elif line.startswith(possible_take_profits):
                 fake_profits = line.split(possible_take_profits)[1]
-                profits = fake_profits.split(', ')
-            if two_signals:
-                if line.startswith(possible_take_profits) and i == profits_index[1]:
-                    fake_profits = line.split(possible_take_profits)[1]
-                    profits2 = fake_profits.split(', ')
-            if line.startswith(stop_label) and i == stop_index[0]:
-                stop_loss = line.split('$')
-                stop_loss = stop_loss.split(' ')[1]
-            if two_signals:
-                if line.startswith(stop_label) and i == stop_index[1]:
-                    stop_loss2 = line.split('$')
-                    stop_loss2 = stop_loss2.split(' ')[1]
-        position = calculate_position(stop_loss, entries, profits)
-        if two_signals:
-            position2 = calculate_position(stop_loss2, entries2, profits2)
-        """ Take only first 4 take profits: """
-        profits = profits[:4]
-        signal1 = SignalModel(pair, action_price, margin_type, position,
-                              leverage, entries, profits, stop_loss, message_id, channel_abbr)
-        if two_signals:
-            signal2 = SignalModel(pair, action_price, margin_type, position2,
-                                  leverage, entries2, profits2, stop_loss2, message_id, channel_abbr)
-            return [signal1, signal2]
-        return [signal1]
+                # Take only first 4 take profits
+                profits.append(left_numbers(fake_profits.split(', '))[:4])
+            elif line.startswith(stop_label):
+                stop_loss = line.split(stop_label)[1].strip().split(' ')[0]
+                stop_losses.append(stop_loss.replace('$', ''))
+        signals = []
+        for signal_entries, signal_profits, stop_loss in zip(entries, profits, stop_losses):
+            position = calculate_position(stop_loss, signal_entries, signal_profits)
+            signals.append(SignalModel(pair, action_price, margin_type, position,
+                                       leverage, signal_entries, signal_profits, stop_loss, message_id,
+                                       channel_abbr))
+        return signals[:2] or [SignalModel('', action_price, margin_type, '',
+                                           leverage, [], [], '', message_id)]
 
     async def parse_margin_whale_channel(self):
         chat_id = int(conf_obj.margin_whales)
@@ -1157,7 +1106,7 @@ class Telegram(BaseTelegram):
             exists = await self.is_signal_handled(message.id, channel_abbr)
             should_handle_msg = not exists
             if should_handle_msg:
-                signal = self.parse_margin_whale_message(message.text, message.id)
+                signal = self.parse_message(channel_abbr, message.text, message.id)
                 if signal.pair:
                     inserted_to_db = await self.write_signal_to_db(channel_abbr, signal, message.id, message.date)
                     if inserted_to_db != 'success':
@@ -1180,7 +1129,7 @@ class Telegram(BaseTelegram):
         entries = ''
         profits = []
         stop_loss = ''
-        should_entry = [i for i, s in enumerate(splitted_info) if margin_label in s]
+        should_entry = margin_label in message_text
         if not should_entry:
             signal = SignalModel(pair, current_price, margin_type, position,
                                  leverage, entries, profits, stop_loss, message_id)
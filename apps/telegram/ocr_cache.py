@@ -0,0 +1,122 @@
+import hashlib
+import logging
+
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import redis
+
+from django.conf import settings
+
+from binfun.settings import conf_obj
+
+logger = logging.getLogger(__name__)
+
+
+class OcrCache:
+    """
+    LRU cache of recognized image texts keyed by a content hash of the pixels,
+    also persisted into Redis to survive restarts.
+    Only the same image is a hit: images of one channel template differ by a few pixels (prices, pairs)
+    """
+    redis_key_prefix = 'binfun:ocr:'
+
+    def __init__(self,
+                 max_size: Optional[int] = None,
+                 ttl_secs: Optional[int] = None):
+        self.max_size = max_size or conf_obj.ocr_cache_size
+        self.ttl_secs = ttl_secs or conf_obj.ocr_cache_ttl_secs
+        self._items: 'OrderedDict[str, str]' = OrderedDict()
+        self._redis: Optional[redis.Redis] = None
+
+    @property
+    def redis_client(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = redis.Redis.from_url(settings.REDIS_URL)
+        return self._redis
+
+    @staticmethod
+    def get_hash(gray_image: np.ndarray) -> str:
+        """sha256 of the grayscale pixels and the shape of the image"""
+        gray_image = np.ascontiguousarray(gray_image, dtype=np.float32)
+        image_hash = hashlib.sha256(str(gray_image.shape).encode())
+        image_hash.update(gray_image.tobytes())
+        return image_hash.hexdigest()
+
+    def _get_redis_key(self, image_hash: str) -> str:
+        return f'{self.redis_key_prefix}{image_hash}'
+
+    def _remember(self, image_hash: str, text: str):
+        self._items[image_hash] = text
+        self._items.move_to_end(image_hash)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def get(self, image_hash: str) -> Optional[str]:
+        """Get recognized text of the same image"""
+        if image_hash in self._items:
+            self._items.move_to_end(image_hash)
+            return self._items[image_hash]
+        try:
+            text = self.redis_client.get(self._get_redis_key(image_hash))
+        except redis.RedisError as ex:
+            logger.warning(f"OCR cache: Redis is not available: {ex}")
+            return None
+        if text is None:
+            return None
+        text = text.decode()
+        self._remember(image_hash, text)
+        return text
+
+    def set(self, image_hash: str, text: str):
+        self._remember(image_hash, text)
+        try:
+            self.redis_client.set(self._get_redis_key(image_hash), text, ex=self.ttl_secs)
+        except redis.RedisError as ex:
+            logger.warning(f"OCR cache: Redis is not available: {ex}")
+
+
+def to_grayscale(image: np.ndarray) -> np.ndarray:
+    """Convert an image from plt.imread into 0..255 grayscale array"""
+    image = np.asarray(image, dtype=np.float32)
+    if image.ndim == 3:
+        image = image[..., :3] @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    if image.max(initial=0) <= 1.0:
+        image = image * 255
+    return image
+
+
+def _otsu_threshold(gray_image: np.ndarray) -> float:
+    histogram = np.bincount(gray_image.astype(np.uint8).ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight_bg = np.cumsum(histogram)
+    weight_fg = weight_bg[-1] - weight_bg
+    cum_mean = np.cumsum(histogram * levels)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_bg = cum_mean / weight_bg
+        mean_fg = (cum_mean[-1] - cum_mean) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return float(np.nanargmax(between))
+
+
+def preprocess_image(gray_image: np.ndarray, margin: int = 10) -> np.ndarray:
+    """
+    Binarize the grayscale image (dark text on white background)
+    and crop it to the text region
+    """
+    binary = gray_image > _otsu_threshold(gray_image)
+    # Background is the dominant color: invert images with light text on dark background
+    if binary.mean() < 0.5:
+        binary = ~binary
+    text_mask = ~binary
+    rows = np.flatnonzero(text_mask.any(axis=1))
+    cols = np.flatnonzero(text_mask.any(axis=0))
+    if rows.size and cols.size:
+        top, bottom = max(rows[0] - margin, 0), rows[-1] + margin + 1
+        left, right = max(cols[0] - margin, 0), cols[-1] + margin + 1
+        binary = binary[top:bottom, left:right]
+    return binary.astype(np.uint8) * 255
+
+
+ocr_cache = OcrCache()
@@ -0,0 +1,74 @@
+import json
+import logging
+
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from apps.telegram.models import SignalModel
+
+logger = logging.getLogger(__name__)
+
+COMPARED_FIELDS = ('pair', 'position', 'leverage', 'margin_type',
+                   'entry_points', 'take_profits', 'stop_loss', 'current_price')
+
+
+class CorpusMessage(NamedTuple):
+    """
+    Stored Telegram message (one line of a JSONL corpus):
+    {"message_id": 1, "channel": "cf_tr", "text": "...", "media": null, "expected": [{"pair": ...}]}
+    """
+    message_id: Optional[int]
+    channel: str
+    text: str
+    media: Optional[str] = None
+    expected: Optional[List[Dict[str, Any]]] = None
+
+    def as_record(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+def signal_model_to_dict(signal: 'SignalModel') -> Dict[str, Any]:
+    """JSON-compatible representation of parsed SignalModel to compare with the expected one"""
+    return json.loads(json.dumps({field: getattr(signal, field, None) for field in COMPARED_FIELDS}, default=str))
+
+
+def get_diff(expected: List[Dict[str, Any]], parsed: List[Dict[str, Any]]) -> List[str]:
+    """Human-readable differences between expected and parsed signals"""
+    if len(expected) != len(parsed):
+        return [f"signals: expected {len(expected)}, parsed {len(parsed)}"]
+    diff = []
+    for index, (expected_signal, parsed_signal) in enumerate(zip(expected, parsed)):
+        for field in COMPARED_FIELDS:
+            if field in expected_signal and expected_signal[field] != parsed_signal.get(field):
+                diff.append(f"[{index}].{field}: expected {expected_signal[field]!r},"
+                            f" parsed {parsed_signal.get(field)!r}")
+    return diff
+
+
+def load_corpus(path: str, channel: Optional[str] = None) -> Iterator[CorpusMessage]:
+    """Read messages from a JSONL corpus file (optionally of one channel only)"""
+    with open(path, encoding='utf-8') as corpus_file:
+        for line_number, line in enumerate(corpus_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as ex:
+                logger.warning(f"Corpus '{path}': line {line_number} is skipped: {ex}")
+                continue
+            if channel and record.get('channel') != channel:
+                continue
+            expected = record.get('expected')
+            if isinstance(expected, dict):
+                expected = [expected]
+            yield CorpusMessage(message_id=record.get('message_id'),
+                                channel=record.get('channel', ''),
+                                text=record.get('text') or '',
+                                media=record.get('media'),
+                                expected=expected)
+
+
+def dump_corpus(path: str, messages: List[CorpusMessage]):
+    with open(path, 'w', encoding='utf-8') as corpus_file:
+        for message in messages:
+            corpus_file.write(json.dumps(message.as_record(), ensure_ascii=False) + '\n')
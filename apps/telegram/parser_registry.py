@@ -0,0 +1,84 @@
+import logging
+
+from typing import Dict, List, NamedTuple, Optional, TYPE_CHECKING
+
+from utils.parse_channels.grammar import LineGrammar
+
+if TYPE_CHECKING:
+    from apps.telegram.models import Telegram, SignalModel
+
+logger = logging.getLogger(__name__)
+
+
+TOKENFAST_GRAMMAR = LineGrammar(
+    pair='Pair:',
+    margin_type='Margin type:',
+    leverage='Leverage: ',
+    entries='Entry Points: ',
+    profits='Take Profits: ',
+    stop_loss='Stop Loss: ',
+    datetime='Time:',
+    algorithm='Algorithm: ',
+    outer_id='ID: ',
+)
+
+SERVER_GRAMMAR = LineGrammar(
+    pair='Pair:',
+    leverage='Leverage: ',
+    entries='Entry Points: ',
+    profits='Take Profits: ',
+    stop_loss='Stop Loss: ',
+    datetime='Time:',
+    algorithm='Algorithm: ',
+    outer_id='ID: ',
+)
+
+
+# Signals of these channels are parsed from images (see ChinaImageToSignal)
+IMAGE_CHANNELS = ('ai', 'ai_se')
+
+
+class ParserSpec(NamedTuple):
+    """Registered text parser of a Telegram channel"""
+    channel_abbr: str
+    method_name: str
+    with_message_id: bool = True
+    with_channel_abbr: bool = False
+
+    def call(self, telegram: 'Telegram', message_text: str, message_id: Optional[int] = None):
+        """Result of the parser method as is (one signal or a list of them)"""
+        args = [message_text]
+        if self.with_message_id:
+            args.append(message_id)
+        if self.with_channel_abbr:
+            args.append(self.channel_abbr)
+        return getattr(telegram, self.method_name)(*args)
+
+    def parse(self, telegram: 'Telegram', message_text: str, message_id: Optional[int] = None) -> List['SignalModel']:
+        result = self.call(telegram, message_text, message_id)
+        return result if isinstance(result, list) else [result]
+
+
+PARSER_REGISTRY: Dict[str, ParserSpec] = {spec.channel_abbr: spec for spec in (
+    ParserSpec('cf_tr', 'parse_cf_trader_message'),
+    ParserSpec('tokenfast', 'parse_tokenfast_message', with_message_id=False),
+    ParserSpec('crypto_passive', 'parse_angel_message'),
+    ParserSpec('crypto_futures', 'parse_crypto_futures_message'),
+    ParserSpec('white_bull', 'parse_white_bull_message'),
+    ParserSpec('kl_sc', 'parse_klondike_message'),
+    ParserSpec('kl_al', 'parse_klondike_message'),
+    ParserSpec('kl_mg', 'parse_klondike_message'),
+    ParserSpec('wc_se', 'parse_wcse_message'),
+    ParserSpec('server', 'parse_server_message', with_message_id=False),
+    ParserSpec('assist_altcoin', 'parse_tca_message', with_channel_abbr=True),
+    ParserSpec('assist_leverage', 'parse_tca_message', with_channel_abbr=True),
+    ParserSpec('vege', 'parse_vege_message', with_channel_abbr=True),
+    ParserSpec('margin_whale', 'parse_margin_whale_message'),
+)}
+
+
+def get_parser_spec(channel_abbr: str) -> Optional[ParserSpec]:
+    spec = PARSER_REGISTRY.get(channel_abbr)
+    if not spec:
+        logger.warning(f"There is no registered parser for the channel '{channel_abbr}'")
+    return spec
@@ -1,11 +1,36 @@
 import logging
-import urllib.request
-import json
+
+from typing import Dict, Optional
+
+from asgiref.sync import sync_to_async
+
+from apps.pair.symbol_index import SymbolIndex
 
 logger = logging.getLogger(__name__)
 
 
 class SignalVerification:
+    def __init__(self, symbol_index: Optional[SymbolIndex] = None):
+        self._symbol_index = symbol_index
+
+    @property
+    def symbol_index(self) -> SymbolIndex:
+        """Known symbols with cached prices, loaded once by the first verification"""
+        if self._symbol_index is None:
+            self._symbol_index = SymbolIndex.load()
+        return self._symbol_index
+
+    def get_current_pair_info(self, symbol: str) -> Optional[Dict[str, str]]:
+        """Symbol and price in the form of the ticker price API response"""
+        found_symbol = self.symbol_index.find_symbol(symbol)
+        if not found_symbol:
+            return None
+        price = self.symbol_index.get_price(found_symbol)
+        if not price:
+            logger.warning(f"Symbol '{found_symbol}' has no ticker price yet")
+            return None
+        return {'symbol': found_symbol, 'price': f'{price:.8f}'}
+
     def get_active_pairs_info(self, pairs):
         from apps.telegram.models import SignalModel
         pairs_info = []
@@ -13,31 +38,10 @@ class SignalVerification:
         for pair_object in pairs:
             if pair_object.entry_points is None or pair_object.take_profits is None:
                 return False
-            price_json = ''
-            try:
-                pair_object.pair = '1INCHUSDT' if 'INCHUSDT' in pair_object.pair else pair_object.pair
-                price_json = urllib.request.urlopen(
-                    'https://api.binance.com/api/v3/ticker/price?symbol={}'.format(pair_object.pair))
-            except:
-                usdt_position = pair_object.pair.rfind('USDT')
-                btc_position = pair_object.pair.rfind('BTC')
-                if btc_position > 0:
-                    pair_corrected = pair_object.pair[0: btc_position - 1:] + pair_object.pair[btc_position::]
-                    price_json = urllib.request.urlopen(
-                        'https://api.binance.com/api/v3/ticker/price?symbol={}'.format(pair_corrected))
-
-                if usdt_position > 0:
-                    pair_corrected = pair_object.pair[0: usdt_position:] + pair_object.pair[usdt_position::]
-                    if pair_corrected == 'COTVUSDT':
-                        pair_corrected = 'COTIUSDT'
-                    if pair_corrected == 'lOSTUSDT':
-                        pair_corrected = 'IOSTUSDT'
-                    if pair_corrected == 'ZILIUSDT':
-                        pair_corrected = 'ZILUSDT'
-                    price_json = urllib.request.urlopen(
-                        'https://api.binance.com/api/v3/ticker/price?symbol={}'.format(pair_corrected))
-
-            current_pair = json.load(price_json)
+            current_pair = self.get_current_pair_info(pair_object.pair)
+            if not current_pair:
+                logger.error(f"Pair '{pair_object.pair}' could not be verified")
+                return False
             pairs_info.append(current_pair)
 
             entries = self.verify_entry(pair_object, current_pair)
@@ -60,6 +64,10 @@ class SignalVerification:
                                  pair_object.msg_id)
         return signal
 
+    @sync_to_async
+    def async_get_active_pairs_info(self, pairs):
+        return self.get_active_pairs_info(pairs)
+
     def verify_entry(self, pair_object, current_pair_info):
         verified_entries = []
         dot_position = current_pair_info['price'].index('.')
@@ -4,7 +4,7 @@ import random
 
 from logging.handlers import RotatingFileHandler
 from celery import Celery
-from celery.signals import after_setup_logger
+from celery.signals import after_setup_logger, worker_ready, worker_shutdown, worker_process_shutdown
 from django.conf import settings
 
 from binfun.settings import conf_obj
@@ -38,6 +38,30 @@ def setup_loggers(logger, *args, **kwargs):
     logger.addHandler(fh)
 
 
+# Buffered HistorySignal records of the child process are written before it exits
+@worker_process_shutdown.connect
+def flush_history(*args, **kwargs):
+    from apps.signal.history import flush_at_exit
+    flush_at_exit()
+
+
+# Worker of a shard (BINFUN_SHARD is set) keeps the shard live while it is running
+@worker_ready.connect
+def join_shard(*args, **kwargs):
+    from apps.signal.sharding import get_own_shard, ShardRegistry
+    shard = get_own_shard()
+    if shard:
+        ShardRegistry.start_heartbeat(shard)
+
+
+@worker_shutdown.connect
+def leave_shard(*args, **kwargs):
+    from apps.signal.sharding import get_own_shard, ShardRegistry
+    shard = get_own_shard()
+    if shard:
+        ShardRegistry.leave(shard)
+
+
 _COMMON_CRON_PERIOD_SECS = conf_obj.common_period_of_cron_celery_tasks_secs
 _THIRTY_PERCENT_FROM_UNIT = 0.3
 # _COMMON_EXPIRES_OF_CRON_TASK_SECS = 9  # I think it should be a bit less than _COMMON_CRON_PERIOD_SECS
@@ -119,6 +143,15 @@ app.conf.beat_schedule = {
         "task": "apps.market.tasks.update_pairs_info_api_task",
         "schedule": 24*60*60,  # every 24h
     },
+    # ARCHIVE
+    "archive_closed_signals_task": {
+        "task": "apps.signal.tasks.archive_closed_signals_task",
+        "schedule": 24*60*60,  # every 24h
+    },
+    "ensure_history_partitions_task": {
+        "task": "apps.signal.tasks.ensure_history_partitions_task",
+        "schedule": 24*60*60,  # every 24h
+    },
 
 }
 
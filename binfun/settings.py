@@ -191,6 +191,26 @@ CELERY_TIMEZONE = 'Europe/Kiev'
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 
+# Queues by priority, every queue is consumed by its own worker (see docker-compose.yml)
+QUEUE_HIGH = 'high'  # Order placement and cancelling
+QUEUE_MEDIUM = 'medium'  # Trailing stop and spoiling
+QUEUE_LOW = 'low'  # Pulling of orders info, prices and pairs refresh, archive
+CELERY_TASK_DEFAULT_QUEUE = QUEUE_LOW
+CELERY_TASK_ROUTES = {
+    'apps.signal.tasks.first_forming_*': {'queue': QUEUE_HIGH},
+    'apps.signal.tasks.push_job_*': {'queue': QUEUE_HIGH},
+    'apps.signal.tasks.bought_worker_*': {'queue': QUEUE_HIGH},
+    'apps.signal.tasks.sold_worker_*': {'queue': QUEUE_HIGH},
+    'apps.signal.tasks.close_worker_*': {'queue': QUEUE_HIGH},
+    'apps.signal.tasks.trailing_stop_worker_*': {'queue': QUEUE_MEDIUM},
+    'apps.signal.tasks.spoil_worker_*': {'queue': QUEUE_MEDIUM},
+    'apps.signal.tasks.pull_job_*': {'queue': QUEUE_LOW},
+    'apps.pair.tasks.*': {'queue': QUEUE_LOW},
+    'apps.market.tasks.*': {'queue': QUEUE_LOW},
+}
+# A worker doesn't reserve tasks behind a long one
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
 # Project
 DEFAULT_INVIOLABLE_BALANCE_PERC = '15.0'
 DEFAULT_EXTREMAL_SL_PRICE_SHIFT_COEF = '8.0'
@@ -204,7 +224,38 @@ DEFAULT_THIRD_PROFIT_DEVIATION_PERC = '4.3'  # Third TP distance in % from curre
 DEFAULT_FOURTH_PROFIT_DEVIATION_PERC = '6.4'  # Fourth TP distance in % from current price
 DEFAULT_FIFTH_PROFIT_DEVIATION_PERC = '12'  # Fifth TP distance in % from current price
 DEFAULT_STOP_LOSS_DEVIATION_PERC = '3.5'  # Stop loss distance in % from current price
-
+DEFAULT_SIGNAL_WAIT_TIMEOUT_SECS = '300'  # Max time of awaiting Signal status change (e.g. closing)
+DEFAULT_SIGNAL_WAIT_MAX_DELAY_SECS = '5'  # Max pause between checks while awaiting
+DEFAULT_ASYNC_WORKER_CONCURRENCY = '50'  # Max Signals handled at the same time by the async worker
+DEFAULT_ASYNC_WORKER_DB_THREADS = '16'  # Threads for DB access and sync steps of the async worker
+DEFAULT_ORDER_OUTBOX_BATCH_SIZE = '20'  # Intents taken by order_outbox_sender at once
+DEFAULT_ORDER_OUTBOX_POLL_SECS = '0.5'  # Pause of order_outbox_sender if the outbox is empty
+DEFAULT_ORDER_OUTBOX_RETRY_DELAY_SECS = '1.0'  # Delay of intents of a busy Signal, doubled by attempts for api errors
+DEFAULT_ORDER_OUTBOX_MAX_RETRY_DELAY_SECS = '60'  # Max delay of a postponed intent
+DEFAULT_TRAILING_PRESCREEN_TOLERANCE_PERC = '0.5'  # Cached price is widened by it in the trailing stop pre-screen
+DEFAULT_SPOIL_PRESCREEN_TOLERANCE_PERC = '0.5'  # Cached price is widened by it in the spoil pre-check
+DEFAULT_HISTORY_FLUSH_SECS = '2.0'  # Period of writing of buffered HistorySignal records
+DEFAULT_HISTORY_BUFFER_SIZE = '200'  # Buffered HistorySignal records are written at once if the buffer is full
+DEFAULT_ARCHIVE_CLOSED_SIGNALS_AFTER_DAYS = '90'  # CLOSED Signals older than it are moved to the archive
+DEFAULT_ARCHIVE_BATCH_SIZE = '100'  # Signals archived by one transaction
+DEFAULT_HISTORY_PARTITIONS_AHEAD_MONTHS = '3'  # Monthly partitions of history tables created in advance
+DEFAULT_FAN_OUT_CHUNK_SIZE = '20'  # Signals by one Celery task until the cost of a Signal is measured
+DEFAULT_FAN_OUT_MAX_CHUNK_SIZE = '200'  # Max Signals by one Celery task
+DEFAULT_FAN_OUT_TARGET_TASK_SECS = '5.0'  # Chunk size is adapted to make a task take about it
+DEFAULT_TASK_PENDING_TTL_SECS = '120'  # Queued task of a Signal is taken for lost after it and enqueued again
+DEFAULT_WORK_QUEUE_BATCH_SIZE = '20'  # Work items claimed by work_queue_worker at once
+DEFAULT_WORK_QUEUE_POLL_SECS = '0.5'  # Pause of work_queue_worker if there are no due items
+DEFAULT_WORK_QUEUE_VISIBILITY_TIMEOUT_SECS = '60'  # Claimed item is claimed again after it (crashed worker)
+DEFAULT_WORK_QUEUE_RETRY_DELAY_SECS = '2.0'  # Retry delay of an item of a busy Signal, doubled by attempts for failed ones
+DEFAULT_WORK_QUEUE_MAX_ATTEMPTS = '5'  # Failed item is dropped after it
+DEFAULT_SHARD_HEARTBEAT_TTL_SECS = '30'  # Shard without heartbeat during it is taken for left (its symbols move)
+DEFAULT_SHARD_VIRTUAL_NODES = '64'  # Points of a shard on the consistent hash ring of symbols
+DEFAULT_PRICE_TRIGGER_POLL_SECS = '2.0'  # Period of ticker prices requests of price_trigger_worker
+DEFAULT_PRICE_TRIGGER_REBUILD_SECS = '30.0'  # Period of rebuilding of the price trigger index
+DEFAULT_PRICE_TRIGGER_RETRY_SECS = '10.0'  # Crossed Signals are handed out again with it until the rebuild
+
+DEFAULT_FUTURES_SYMBOL_SETTINGS_TTL_SECS = '3600'  # Lifetime of cached leverage and margin type by symbol
+DEFAULT_BALANCE_SNAPSHOT_TTL_SECS = '60'  # Lifetime of the balance snapshot in Redis (fills invalidate it earlier)
 DEFAULT_MARKET_SPOT_RAW_URL = 'https://www.binance.com/en/trade/{}'
 DEFAULT_MARKET_FUTURES_RAW_URL = 'https://www.binance.com/en/futures/{}'
 
@@ -215,6 +266,8 @@ DEFAULT_PERIOD_OF_PRICES_UPDATE_TASKS_SECS = '50.0'
 # Project Telegram
 
 PARSED_IMAGES_STORAGE = f'{BASE_DIR}/parsed-images'
+DEFAULT_OCR_CACHE_SIZE = '512'  # Recognized images kept in memory
+DEFAULT_OCR_CACHE_TTL_SECS = '604800'  # Lifetime of recognized text in Redis
 
 # Logger
 
@@ -308,6 +361,10 @@ class Config:
         self.futures_market_fee: float = market.getfloat('futures_market_fee')
         self.inviolable_balance_perc: float = float(market.get(
             'inviolable_balance_perc', DEFAULT_INVIOLABLE_BALANCE_PERC))
+        self.futures_symbol_settings_ttl_secs: float = float(market.get(
+            'futures_symbol_settings_ttl_secs', DEFAULT_FUTURES_SYMBOL_SETTINGS_TTL_SECS))
+        self.balance_snapshot_ttl_secs: float = float(market.get(
+            'balance_snapshot_ttl_secs', DEFAULT_BALANCE_SNAPSHOT_TTL_SECS))
         self.market_spot_raw_url = market.get('market_spot_raw_url', DEFAULT_MARKET_SPOT_RAW_URL)
         self.market_futures_raw_url = market.get('market_futures_raw_url', DEFAULT_MARKET_FUTURES_RAW_URL)
         self.market_futures_raw_url = market.get('market_futures_raw_url', DEFAULT_MARKET_FUTURES_RAW_URL)
@@ -322,6 +379,64 @@ class Config:
             'allowable_duration_of_task_secs', DEFAULT_ALLOWABLE_DURATION_OF_TASK_SECS))
         self.trail_oncoming_percent: float = float(logic.get(
             'trail_oncoming_percent', DEFAULT_TRAIL_ONCOMING_PERCENT))
+        self.signal_wait_timeout_secs: float = float(logic.get(
+            'signal_wait_timeout_secs', DEFAULT_SIGNAL_WAIT_TIMEOUT_SECS))
+        self.signal_wait_max_delay_secs: float = float(logic.get(
+            'signal_wait_max_delay_secs', DEFAULT_SIGNAL_WAIT_MAX_DELAY_SECS))
+        self.async_worker_concurrency: int = int(logic.get(
+            'async_worker_concurrency', DEFAULT_ASYNC_WORKER_CONCURRENCY))
+        self.async_worker_db_threads: int = int(logic.get(
+            'async_worker_db_threads', DEFAULT_ASYNC_WORKER_DB_THREADS))
+        self.order_outbox_batch_size: int = int(logic.get(
+            'order_outbox_batch_size', DEFAULT_ORDER_OUTBOX_BATCH_SIZE))
+        self.order_outbox_poll_secs: float = float(logic.get(
+            'order_outbox_poll_secs', DEFAULT_ORDER_OUTBOX_POLL_SECS))
+        self.order_outbox_retry_delay_secs: float = float(logic.get(
+            'order_outbox_retry_delay_secs', DEFAULT_ORDER_OUTBOX_RETRY_DELAY_SECS))
+        self.order_outbox_max_retry_delay_secs: float = float(logic.get(
+            'order_outbox_max_retry_delay_secs', DEFAULT_ORDER_OUTBOX_MAX_RETRY_DELAY_SECS))
+        self.trailing_prescreen_tolerance_perc: float = float(logic.get(
+            'trailing_prescreen_tolerance_perc', DEFAULT_TRAILING_PRESCREEN_TOLERANCE_PERC))
+        self.spoil_prescreen_tolerance_perc: float = float(logic.get(
+            'spoil_prescreen_tolerance_perc', DEFAULT_SPOIL_PRESCREEN_TOLERANCE_PERC))
+        self.history_flush_secs: float = float(logic.get(
+            'history_flush_secs', DEFAULT_HISTORY_FLUSH_SECS))
+        self.history_buffer_size: int = int(logic.get(
+            'history_buffer_size', DEFAULT_HISTORY_BUFFER_SIZE))
+        self.archive_closed_signals_after_days: float = float(logic.get(
+            'archive_closed_signals_after_days', DEFAULT_ARCHIVE_CLOSED_SIGNALS_AFTER_DAYS))
+        self.archive_batch_size: int = int(logic.get(
+            'archive_batch_size', DEFAULT_ARCHIVE_BATCH_SIZE))
+        self.history_partitions_ahead_months: int = int(logic.get(
+            'history_partitions_ahead_months', DEFAULT_HISTORY_PARTITIONS_AHEAD_MONTHS))
+        self.fan_out_chunk_size: int = int(logic.get(
+            'fan_out_chunk_size', DEFAULT_FAN_OUT_CHUNK_SIZE))
+        self.fan_out_max_chunk_size: int = int(logic.get(
+            'fan_out_max_chunk_size', DEFAULT_FAN_OUT_MAX_CHUNK_SIZE))
+        self.fan_out_target_task_secs: float = float(logic.get(
+            'fan_out_target_task_secs', DEFAULT_FAN_OUT_TARGET_TASK_SECS))
+        self.task_pending_ttl_secs: float = float(logic.get(
+            'task_pending_ttl_secs', DEFAULT_TASK_PENDING_TTL_SECS))
+        self.work_queue_batch_size: int = int(logic.get(
+            'work_queue_batch_size', DEFAULT_WORK_QUEUE_BATCH_SIZE))
+        self.work_queue_poll_secs: float = float(logic.get(
+            'work_queue_poll_secs', DEFAULT_WORK_QUEUE_POLL_SECS))
+        self.work_queue_visibility_timeout_secs: float = float(logic.get(
+            'work_queue_visibility_timeout_secs', DEFAULT_WORK_QUEUE_VISIBILITY_TIMEOUT_SECS))
+        self.work_queue_retry_delay_secs: float = float(logic.get(
+            'work_queue_retry_delay_secs', DEFAULT_WORK_QUEUE_RETRY_DELAY_SECS))
+        self.work_queue_max_attempts: int = int(logic.get(
+            'work_queue_max_attempts', DEFAULT_WORK_QUEUE_MAX_ATTEMPTS))
+        self.shard_heartbeat_ttl_secs: float = float(logic.get(
+            'shard_heartbeat_ttl_secs', DEFAULT_SHARD_HEARTBEAT_TTL_SECS))
+        self.shard_virtual_nodes: int = int(logic.get(
+            'shard_virtual_nodes', DEFAULT_SHARD_VIRTUAL_NODES))
+        self.price_trigger_poll_secs: float = float(logic.get(
+            'price_trigger_poll_secs', DEFAULT_PRICE_TRIGGER_POLL_SECS))
+        self.price_trigger_rebuild_secs: float = float(logic.get(
+            'price_trigger_rebuild_secs', DEFAULT_PRICE_TRIGGER_REBUILD_SECS))
+        self.price_trigger_retry_secs: float = float(logic.get(
+            'price_trigger_retry_secs', DEFAULT_PRICE_TRIGGER_RETRY_SECS))
 
         # Parameters for divergence indicator
         self.market_entry_deviation_perc: float = float(logic.get(
@@ -357,6 +472,8 @@ class Config:
         self.server = telegram.get('Server', None)
         self.fsvzo = telegram.get('fsvzo', None)
         self.vege = telegram.get('vege', None)
+        self.ocr_cache_size: int = int(telegram.get('ocr_cache_size', DEFAULT_OCR_CACHE_SIZE))
+        self.ocr_cache_ttl_secs: int = int(telegram.get('ocr_cache_ttl_secs', DEFAULT_OCR_CACHE_TTL_SECS))
 
 
 conf_obj = Config()
@@ -3,6 +3,7 @@ import uuid
 
 from binance.exceptions import BinanceAPIException
 
+from decimal import Decimal
 from functools import partial, wraps
 from typing import Callable, Optional
 
@@ -153,5 +154,11 @@ def subtract_fee(quantity: float, fee: float, reverse: bool = False) -> float:
 
 
 def price_to_str(price: float) -> str:
+    """
+    Decimal rendering for the API without exponent, 8 digits at most.
+    The value is rounded to 8 digits first: raw values (EP, TP) and float noise
+    (0.30000000000000004) aren't sent with long decimals.
+    The shortest repr of the rounded value is its exact decimal
+    """
     precision = 8
-    return '{:0.0{}f}'.format(price, precision)
+    return format(Decimal(repr(round(float(price), precision))), 'f')
@@ -0,0 +1,113 @@
+import logging
+
+from datetime import date
+from typing import Iterable, Optional
+
+from django.db import connection, transaction, DatabaseError
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PARTITION_COLUMN = 'created'
+
+
+def get_month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def get_partition_name(table: str, month: date) -> str:
+    return f'{table}_p{month:%Y%m}'
+
+
+def get_default_partition_name(table: str) -> str:
+    return f'{table}_default'
+
+
+def create_month_partition(cursor, table: str, month: date):
+    """
+    Partition of the month. Rows of the month which have come to the default partition
+    (the partition was not created in time) are moved into it: PostgreSQL refuses to create it otherwise
+    """
+    quote = connection.ops.quote_name
+    partition = get_partition_name(table, month)
+    cursor.execute('SELECT to_regclass(%s)', [partition])
+    if cursor.fetchone()[0]:
+        return
+    bounds = [month.isoformat(), add_months(month, 1).isoformat()]
+    default_partition = quote(get_default_partition_name(table))
+    column = quote(PARTITION_COLUMN)
+    cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {default_partition} WHERE {column} >= %s AND {column} < %s)',
+                   bounds)
+    if not cursor.fetchone()[0]:
+        cursor.execute(f'CREATE TABLE {quote(partition)} PARTITION OF {quote(table)} '
+                       f'FOR VALUES FROM (%s) TO (%s)', bounds)
+        return
+    cursor.execute(f'ALTER TABLE {quote(table)} DETACH PARTITION {default_partition}')
+    cursor.execute(f'CREATE TABLE {quote(partition)} PARTITION OF {quote(table)} '
+                   f'FOR VALUES FROM (%s) TO (%s)', bounds)
+    cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {default_partition} '
+                   f'WHERE {column} >= %s AND {column} < %s', bounds)
+    cursor.execute(f'DELETE FROM {default_partition} WHERE {column} >= %s AND {column} < %s', bounds)
+    cursor.execute(f'ALTER TABLE {quote(table)} ATTACH PARTITION {default_partition} DEFAULT')
+    logger.warning(f"Rows of '{month:%Y-%m}' have been moved from the default partition of '{table}'")
+
+
+def create_month_partitions(cursor, table: str, start: date, end: date):
+    """Monthly partitions of the table (PostgreSQL declarative partitioning) from start to end inclusive"""
+    month = get_month_start(start)
+    while month <= end:
+        create_month_partition(cursor, table, month)
+        month = add_months(month, 1)
+
+
+def convert_to_partitioned(cursor, table: str, fk_column: str, fk_table: str, months_ahead: int):
+    """
+    Recreate the table as partitioned by month of the created field and move rows into it.
+    The primary key includes the partition column, the id sequence is kept
+    """
+    quote = connection.ops.quote_name
+    old_table = f'{table}_old'
+    cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old_table)}')
+    cursor.execute(f'CREATE TABLE {quote(table)} (LIKE {quote(old_table)} INCLUDING DEFAULTS) '
+                   f'PARTITION BY RANGE ({quote(PARTITION_COLUMN)})')
+    cursor.execute(f'ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, {quote(PARTITION_COLUMN)})')
+    cursor.execute(f'CREATE TABLE {quote(get_default_partition_name(table))} PARTITION OF {quote(table)} DEFAULT')
+    cursor.execute(f'SELECT MIN({quote(PARTITION_COLUMN)}) FROM {quote(old_table)}')
+    first_created = cursor.fetchone()[0]
+    today = timezone.now().date()
+    create_month_partitions(cursor, table,
+                            start=first_created.date() if first_created else today,
+                            end=add_months(today, months_ahead))
+    cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(old_table)}')
+    cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [old_table, 'id'])
+    sequence = cursor.fetchone()[0]
+    if sequence:
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {quote(table)}.id')
+    cursor.execute(f'DROP TABLE {quote(old_table)}')
+    cursor.execute(f'CREATE INDEX {quote(table + "_" + fk_column)} ON {quote(table)} ({quote(fk_column)})')
+    cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(table + "_" + fk_column + "_fk")} '
+                   f'FOREIGN KEY ({quote(fk_column)}) REFERENCES {quote(fk_table)} (id) '
+                   f'DEFERRABLE INITIALLY DEFERRED')
+    logger.debug(f"Table '{table}' has been partitioned by month")
+
+
+def ensure_month_partitions(tables: Iterable[str], months_ahead: int, today: Optional[date] = None):
+    """
+    Partitions of the current month and of the next months (before rows of them come to the default one).
+    A failed table doesn't keep the others from their partitions
+    """
+    if connection.vendor != 'postgresql':
+        return
+    today = today or timezone.now().date()
+    with connection.cursor() as cursor:
+        for table in tables:
+            try:
+                with transaction.atomic():
+                    create_month_partitions(cursor, table, start=today, end=add_months(today, months_ahead))
+            except DatabaseError as ex:
+                logger.error(f"Partitions of '{table}' failed to create: '{ex}'")
@@ -0,0 +1,21 @@
+import re
+
+from typing import Dict, Iterator, Tuple
+
+
+class LineGrammar:
+    """
+    Precompiled grammar of a line-oriented message ('<label><value>' lines).
+    All labels are joined into one regex, so the message is tokenized in a single pass
+    """
+
+    def __init__(self, **labels: str):
+        self.fields: Dict[str, str] = {label: field for field, label in labels.items()}
+        # The longest labels go first so that a label being a prefix of another one can't shadow it
+        alternatives = '|'.join(re.escape(label) for label in sorted(self.fields, key=len, reverse=True))
+        self.pattern = re.compile(rf'^({alternatives})([^\r\n]*)', re.MULTILINE)
+
+    def tokenize(self, text: str) -> Iterator[Tuple[str, str]]:
+        """Yield (field, rest of the line after the label) for every labeled line"""
+        for match in self.pattern.finditer(text):
+            yield self.fields[match.group(1)], match.group(2)
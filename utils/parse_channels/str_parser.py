@@ -1,25 +1,19 @@
 from typing import List
 
 
+NUMBER_TRANSLATION = str.maketrans({',': '.', **{char: None for char in '\'[] :-+()X*!'}})
+CYRILLIC_UPPER_TRANSLATION = str.maketrans('ЕОМСТВАНКРУ', 'EOMCTBAHKPY')
+CYRILLIC_LOWER_TRANSLATION = str.maketrans('еомстванкру', 'eomctbahkpy')
+
+
+def normalize_number(string: str) -> str:
+    """Remove garbage symbols around a number in one pass (, => .)"""
+    return string.replace('..', '.').translate(NUMBER_TRANSLATION)
+
+
 def left_numbers(array: List[str]) -> List[str]:
     """left numbers only (, => .) in array"""
-    array = [n.replace('..', '.') for n in array]
-    array = [n.replace('\'', '') for n in array]
-    array = [n.replace('[', '') for n in array]
-    array = [n.replace(']', '') for n in array]
-    array = [n.replace(' ', '') for n in array]
-    array = [n.replace(':', '') for n in array]
-    array = [n.replace(',', '.') for n in array]
-    array = [n.replace('-', '') for n in array]
-    array = [n.replace('+', '') for n in array]
-    array = [n.replace('(', '') for n in array]
-    array = [n.replace(')', '') for n in array]
-    array = [n.replace('X', '') for n in array]
-    array = [n.replace('*', '') for n in array]
-    array = [n.replace('!', '') for n in array]
-    array = list(dict.fromkeys(array))
-    # possible_array = [''.join([n.replace(',', '.') for n in el if n.isdigit()
-    #                            or n in ['.', ',']]) for el in array]
+    array = dict.fromkeys(normalize_number(n) for n in array)
     return list(filter(None, array))
 
 
@@ -45,52 +39,8 @@ def find_number_in_list(list_of_strings):
 
 
 def check_pair(string):
-    if 'Е' in string:
-        string = string.replace('Е', 'E')
-    if 'О' in string:
-        string = string.replace('О', 'O')
-    if 'М' in string:
-        string = string.replace('М', 'M')
-    if 'С' in string:
-        string = string.replace('С', 'C')
-    if 'Т' in string:
-        string = string.replace('Т', 'T')
-    if 'В' in string:
-        string = string.replace('В', 'B')
-    if 'А' in string:
-        string = string.replace('А', 'A')
-    if 'Н' in string:
-        string = string.replace('Н', 'H')
-    if 'К' in string:
-        string = string.replace('К', 'K')
-    if 'Р' in string:
-        string = string.replace('Р', 'P')
-    if 'У' in string:
-        string = string.replace('У', 'Y')
-    return string
+    return string.translate(CYRILLIC_UPPER_TRANSLATION)
 
 
 def replace_rus_to_eng(string):
-    if 'е' in string:
-        string = string.replace('е', 'e')
-    if 'о' in string:
-        string = string.replace('о', 'o')
-    if 'м' in string:
-        string = string.replace('м', 'm')
-    if 'с' in string:
-        string = string.replace('с', 'c')
-    if 'т' in string:
-        string = string.replace('т', 't')
-    if 'в' in string:
-        string = string.replace('в', 'b')
-    if 'а' in string:
-        string = string.replace('а', 'a')
-    if 'н' in string:
-        string = string.replace('н', 'h')
-    if 'к' in string:
-        string = string.replace('к', 'k')
-    if 'р' in string:
-        string = string.replace('р', 'p')
-    if 'у' in string:
-        string = string.replace('у', 'y')
-    return string
+    return string.translate(CYRILLIC_LOWER_TRANSLATION)